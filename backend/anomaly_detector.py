@@ -0,0 +1,230 @@
+import json
+
+# Same rules as the insights build, but applied to each receipt row once, when
+# it is ingested, against statistics of the rows stored before it.
+QUANTITY_LIMIT = 5
+PRICE_FACTOR = 2.0
+# A product needs this many earlier prices before its median is trusted.
+MIN_PRICE_SAMPLES = 3
+DETECT_CHUNK_SIZE = 10_000
+
+ANOMALY_SCHEMAS = {
+    "Anomalies": """
+        CREATE TABLE IF NOT EXISTS Anomalies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            receipt_rowid INTEGER NOT NULL,
+            receipt_item_id INTEGER,
+            fs_receipt_id INTEGER,
+            day TEXT,
+            name TEXT,
+            org_name TEXT,
+            unit_municipality TEXT,
+            price REAL,
+            quantity REAL,
+            kind TEXT NOT NULL,
+            score REAL,
+            reference TEXT,
+            detected_at TEXT NOT NULL DEFAULT (datetime('now')),
+            UNIQUE (receipt_rowid, kind)
+        )
+    """,
+    # Per-product P² sketch of the running price median.
+    "Product_Price_Stats": """
+        CREATE TABLE IF NOT EXISTS Product_Price_Stats (
+            name TEXT PRIMARY KEY,
+            samples INTEGER NOT NULL,
+            sketch TEXT NOT NULL
+        )
+    """,
+    # Item counts per city; the most frequent one is the home city.
+    "City_Counts": """
+        CREATE TABLE IF NOT EXISTS City_Counts (
+            city TEXT PRIMARY KEY,
+            items INTEGER NOT NULL
+        )
+    """,
+    "Anomaly_Progress": """
+        CREATE TABLE IF NOT EXISTS Anomaly_Progress (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_rowid INTEGER NOT NULL
+        )
+    """,
+}
+
+ANOMALY_INDEXES = {
+    "idx_anomalies_day": "Anomalies (day)",
+    "idx_anomalies_kind_day": "Anomalies (kind, day)",
+}
+
+ANOMALY_KINDS = ("price", "quantity", "duplicate", "location")
+
+
+class MedianSketch:
+    # P² estimator (Jain & Chlamtac, 1985) for the median: five markers, O(1)
+    # memory and O(1) work per observation. Exact for the first five values.
+    P = 0.5
+    INCREMENTS = (0.0, P / 2, P, (1 + P) / 2, 1.0)
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.n = state.get("n", 0)
+        self.q = state.get("q", [])
+        self.pos = state.get("pos", [1, 2, 3, 4, 5])
+        self.desired = state.get("desired", [1, 1 + 2 * self.P, 1 + 4 * self.P, 3 + 2 * self.P, 5])
+
+    def to_json(self):
+        return json.dumps({"n": self.n, "q": self.q, "pos": self.pos, "desired": self.desired})
+
+    @classmethod
+    def from_json(cls, text):
+        return cls(json.loads(text))
+
+    def median(self):
+        if self.n == 0:
+            return None
+        if self.n < 5:
+            values = self.q
+            middle = len(values) // 2
+            return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+        return self.q[2]
+
+    def add(self, x):
+        self.n += 1
+        if self.n <= 5:
+            self.q = sorted(self.q + [x])
+            return
+
+        q, pos = self.q, self.pos
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i in range(5):
+            self.desired[i] += self.INCREMENTS[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                pos[i] += d
+
+    def _parabolic(self, i, d):
+        q, pos = self.q, self.pos
+        return q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+            (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+            + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1])
+        )
+
+
+def create_anomaly_tables(conn):
+    for ddl in ANOMALY_SCHEMAS.values():
+        conn.execute(ddl)
+    for index_name, target in ANOMALY_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+    conn.execute("INSERT OR IGNORE INTO Anomaly_Progress (id, last_rowid) VALUES (1, 0)")
+
+
+def _load_sketches(conn, names):
+    sketches = {}
+    names = list(names)
+    for start in range(0, len(names), 500):
+        batch = names[start:start + 500]
+        placeholders = ", ".join("?" for _ in batch)
+        for name, sketch in conn.execute(
+            f"SELECT name, sketch FROM Product_Price_Stats WHERE name IN ({placeholders})", batch
+        ):
+            sketches[name] = MedianSketch.from_json(sketch)
+    return sketches
+
+
+def detect_anomalies(conn):
+    # Scores every Receipts row added since the last run (tracked by rowid in
+    # Anomaly_Progress) and stores the flagged ones in Anomalies. Runs inside
+    # the caller's transaction; returns the number of anomalies recorded.
+    create_anomaly_tables(conn)
+    last_rowid = conn.execute("SELECT last_rowid FROM Anomaly_Progress WHERE id = 1").fetchone()[0]
+
+    city_counts = dict(conn.execute("SELECT city, items FROM City_Counts"))
+    home_city = max(city_counts, key=city_counts.get) if city_counts else None
+    flagged = 0
+
+    while True:
+        rows = conn.execute("""
+            SELECT rowid, id, fs_receipt_id, issue_day, name, org_name,
+                   unit_municipality, price, quantity
+            FROM Receipts
+            WHERE rowid > ?
+            ORDER BY rowid
+            LIMIT ?
+        """, (last_rowid, DETECT_CHUNK_SIZE)).fetchall()
+        if not rows:
+            break
+
+        sketches = _load_sketches(conn, {row[4] for row in rows if row[4] is not None})
+        touched = set()
+        anomalies = []
+        # (fs_receipt_id, name, price) of this chunk's rows, for the duplicate check
+        seen_in_chunk = set()
+
+        for row in rows:
+            rowid, _, receipt_id, _, name, _, city, price, quantity = row
+
+            if quantity is not None and quantity > QUANTITY_LIMIT:
+                anomalies.append(row + ("quantity", quantity, str(QUANTITY_LIMIT)))
+
+            if name is not None and price is not None:
+                sketch = sketches.setdefault(name, MedianSketch())
+                median = sketch.median()
+                if sketch.n >= MIN_PRICE_SAMPLES and median and price > PRICE_FACTOR * median:
+                    anomalies.append(row + ("price", price / median, f"{median:.4f}"))
+                sketch.add(price)
+                touched.add(name)
+
+                # Same product at the same price earlier on the same receipt;
+                # the first occurrence is not flagged.
+                key = (receipt_id, name, price)
+                if key in seen_in_chunk or conn.execute("""
+                    SELECT 1 FROM Receipts
+                    WHERE fs_receipt_id = ? AND name = ? AND price = ? AND rowid <= ?
+                    LIMIT 1
+                """, (receipt_id, name, price, last_rowid)).fetchone():
+                    anomalies.append(row + ("duplicate", None, str(receipt_id)))
+                seen_in_chunk.add(key)
+
+            if city is not None:
+                if home_city is not None and city != home_city:
+                    anomalies.append(row + ("location", None, home_city))
+                city_counts[city] = city_counts.get(city, 0) + 1
+                if home_city is None or city_counts[city] > city_counts[home_city]:
+                    home_city = city
+
+        conn.executemany("""
+            INSERT OR IGNORE INTO Anomalies (
+                receipt_rowid, receipt_item_id, fs_receipt_id, day, name, org_name,
+                unit_municipality, price, quantity, kind, score, reference
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, anomalies)
+        conn.executemany(
+            "INSERT OR REPLACE INTO Product_Price_Stats (name, samples, sketch) VALUES (?, ?, ?)",
+            [(name, sketches[name].n, sketches[name].to_json()) for name in touched],
+        )
+        flagged += len(anomalies)
+        last_rowid = rows[-1][0]
+
+    conn.executemany(
+        "INSERT OR REPLACE INTO City_Counts (city, items) VALUES (?, ?)", city_counts.items()
+    )
+    conn.execute("UPDATE Anomaly_Progress SET last_rowid = ? WHERE id = 1", (last_rowid,))
+    return flagged
@@ -0,0 +1,57 @@
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from backend.db import get_database
+from backend.tenants import tenant_id
+
+router = APIRouter()
+
+ANOMALY_COLUMNS = [
+    "id", "kind", "day", "name", "org_name", "unit_municipality",
+    "price", "quantity", "score", "reference", "fs_receipt_id", "receipt_item_id",
+]
+
+
+@router.get("")
+def list_anomalies(
+    kind: Optional[Literal["price", "quantity", "duplicate", "location"]] = None,
+    date_from: Optional[date] = Query(None, alias="from", description="First day, YYYY-MM-DD"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last day, YYYY-MM-DD"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500),
+    tenant: str = Depends(tenant_id),
+):
+    # Anomalies flagged at ingest, newest receipts first.
+    conditions, params = [], []
+    if kind:
+        conditions.append("kind = ?")
+        params.append(kind)
+    if date_from:
+        conditions.append("day >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        conditions.append("day <= ?")
+        params.append(date_to.isoformat())
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    cursor = get_database(tenant).connection().cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM Anomalies {where}", params)
+        total = cursor.fetchone()[0]
+        cursor.execute(f"""
+            SELECT {", ".join(ANOMALY_COLUMNS)}
+            FROM Anomalies {where}
+            ORDER BY day DESC, id DESC
+            LIMIT ? OFFSET ?
+        """, params + [page_size, (page - 1) * page_size])
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    return {
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "items": [dict(zip(ANOMALY_COLUMNS, row)) for row in rows],
+    }
@@ -1,6 +1,10 @@
-from fastapi import APIRouter
+import json
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from hackaton2025.backend.creating_promt import answer
+from backend.creating_promt import aanswer, astream_answer
+from backend.tenants import tenant_id
 
 router = APIRouter()
 
@@ -9,8 +13,28 @@ class ChatMessage(BaseModel):
 
 
 @router.post("/process_text")
-async def process_text(message: ChatMessage):
+async def process_text(message: ChatMessage, tenant: str = Depends(tenant_id)):
     print(f"Processing user query: {message.text}")
-    result = answer(message.text)
+    result = await aanswer(message.text, tenant)
 
     return {"response": result["result"]}
+
+
+@router.post("/stream_text")
+async def stream_text(message: ChatMessage, tenant: str = Depends(tenant_id)):
+    print(f"Streaming user query: {message.text}")
+
+    async def events():
+        try:
+            async for event, data in astream_answer(message.text, tenant):
+                payload = json.dumps(data, ensure_ascii=False, default=str)
+                yield f"event: {event}\ndata: {payload}\n\n"
+        except Exception as e:
+            print(f"[ERROR] Streaming failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'message': 'Server error. Try again.'})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,257 +1,116 @@
-from fastapi import APIRouter, Query
-import sqlite3
-import datetime
-import pandas as pd
-import re
+import math
+from datetime import date, timedelta
+from typing import List, Literal, Optional
 
-router = APIRouter()
-
-DB_PATH = r"data/data_base/data.db"
-
-@router.get("/sort_by_year")
-async def sort_by_year():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT fs_receipt_issue_date, price FROM Receipts")
-    rows = cursor.fetchall()
-    conn.close()
-
-    yearly_spending = {}
-    for date_str, price in rows:
-        if not date_str or price is None:
-            continue
-        try:
-            date = datetime.datetime.fromisoformat(date_str.split(" ")[0])
-        except Exception:
-            continue
-        year = str(date.year)
-        yearly_spending[year] = yearly_spending.get(year, 0.0) + float(price)
-
-    yearly_spending = {year: int(round(total)) for year, total in yearly_spending.items()}
-    return yearly_spending
-
-
-df = pd.read_csv("data/Receipts.csv")
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 
-df["fs_receipt_issue_date"] = pd.to_datetime(df["fs_receipt_issue_date"], errors="coerce")
-df["Purchase_Date"] = df["fs_receipt_issue_date"].dt.date
-df["Month"] = df["fs_receipt_issue_date"].dt.to_period("M").astype(str)
-df["Weekday"] = df["fs_receipt_issue_date"].dt.day_name()
-df["Hour"] = df["fs_receipt_issue_date"].dt.hour
-df["Spend"] = df["price"] * df["quantity"]
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
+from backend.db import get_database
+from backend.insights_engine import get_insights_engine
+from backend.metrics import span
+from backend.single_flight import SingleFlight
+from backend.tenants import tenant_id
 
-def normalize_store_name(store_name):
-    if pd.isna(store_name):
-        return "Unknown"
+router = APIRouter()
 
-    name = str(store_name).strip()
+# Concurrent identical requests (same tenant, data version and parameters)
+# share one computation, e.g. when a dashboard refresh fires in several tabs.
+SPENDING_FLIGHTS = SingleFlight("spending")
 
-    patterns_to_remove = [
-        r",?\s*s\.r\.o\.?",
-        r",?\s*v\.o\.s\.?",
-        r",?\s*a\.s\.?",
-        r",?\s*spol\.\s*s\s*r\.o\.?",
-        r",?\s*Slovenská republika",
-        r",?\s*Slovakia",
-        r",?\s*SR",
-        r",?\s*Inc\.?",
-        r",?\s*Ltd\.?",
-        r",?\s*GmbH",
-    ]
 
-    for pattern in patterns_to_remove:
-        name = re.sub(pattern, "", name, flags=re.IGNORECASE)
+class ORJSONResponse(JSONResponse):
+    # Serializes with orjson when it is installed (numpy scalars and dates
+    # included), with the standard json module otherwise.
 
-    name = re.sub(r"\s+", " ", name).strip()
-    name = name.rstrip(",").strip()
+    def render(self, content):
+        if orjson is None:
+            return super().render(jsonable_encoder(content))
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
 
-    return name
 
+@router.get("/sort_by_year")
+def sort_by_year(tenant: str = Depends(tenant_id)):
+    with span("sort_by_year.sql"):
+        cursor = get_database(tenant).connection().cursor()
+        cursor.execute("SELECT year, total FROM Spending_Yearly ORDER BY year")
+        rows = cursor.fetchall()
+        cursor.close()
+
+    yearly_spending = {year: int(round(total)) for year, total in rows}
+    return yearly_spending
 
-df["normalized_store"] = df["org_name"].apply(normalize_store_name)
-unique_stores = df["normalized_store"].unique()
 
-def similar(a, b):
-    a = a.lower()
-    b = b.lower()
-    return a in b or b in a
+STORE_SORT_KEYS = Literal[
+    "Spend", "visit_count", "avg_spend_per_visit", "avg_spend_per_month", "months_active", "org_name"
+]
+MAX_STORE_PAGE_SIZE = 500
 
 
-store_map = {}
-for s in unique_stores:
-    found = False
-    for k in list(store_map.keys()):
-        if similar(s, k):
-            store_map[s] = k
-            found = True
-            break
-    if not found:
-        store_map[s] = s
+def sort_stores(stores, sort, order):
+    # Stores without a value (None/NaN) go last in both directions.
+    def missing(store):
+        value = store.get(sort)
+        return value is None or (isinstance(value, float) and math.isnan(value))
 
-df["store_group"] = df["normalized_store"].apply(lambda x: store_map.get(x, x))
-spend_per_month = df.groupby("Month")["Spend"].sum().reset_index()
+    ranked = sorted((store for store in stores if not missing(store)),
+                    key=lambda store: store[sort], reverse=order == "desc")
+    return ranked + [store for store in stores if missing(store)]
 
 
-def get_top_category(series):
-    series_clean = series.dropna()
-    if len(series_clean) == 0:
-        return "Unknown"
-    vc = series_clean.value_counts()
-    if len(vc) > 0:
-        return vc.index[0]
-    return "Unknown"
-
-
-store_stats = df.groupby("store_group").agg({
-    "Spend": "sum",
-    "ai_category": get_top_category
-}).reset_index()
-
-store_stats = store_stats.rename(columns={
-    "store_group": "org_name",
-    "ai_category": "top_category"
-})
-
-basket_totals = df.groupby("fs_receipt_id")["Spend"].sum()
-avg_basket = basket_totals.mean()
-median_basket = basket_totals.median()
-
-category_share = (
-    df.groupby("ai_category")["Spend"].sum()
-    .sort_values(ascending=False)
-    .reset_index()
-)
-
-spend_by_city = df.groupby("unit_municipality")["Spend"].sum().reset_index()
-
-
-store_visits = df.groupby("store_group")["fs_receipt_id"].nunique()
-store_month_spend = df.groupby(["store_group", "Month"])["Spend"].sum().reset_index()
-avg_month_spend = store_month_spend.groupby("store_group")["Spend"].mean()
-
-store_stats = store_stats.merge(
-    store_visits.rename("visit_count"),
-    left_on="org_name",
-    right_index=True,
-    how="left"
-)
-
-store_stats = store_stats.merge(
-    avg_month_spend.rename("avg_spend_per_month"),
-    left_on="org_name",
-    right_index=True,
-    how="left"
-)
-
-store_stats["avg_spend_per_visit"] = store_stats["Spend"] / store_stats["visit_count"]
-store_stats["months_active"] = store_month_spend.groupby("store_group")["Month"].nunique().values
-
-spend_per_store = store_stats
-
-df["Qty_Anomaly"] = df["quantity"] > 5
-median_price = df.groupby("name")["price"].median()
-df = df.join(median_price, on="name", rsuffix="_median")
-df["Price_Anomaly"] = df["price"] > 2 * df["price_median"]
-
-if df["unit_municipality"].notna().any():
-    home_city = df["unit_municipality"].mode().iloc[0]
-else:
-    home_city = None
-
-df["Location_Anomaly"] = (
-    df["unit_municipality"] != home_city if home_city else False
-)
-
-travel_events = df[df["Location_Anomaly"]]
-
-duplicate_items = df[df.duplicated(
-    subset=["name", "price", "fs_receipt_id"], keep=False
-)]
-
-weekend_days = ["Saturday", "Sunday"]
-weekend_travel = travel_events[travel_events["Weekday"].isin(weekend_days)]
-weekend_travel_counts = (
-    weekend_travel.groupby("unit_municipality")["Spend"]
-    .sum()
-    .reset_index()
-    .sort_values("Spend", ascending=False)
-)
-
-
-def detect_longest_consecutive_block(date_list):
-    dates = sorted(set(pd.to_datetime(date_list)))
-    if len(dates) == 0:
-        return None
-
-    best_start = dates[0]
-    best_end = dates[0]
-    best_len = 1
-
-    cur_start = dates[0]
-    cur_end = dates[0]
-    cur_len = 1
-
-    for i in range(1, len(dates)):
-        if (dates[i] - dates[i - 1]).days == 1:
-            cur_end = dates[i]
-            cur_len += 1
-        else:
-            if cur_len > best_len:
-                best_len = cur_len
-                best_start = cur_start
-                best_end = cur_end
-            cur_start = dates[i]
-            cur_end = dates[i]
-            cur_len = 1
-
-    if cur_len > best_len:
-        best_len = cur_len
-        best_start = cur_start
-        best_end = cur_end
-
-    if best_len < 2:
-        return None
+def render_insights_page(insights, page, page_size, sort, order):
+    with span("insights.sort_stores", stores=len(insights["spend_per_store"])):
+        stores = sort_stores(insights["spend_per_store"], sort, order)
+    start = (page - 1) * page_size
 
-    return {
-        "consecutive_days": best_len,
-        "start_date": best_start.date(),
-        "end_date": best_end.date(),
-        "weekday_range": f"{best_start.strftime('%a')}–{best_end.strftime('%a')}",
-    }
+    return ORJSONResponse({
+        "home_city": insights["home_city"],
+        "vacation_cities": insights["vacation_cities"],
+        "spend_per_store": stores[start:start + page_size],
+        "stores_total": len(stores),
+        "page": page,
+        "page_size": page_size,
+        "category_share": insights["category_share"],
+        "avg_basket": insights["avg_basket"],
+        "median_basket": insights["median_basket"],
+    }).body
 
 
-vacation_cities = []
-for city, group in travel_events.groupby("unit_municipality"):
-    result = detect_longest_consecutive_block(group["Purchase_Date"].unique())
-    if result:
-        vacation_cities.append({
-            "city": city,
-            **result
-        })
-
-vacation_cities = [x for x in vacation_cities if x["city"] != home_city]
-vacation_cities = sorted(vacation_cities, key=lambda x: x["consecutive_days"], reverse=True)
-
 @router.get("/insights")
-def get_insights():
-    return {
-        "home_city": home_city,
-        "vacation_cities": vacation_cities,
-        "spend_per_store": spend_per_store.to_dict(orient="records"),
-        "category_share": category_share.to_dict(orient="records"),
-        "avg_basket": avg_basket,
-        "median_basket": median_basket,
-    }
+def get_insights(
+    tenant: str = Depends(tenant_id),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=MAX_STORE_PAGE_SIZE),
+    sort: STORE_SORT_KEYS = "Spend",
+    order: Literal["asc", "desc"] = "desc",
+    if_none_match: Optional[str] = Header(None),
+):
+    with span("insights.snapshot"):
+        insights, version = get_insights_engine(tenant).snapshot()
+
+    # Tied to the data version of the served snapshot, so the dashboard gets
+    # a 304 until new receipts are ingested and the insights are rebuilt.
+    etag = f'W/"{tenant}-{version}-{page}-{page_size}-{sort}-{order}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    return Response(render_insights_page(insights, page, page_size, sort, order),
+                    media_type="application/json", headers=headers)
 
 
 @router.get("/sort_by_week")
-async def sort_by_week():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT fs_receipt_issue_date, price FROM Receipts")
-    rows = cursor.fetchall()
-    conn.close()
+def sort_by_week(tenant: str = Depends(tenant_id)):
+    with span("sort_by_week.sql"):
+        cursor = get_database(tenant).connection().cursor()
+        cursor.execute("SELECT weekday, total FROM Spending_Weekday")
+        rows = cursor.fetchall()
+        cursor.close()
 
     weekly_spending = {
         "Monday": 0.0,
@@ -263,26 +122,25 @@ async def sort_by_week():
         "Sunday": 0.0
     }
 
-    for date_str, price in rows:
-        if not date_str or price is None:
-            continue
-        try:
-            date = datetime.datetime.fromisoformat(date_str.split(" ")[0])
-        except Exception:
-            continue
-        weekday = date.strftime("%A")
-        weekly_spending[weekday] += float(price)
+    # Spending_Weekday uses SQLite's strftime('%w'): 0 = Sunday
+    weekday_names = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+    for weekday, total in rows:
+        weekly_spending[weekday_names[weekday]] += float(total)
 
     weekly_spending = {day: int(round(total)) for day, total in weekly_spending.items()}
     return weekly_spending
 
 @router.get("/sort_by_month")
-async def sort_by_month():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT fs_receipt_issue_date, price FROM Receipts")
-    rows = cursor.fetchall()
-    conn.close()
+def sort_by_month(tenant: str = Depends(tenant_id)):
+    with span("sort_by_month.sql"):
+        cursor = get_database(tenant).connection().cursor()
+        cursor.execute("""
+            SELECT CAST(substr(month, 6, 2) AS INTEGER), SUM(total)
+            FROM Spending_Monthly
+            GROUP BY substr(month, 6, 2)
+        """)
+        rows = cursor.fetchall()
+        cursor.close()
 
     monthly_spending = {
         "January": 0.0,
@@ -299,47 +157,159 @@ async def sort_by_month():
         "December": 0.0
     }
 
-    for date_str, price in rows:
-        if not date_str or price is None:
-            continue
-        try:
-            date = datetime.datetime.fromisoformat(date_str.split(" ")[0])
-        except Exception:
-            continue
-        month_name = date.strftime("%B")
-        monthly_spending[month_name] += float(price)
+    month_names = list(monthly_spending.keys())
+    for month, total in rows:
+        monthly_spending[month_names[month - 1]] += float(total)
 
     monthly_spending = {month: int(round(total)) for month, total in monthly_spending.items()}
     return monthly_spending
 
 
 @router.get("/total_by_date")
-async def total_from_day(date: str = Query(..., description="Date in format YYYY-MM-DD")):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT price 
-        FROM Receipts 
-        WHERE DATE(fs_receipt_issue_date) = ?
-    """, (date,))
-    rows = cursor.fetchall()
-    conn.close()
-
-    total = sum(float(price[0]) for price in rows if price[0] is not None)
+def total_from_day(
+    date: str = Query(..., description="Date in format YYYY-MM-DD"),
+    tenant: str = Depends(tenant_id),
+):
+    with span("total_by_date.sql"):
+        cursor = get_database(tenant).connection().cursor()
+        cursor.execute("SELECT total FROM Spending_Daily WHERE day = ?", (date,))
+        row = cursor.fetchone()
+        cursor.close()
+
+    total = row[0] if row else 0.0
     return {"date": date, "total": int(round(total))}
 
 
-# def all_money():
-#     conn = sqlite3.connect(DB_PATH)
-#     cursor = conn.cursor()
-#
-#     cursor.execute("SELECT price FROM Receipts")
-#     rows = cursor.fetchall()
-#     conn.close()
-#
-#     all = 0.0
-#
-#     for row in rows:
-#         all += row[0]
-#
-#     return all
\ No newline at end of file
+# Upper bound for one /totals_by_date request, a year of calendar days.
+MAX_BATCH_DAYS = 366
+
+
+@router.get("/totals_by_date")
+def totals_by_date(
+    dates: Optional[List[date]] = Query(None, description="Repeatable, YYYY-MM-DD"),
+    date_from: Optional[date] = Query(None, alias="from", description="First day, YYYY-MM-DD"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last day, YYYY-MM-DD"),
+    tenant: str = Depends(tenant_id),
+):
+    # Batch form of /total_by_date for calendar views: either a list of dates
+    # or a from/to range, answered from Spending_Daily in one query. Days
+    # without receipts are returned with a total of 0.
+    if dates:
+        days = sorted(set(dates))
+    elif date_from and date_to:
+        if date_from > date_to:
+            raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+        days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    else:
+        raise HTTPException(status_code=400, detail="Pass 'dates' or both 'from' and 'to'")
+
+    if len(days) > MAX_BATCH_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_DAYS} days per request")
+
+    with span("totals_by_date.sql", days=len(days)):
+        cursor = get_database(tenant).connection().cursor()
+        cursor.execute(
+            "SELECT day, total FROM Spending_Daily WHERE day BETWEEN ? AND ?",
+            (days[0].isoformat(), days[-1].isoformat()),
+        )
+        totals = dict(cursor.fetchall())
+        cursor.close()
+
+    return {
+        "totals": [
+            {"date": day.isoformat(), "total": int(round(totals.get(day.isoformat(), 0.0)))}
+            for day in days
+        ]
+    }
+
+
+# SQL expression for the bucket a YYYY-MM-DD day falls into; weeks are labelled
+# by their Monday.
+SPENDING_BUCKETS = {
+    "day": "{day}",
+    "week": "DATE({day}, 'weekday 0', '-6 days')",
+    "month": "substr({day}, 1, 7)",
+    "year": "substr({day}, 1, 4)",
+}
+
+
+def spending_rows(tenant, source, sql, params):
+    with span("spending.sql", source=source) as timing:
+        cursor = get_database(tenant).connection().cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        timing["rows"] = len(rows)
+    return rows
+
+
+@router.get("/spending")
+def spending(
+    date_from: Optional[date] = Query(None, alias="from", description="First day, YYYY-MM-DD"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last day, YYYY-MM-DD"),
+    granularity: Literal["day", "week", "month", "year"] = "month",
+    store: Optional[str] = Query(None, description="Part of the store name, e.g. Lidl"),
+    category: Optional[str] = Query(None, description="Exact ai_category"),
+    tenant: str = Depends(tenant_id),
+):
+    # Unfiltered requests are answered from Spending_Daily; with a store or
+    # category filter the matching receipts of the date range are grouped in
+    # SQL. Either way only one row per bucket leaves the database.
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+
+    conditions, params = [], []
+    if store or category:
+        day_column = "issue_day"
+        source = "Receipts"
+        conditions.append("price IS NOT NULL")
+        if store:
+            conditions.append("org_name LIKE ?")
+            params.append(f"%{store}%")
+        if category:
+            conditions.append("ai_category = ?")
+            params.append(category)
+        amounts = "SUM(price), TOTAL(price * quantity), COUNT(*)"
+    else:
+        day_column = "day"
+        source = "Spending_Daily"
+        amounts = "SUM(total), SUM(spend), SUM(items)"
+
+    conditions.append(f"{day_column} IS NOT NULL")
+    if date_from:
+        conditions.append(f"{day_column} >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        conditions.append(f"{day_column} <= ?")
+        params.append(date_to.isoformat())
+
+    bucket = SPENDING_BUCKETS[granularity].format(day=day_column)
+    sql = f"""
+        SELECT {bucket} AS period, {amounts}
+        FROM {source}
+        WHERE {" AND ".join(conditions)}
+        GROUP BY period
+        ORDER BY period
+    """
+    if source == "Receipts":
+        # Filtered requests scan receipts: run them once per identical
+        # concurrent request.
+        key = (tenant, get_database(tenant).data_version(), sql, tuple(params))
+        rows = SPENDING_FLIGHTS.do(key, spending_rows, tenant, source, sql, params)
+    else:
+        rows = spending_rows(tenant, source, sql, params)
+
+    buckets = [
+        {"period": period, "spend": round(spend, 2), "total": round(total, 2), "items": items}
+        for period, total, spend, items in rows
+    ]
+    return {
+        "from": date_from,
+        "to": date_to,
+        "granularity": granularity,
+        "store": store,
+        "category": category,
+        "spend": round(sum(row[2] for row in rows), 2),
+        "items": sum(row[3] for row in rows),
+        "buckets": buckets,
+    }
@@ -0,0 +1,137 @@
+import math
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from backend.db import get_database
+from backend.geo_index import detect_places, distance_km, home_location, locations_in_bbox
+from backend.tenants import tenant_id
+
+router = APIRouter()
+
+# Locations closer than this many screen pixels at the requested zoom are
+# merged into one cluster (Leaflet's markercluster default radius was 60).
+CLUSTER_RADIUS_PX = 60
+TILE_SIZE_PX = 256
+# From this zoom on every location is returned on its own.
+MAX_CLUSTER_ZOOM = 16
+
+ITEM_COLUMNS = [
+    "fs_receipt_issue_date", "org_name", "name", "quantity", "price",
+    "ai_category", "unit_street_name", "unit_municipality",
+]
+
+
+def cluster_locations(locations, zoom):
+    # Grid clustering: one cell per CLUSTER_RADIUS_PX square at `zoom`. A cell
+    # with a single location returns that location unchanged.
+    cell = CLUSTER_RADIUS_PX * 360.0 / (TILE_SIZE_PX * 2 ** zoom)
+    cells = {}
+    for location in locations:
+        key = (math.floor(location["latitude"] / cell), math.floor(location["longitude"] / cell))
+        cells.setdefault(key, []).append(location)
+
+    stores, clusters = [], []
+    for members in cells.values():
+        if len(members) == 1:
+            stores.append(members[0])
+            continue
+        items = sum(m["items"] for m in members)
+        clusters.append({
+            "latitude": sum(m["latitude"] * m["items"] for m in members) / items,
+            "longitude": sum(m["longitude"] * m["items"] for m in members) / items,
+            "stores": len(members),
+            "items": items,
+            "spend": sum(m["spend"] for m in members),
+            "min_lat": min(m["latitude"] for m in members),
+            "max_lat": max(m["latitude"] for m in members),
+            "min_lon": min(m["longitude"] for m in members),
+            "max_lon": max(m["longitude"] for m in members),
+        })
+    return stores, clusters
+
+
+@router.get("/stores")
+def get_stores(
+    min_lat: float = Query(-90.0, ge=-90, le=90),
+    max_lat: float = Query(90.0, ge=-90, le=90),
+    min_lon: float = Query(-180.0, ge=-180, le=180),
+    max_lon: float = Query(180.0, ge=-180, le=180),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom; clusters nearby stores below 16"),
+    min_home_km: Optional[float] = Query(None, ge=0, description="Only stores at least this far from home"),
+    max_home_km: Optional[float] = Query(None, ge=0, description="Only stores at most this far from home"),
+    min_weekend_ratio: Optional[float] = Query(None, ge=0, le=1, description="Share of receipts on weekends"),
+    tenant: str = Depends(tenant_id),
+):
+    # Store locations inside the bounding box, looked up through the R*Tree
+    # index of Store_Locations, filtered and clustered for the zoom level.
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Bounding box minimum is greater than its maximum")
+
+    conn = get_database(tenant).connection()
+    home = home_location(conn)
+    locations = locations_in_bbox(conn, min_lat, max_lat, min_lon, max_lon)
+
+    for location in locations:
+        location["weekend_ratio"] = (
+            location["weekend_receipts"] / location["receipts"] if location["receipts"] else 0.0
+        )
+        location["home_km"] = distance_km(
+            home["latitude"], home["longitude"], location["latitude"], location["longitude"]
+        ) if home else None
+
+    if home is not None:
+        if min_home_km is not None:
+            locations = [l for l in locations if l["home_km"] >= min_home_km]
+        if max_home_km is not None:
+            locations = [l for l in locations if l["home_km"] <= max_home_km]
+    if min_weekend_ratio is not None:
+        locations = [l for l in locations if l["weekend_ratio"] >= min_weekend_ratio]
+
+    if zoom is not None and zoom < MAX_CLUSTER_ZOOM:
+        stores, clusters = cluster_locations(locations, zoom)
+    else:
+        stores, clusters = locations, []
+
+    return {
+        "home": home,
+        "total": len(locations),
+        "max_spend": max((l["spend"] for l in locations), default=0.0),
+        "stores": stores,
+        "clusters": clusters,
+    }
+
+
+@router.get("/places")
+def get_places(tenant: str = Depends(tenant_id)):
+    # Detected home, work and vacation locations for the map legend markers.
+    return detect_places(get_database(tenant).connection())
+
+
+@router.get("/stores/{location_id}/items")
+def get_store_items(
+    location_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    tenant: str = Depends(tenant_id),
+):
+    # Latest receipt items bought at one location, for the store popup.
+    cursor = get_database(tenant).connection().cursor()
+    try:
+        cursor.execute(
+            "SELECT latitude, longitude FROM Store_Locations WHERE id = ?", (location_id,)
+        )
+        location = cursor.fetchone()
+        if location is None:
+            raise HTTPException(status_code=404, detail=f"Unknown store location: {location_id}")
+
+        cursor.execute(f"""
+            SELECT {", ".join(ITEM_COLUMNS)}
+            FROM Receipts
+            WHERE unit_latitude = ? AND unit_longitude = ?
+            ORDER BY issue_ts DESC, rowid DESC
+            LIMIT ?
+        """, (*location, limit))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    return [dict(zip(ITEM_COLUMNS, row)) for row in rows]
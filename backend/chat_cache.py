@@ -0,0 +1,183 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+from backend.intent_router import PERIOD_PATTERN, get_intent_router
+from backend.tenants import DEFAULT_TENANT
+
+SQL_CACHE_SIZE = 1024
+SQL_CACHE_TTL = 24 * 60 * 60
+ANSWER_CACHE_SIZE = 1024
+ANSWER_CACHE_TTL = 60 * 60
+
+# Cosine similarity above which two differently worded queries share their SQL.
+SEMANTIC_THRESHOLD = 0.92
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?!. ")
+
+
+class LRUCache:
+    # Thread-safe LRU with a per-entry time-to-live.
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ChatCache:
+    # Tier 1: normalized query (or a semantically close one) -> intent data with SQL.
+    # Tier 2: (SQL, parameters, data version) -> the finished answer() result.
+    # Both tiers are keyed by tenant as well; entries never cross tenants.
+    #
+    # Semantic matches are only accepted when both queries mention the same
+    # stores, categories, numbers and period words, so "spent at Lidl" never
+    # reuses the SQL of "spent at Tesco" however close the embeddings are.
+    #
+    # SQL written for a question with period words ("this month", "last
+    # week", "today") has that day's dates in it, so tier 1 keys those
+    # questions on the current date as well and they expire at midnight.
+
+    def __init__(self, embedder=None, signature=None, threshold=SEMANTIC_THRESHOLD,
+                 sql_size=SQL_CACHE_SIZE, sql_ttl=SQL_CACHE_TTL,
+                 answer_size=ANSWER_CACHE_SIZE, answer_ttl=ANSWER_CACHE_TTL, today=date.today):
+        self.embedder = embedder
+        self.signature = signature
+        self.threshold = threshold
+        self.today = today
+        self.sql_cache = LRUCache(sql_size, sql_ttl)
+        self.answer_cache = LRUCache(answer_size, answer_ttl)
+        self._vectors = {}
+        self._lock = threading.Lock()
+        self._data_versions = {}
+
+    def query_signature(self, query, tenant=None):
+        signature = tuple(NUMBER_PATTERN.findall(query))
+        if self.signature is not None:
+            signature += tuple(self.signature(query, tenant))
+        return signature
+
+    def sql_key(self, query, tenant=None):
+        normalized = normalize_query(query)
+        day = self.today().isoformat() if PERIOD_PATTERN.search(normalized) else None
+        return tenant or DEFAULT_TENANT, normalized, day
+
+    def lookup_sql(self, query, tenant=None):
+        tenant = tenant or DEFAULT_TENANT
+        key = self.sql_key(query, tenant)
+        intent_data = self.sql_cache.get(key)
+        if intent_data is not None or self.embedder is None:
+            return intent_data
+
+        vector = self._embed(key[1])
+        with self._lock:
+            self._prune_vectors()
+            keys = [k for k in self._vectors if k[0] == tenant and k[2] == key[2]]
+            if not keys:
+                return None
+            matrix = np.stack([self._vectors[k][0] for k in keys])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        match = keys[best]
+        if self._vectors.get(match, (None, None))[1] != self.query_signature(query, tenant):
+            return None
+        return self.sql_cache.get(match)
+
+    def store_sql(self, query, intent_data, tenant=None):
+        tenant = tenant or DEFAULT_TENANT
+        key = self.sql_key(query, tenant)
+        self.sql_cache.put(key, intent_data)
+        if self.embedder is not None:
+            vector = self._embed(key[1])
+            with self._lock:
+                self._vectors[key] = (vector, self.query_signature(query, tenant))
+
+    def lookup_answer(self, sql, params, data_version, tenant=None):
+        tenant = tenant or DEFAULT_TENANT
+        self._check_version(tenant, data_version)
+        return self.answer_cache.get((tenant, sql, tuple(params), data_version))
+
+    def store_answer(self, sql, params, data_version, result, tenant=None):
+        tenant = tenant or DEFAULT_TENANT
+        self._check_version(tenant, data_version)
+        self.answer_cache.put((tenant, sql, tuple(params), data_version), result)
+
+    def invalidate(self, tenant=None):
+        if tenant is None:
+            self.answer_cache.clear()
+            return
+        for key in self.answer_cache.keys():
+            if key[0] == tenant:
+                self.answer_cache.pop(key)
+
+    def _check_version(self, tenant, data_version):
+        # New receipts make every cached answer of that tenant stale.
+        if self._data_versions.get(tenant) != data_version:
+            self.invalidate(tenant)
+            self._data_versions[tenant] = data_version
+
+    def _embed(self, text):
+        vector = np.asarray(self.embedder([text]), dtype=np.float32).reshape(-1)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _prune_vectors(self):
+        live = set(self.sql_cache.keys())
+        for key in [k for k in self._vectors if k not in live]:
+            del self._vectors[key]
+
+
+_chat_cache = None
+
+
+def get_chat_cache():
+    global _chat_cache
+    if _chat_cache is None:
+        router = get_intent_router()
+        _chat_cache = ChatCache(embedder=router.embedder, signature=router.query_entities)
+    return _chat_cache
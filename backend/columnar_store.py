@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+COLUMNAR_DIR = r"data/columnar/receipts"
+MANIFEST_FILE = "manifest.json"
+
+# Low-cardinality text columns stored dictionary-encoded; they come back as
+# pandas categoricals, so each distinct store/category/city is held once.
+CATEGORICAL_COLUMNS = ("org_name", "ai_category", "unit_municipality")
+
+# Receipts without a parsable date go to their own partition.
+UNDATED_PARTITION = "undated"
+
+SQLITE_TO_ARROW = {
+    "INTEGER": "int64",
+    "REAL": "float64",
+    "TEXT": "string",
+}
+
+
+def columnar_dir_for(db_path):
+    # <root>/data_base/data.db -> <root>/columnar/receipts, so the default
+    # database keeps data/columnar/receipts and every tenant gets its own.
+    return os.path.join(os.path.dirname(os.path.dirname(db_path)), "columnar", "receipts")
+
+
+def columnar_available():
+    return pa is not None
+
+
+def arrow_schema(conn):
+    fields = []
+    for _, name, declared, *_ in conn.execute('PRAGMA table_info("Receipts")'):
+        if name in CATEGORICAL_COLUMNS:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(name, pa.type_for_alias(SQLITE_TO_ARROW.get(declared.upper(), "string"))))
+    return pa.schema(fields)
+
+
+def partition_path(month, out_dir=COLUMNAR_DIR):
+    return os.path.join(out_dir, f"month={month}.arrow")
+
+
+def read_manifest(out_dir=COLUMNAR_DIR):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, write):
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_partition(conn, schema, month, out_dir):
+    if month == UNDATED_PARTITION:
+        df = pd.read_sql("SELECT * FROM Receipts WHERE issue_day IS NULL ORDER BY rowid", conn)
+    else:
+        df = pd.read_sql(
+            "SELECT * FROM Receipts WHERE issue_day BETWEEN ? AND ? ORDER BY rowid",
+            conn, params=(f"{month}-01", f"{month}-31"),
+        )
+
+    path = partition_path(month, out_dir)
+    if df.empty:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+
+    # 64-bit integer columns with NULLs arrive from SQLite as float
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            df[field.name] = df[field.name].astype("Int64")
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+    def write(tmp_path):
+        # Uncompressed IPC files can be memory-mapped and read without a copy.
+        with pa.OSFile(tmp_path, "wb") as sink, ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+
+    _write_atomic(path, write)
+    return len(df)
+
+
+def write_columnar_cache(conn, data_version, months=None, base_version=None, out_dir=COLUMNAR_DIR):
+    # Exports Receipts as one Arrow IPC file per month plus a manifest stamped
+    # with the data version. With `months`, only those partitions are rewritten,
+    # provided the cache on disk was current at `base_version`; otherwise the
+    # whole cache is rebuilt.
+    if not columnar_available():
+        print("[WARN] pyarrow is not installed, the columnar cache is not built")
+        return None
+
+    manifest = read_manifest(out_dir)
+    partial = (
+        months is not None
+        and manifest is not None
+        and manifest.get("data_version") == base_version
+    )
+    if not partial:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        manifest = {"partitions": {}}
+        months = [row[0] for row in conn.execute(
+            "SELECT DISTINCT SUBSTR(issue_day, 1, 7) FROM Receipts WHERE issue_day IS NOT NULL")]
+        months.append(UNDATED_PARTITION)
+    os.makedirs(out_dir, exist_ok=True)
+
+    schema = arrow_schema(conn)
+    partitions = dict(manifest["partitions"])
+    for month in months:
+        rows = _write_partition(conn, schema, month, out_dir)
+        if rows:
+            partitions[month] = rows
+        else:
+            partitions.pop(month, None)
+
+    manifest = {
+        "data_version": data_version,
+        "columns": schema.names,
+        "partitions": dict(sorted(partitions.items())),
+    }
+
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    _write_atomic(os.path.join(out_dir, MANIFEST_FILE), write)
+    return manifest
+
+
+def read_receipts_columns(columns, data_version=None, months=None, out_dir=COLUMNAR_DIR):
+    # Loads only `columns` (and only the `months` partitions, if given) from the
+    # memory-mapped cache. Returns None when the cache is missing, lacks a
+    # column, or was written for another data version, so callers can fall
+    # back to SQLite.
+    if not columnar_available():
+        return None
+
+    manifest = read_manifest(out_dir)
+    if manifest is None:
+        return None
+    if data_version is not None and manifest.get("data_version") != data_version:
+        return None
+    if any(column not in manifest["columns"] for column in columns):
+        return None
+
+    wanted = manifest["partitions"] if months is None else [m for m in months if m in manifest["partitions"]]
+    tables = []
+    try:
+        for month in wanted:
+            # The map stays open as long as the table's buffers reference it.
+            source = pa.memory_map(partition_path(month, out_dir))
+            tables.append(ipc.open_file(source).read_all().select(list(columns)))
+    except (OSError, pa.ArrowInvalid) as e:
+        print(f"[WARN] Columnar cache unreadable, falling back to SQLite: {e}")
+        return None
+
+    if not tables:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in columns})
+    df = pa.concat_tables(tables).to_pandas()
+    # Dictionaries are in order of first appearance; sort them so groupby on a
+    # categorical orders its groups the same way as on plain strings.
+    for column in df.columns.intersection(CATEGORICAL_COLUMNS):
+        df[column] = df[column].cat.reorder_categories(sorted(df[column].cat.categories))
+    return df
@@ -1,74 +1,74 @@
 import os
 import json
 import sqlite3
+import asyncio
+import threading
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
 from dotenv import load_dotenv
 from llama_index.core import Settings
 from llama_index.llms.groq import Groq
 
-load_dotenv()
-
-DB_PATH = ("data/data_base/data.db")
-
-
-def get_table_name(db_path: str = DB_PATH) -> str:
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = [table[0] for table in cursor.fetchall()]
-        conn.close()
+from backend.chat_cache import get_chat_cache, normalize_query
+from backend.db import get_database
+from backend.intent_router import get_intent_router
+from backend.metrics import SQL_ROWS, annotate, record_answer, record_cache_lookup, span, trace
+from backend.product_search import rewrite_product_search
+from backend.result_compaction import compact_result, estimate_tokens
+from backend.single_flight import SingleFlight
+from backend.sql_guard import MAX_RESULT_ROWS, SQLGuardError, guarded_execute
+from backend.template_answers import render_template_answer
+from backend.tenants import DEFAULT_TENANT
 
+load_dotenv()
 
-        for table in tables:
-            if table.lower() in ['receipts', 'transactions', 'receipt']:
-                return table
-
-        return tables[0] if tables else "transactions"
-    except Exception as e:
-        print(f"[ERROR] Failed to get table name: {e}")
-        return "transactions"
+LLM_MODEL = "llama-3.3-70b-versatile"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# SQLite and cache work of the async pipeline runs here so it never blocks the event loop.
+DB_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_WORKERS", "8")), thread_name_prefix="chat-db"
+)
+
+_llm = None
+_llm_lock = threading.Lock()
+
+# Identical questions asked while one is being answered wait for that answer
+# instead of making their own LLM calls.
+ANSWER_FLIGHTS = SingleFlight("answer")
+
+
+def get_llm():
+    # One Groq client per process; its sync and async HTTP clients keep pooled
+    # keep-alive connections, so chat requests no longer pay a TLS handshake each.
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                limits = httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                )
+                _llm = Groq(
+                    model=LLM_MODEL,
+                    api_key=os.getenv("GROQ_API_KEY"),
+                    timeout=LLM_TIMEOUT,
+                    reuse_client=True,
+                    http_client=httpx.Client(limits=limits, timeout=LLM_TIMEOUT),
+                    async_http_client=httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT),
+                )
+    return _llm
 
 
 def init_models():
-    Settings.llm = Groq(
-        model="llama-3.3-70b-versatile",
-        api_key=os.getenv("GROQ_API_KEY"),
-    )
-
-
-def check_database(db_path: str = DB_PATH) -> bool:
-    try:
-        if not os.path.exists(db_path):
-            print(f"[ERROR] Database file not found: {db_path}")
-            return False
-
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-
-        conn.close()
-
-        if not tables:
-            print(f"[ERROR] No tables found in database: {db_path}")
-            return False
-
-        print(f"[INFO] Database check passed. Found tables: {[table[0] for table in tables]}")
-        return True
+    Settings.llm = get_llm()
 
-    except sqlite3.Error as e:
-        print(f"[ERROR] Database connection failed: {e}")
-        return False
-    except Exception as e:
-        print(f"[ERROR] Unexpected error during database check: {e}")
-        return False
-
-
-def classify_intent_and_generate_sql(query: str, table_name: str) -> dict:
-    init_models()
-    llm = Settings.llm
 
+def build_sql_prompt(query: str, table_name: str) -> str:
     prompt = f"""
 You are an SQL expert. You analyze user queries and generate SQL queries.
 
@@ -79,6 +79,8 @@ Table structure "{table_name}":
 - price (REAL) - prices are in EUROS
 - fs_receipt_id (TEXT)
 - fs_receipt_issue_date (TEXT)
+- issue_day (TEXT) - purchase date as YYYY-MM-DD, indexed
+- issue_ts (INTEGER) - purchase time as unix epoch seconds, indexed
 - org_name (TEXT) - store name
 - ai_category (TEXT) - product category
 - ai_name_without_brand_and_quantity (TEXT)
@@ -126,10 +128,10 @@ If SQL not needed (greeting or complex query):
 SQL rules:
 - IMPORTANT: Use table name "{table_name}" not "transactions"
 - Use LIKE '%...%' for string searches (case insensitive)
-- For dates use strftime and comparisons
+- For dates filter on issue_day (e.g. issue_day = '2024-05-01', issue_day BETWEEN '2024-05-01' AND '2024-05-31'), do not wrap it in functions
 - For amounts use SUM(price)
 - Always add LIMIT unless specified otherwise
-- For product search look in name, ai_name_without_brand_and_quantity
+- For product search look in name, ai_name_without_brand_and_quantity, ai_name_in_english_without_brand_and_quantity and ai_brand, as (col LIKE '%...%' OR col LIKE '%...%')
 - Remember: all prices are in EUROS
 
 Examples:
@@ -140,6 +142,9 @@ Query: "how much did I spend in total?"
 Query: "what did I buy at Lidl?"
 {{"intent": "spending_store", "sql": "SELECT name, price, fs_receipt_issue_date FROM {table_name} WHERE org_name LIKE '%Lidl%' ORDER BY fs_receipt_issue_date DESC LIMIT 10", "needs_formatting": true}}
 
+Query: "how much did I spend on milk?"
+{{"intent": "product_search", "sql": "SELECT SUM(price) as total, COUNT(*) as count FROM {table_name} WHERE (name LIKE '%mlieko%' OR ai_name_in_english_without_brand_and_quantity LIKE '%milk%')", "needs_formatting": true}}
+
 Query: "most frequent category"
 {{"intent": "most_frequent", "sql": "SELECT ai_category, COUNT(*) as count, SUM(price) as total FROM {table_name} GROUP BY ai_category ORDER BY count DESC LIMIT 5", "needs_formatting": true}}
 
@@ -147,9 +152,11 @@ User query: "{query}"
 
 Respond with ONLY the JSON object, nothing else:
 """
+    return prompt
 
-    response = llm.complete(prompt).text.strip()
 
+def parse_sql_response(response: str) -> dict:
+    response = response.strip()
     response = response.replace("```json", "").replace("```", "").strip()
 
     if not response.startswith("{"):
@@ -180,42 +187,52 @@ Respond with ONLY the JSON object, nothing else:
     return data
 
 
+def classify_intent_and_generate_sql(query: str, table_name: str) -> dict:
+    prompt = build_sql_prompt(query, table_name)
+    with span("classify_llm") as timing:
+        response = get_llm().complete(prompt).text
+        timing.update(prompt_tokens=estimate_tokens(prompt), response_tokens=estimate_tokens(response))
+    return parse_sql_response(response)
 
-def execute_sql(sql_query: str, db_path: str = DB_PATH):
 
-    try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+async def aclassify_intent_and_generate_sql(query: str, table_name: str) -> dict:
+    prompt = build_sql_prompt(query, table_name)
+    with span("classify_llm") as timing:
+        response = (await get_llm().acomplete(prompt)).text
+        timing.update(prompt_tokens=estimate_tokens(prompt), response_tokens=estimate_tokens(response))
+    return parse_sql_response(response)
 
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
 
-        result = []
-        for row in rows:
-            result.append(dict(row))
+def execute_sql(sql_query: str, params: tuple = (), tenant: str = None):
 
-        conn.close()
-        return result
+    try:
+        result, truncated = guarded_execute(get_database(tenant).connection(), sql_query, params)
+
+        return result, truncated
 
+    except SQLGuardError as e:
+        print(f"[ERROR] SQL rejected: {e}")
+        print(f"[ERROR] Query was: {sql_query}")
+        return None, False
     except sqlite3.Error as e:
         print(f"[ERROR] SQL execution failed: {e}")
         print(f"[ERROR] Query was: {sql_query}")
-        return None
+        return None, False
     except Exception as e:
         print(f"[ERROR] Unexpected error: {e}")
-        return None
-
+        return None, False
 
-def format_sql_results(intent: str, sql_result: list, query: str) -> str:
 
-    if not sql_result:
-        return "No results found for your query."
+TRUNCATED_RULE = f"""8. The result was cut off at the first {MAX_RESULT_ROWS} rows. Sums, counts and averages
+   over these rows are partial: never present them as totals, and tell the user
+   the answer only covers the first {MAX_RESULT_ROWS} rows
+"""
 
-    init_models()
-    llm = Settings.llm
 
-    result_json = json.dumps(sql_result, ensure_ascii=False, indent=2)
+def build_format_prompt(query: str, sql_result: list, truncated: bool = False) -> str:
+    result_payload = compact_result(sql_result, truncated)
+    full_tokens = estimate_tokens(json.dumps(sql_result, ensure_ascii=False, indent=2))
+    annotate(format_rows_tokens=full_tokens, format_payload_tokens=estimate_tokens(result_payload))
 
     prompt = f"""
 You are a financial assistant. The user asked a question, we executed an SQL query.
@@ -232,38 +249,98 @@ Rules:
    - Examples: "25.50€", "1,234.56€", "total of 500€"
    - NEVER show amounts without the € symbol
    - Format: X.XX€ (always 2 decimal places)
-
+{TRUNCATED_RULE if truncated else ""}
 User's question: "{query}"
 
-SQL query result (all prices are in Euros):
-{result_json}
+SQL query result (CSV, all prices are in Euros):
+{result_payload}
 
 Formulate an answer for the user (remember to add € to ALL amounts):
 """
+    return prompt
+
 
-    response = llm.complete(prompt).text.strip()
+def format_sql_results(intent: str, sql_result: list, query: str, truncated: bool = False) -> str:
+
+    if not sql_result:
+        return "No results found for your query."
+
+    prompt = build_format_prompt(query, sql_result, truncated)
+    with span("format_llm") as timing:
+        response = get_llm().complete(prompt).text.strip()
+        timing.update(prompt_tokens=estimate_tokens(prompt), response_tokens=estimate_tokens(response))
     return response
 
 
-def answer(query: str):
+async def aformat_sql_results(intent: str, sql_result: list, query: str, truncated: bool = False) -> str:
 
-    if not check_database():
-        return {
-            "mode": "error",
-            "intent": "fallback",
-            "sql": None,
-            "result": "Sorry, database is not available. Please check the database connection.",
-            "db_available": False
-        }
+    if not sql_result:
+        return "No results found for your query."
+
+    prompt = build_format_prompt(query, sql_result, truncated)
+    with span("format_llm") as timing:
+        response = (await get_llm().acomplete(prompt)).text.strip()
+        timing.update(prompt_tokens=estimate_tokens(prompt), response_tokens=estimate_tokens(response))
+    return response
+
+
+DB_UNAVAILABLE_RESULT = {
+    "mode": "error",
+    "intent": "fallback",
+    "sql": None,
+    "result": "Sorry, database is not available. Please check the database connection.",
+    "db_available": False
+}
+
+
+def resolve_intent_locally(query: str, tenant: str = None):
+    # Everything answer() can decide without the classification LLM call:
+    # returns (early result, table name, intent data or None).
+    database = get_database(tenant)
+    with span("check_database"):
+        available = database.is_available()
+    if not available:
+        return DB_UNAVAILABLE_RESULT, None, None
+
+    table_name = database.table_name
+
+    with span("sql_cache"):
+        intent_data = get_chat_cache().lookup_sql(query, tenant)
+    record_cache_lookup("sql", intent_data is not None)
+    if intent_data is not None:
+        return None, table_name, intent_data
 
+    with span("intent_router") as timing:
+        intent_data = get_intent_router().route(query, table_name, tenant)
+        timing["matched"] = intent_data is not None
+    if intent_data is not None:
+        remember_intent(query, intent_data, tenant)
+    return None, table_name, intent_data
 
-    table_name = get_table_name()
-    print(f"[INFO] Using table: {table_name}")
 
-    intent_data = classify_intent_and_generate_sql(query, table_name)
+def route_product_search(intent_data: dict, table_name: str, tenant: str = None) -> dict:
+    # Product searches from the LLM come with LIKE '%...%' predicates, which
+    # scan every row; run them through the Products_FTS index instead.
+    if intent_data.get("intent") != "product_search" or not intent_data.get("sql"):
+        return intent_data
+    if "Products_FTS" not in get_database(tenant).tables:
+        return intent_data
+
+    rewritten = rewrite_product_search(intent_data["sql"], table_name)
+    if rewritten is None:
+        return intent_data
+    sql_query, params = rewritten
+    annotate(product_search="fts", fts_match=params[0])
+    return {**intent_data, "sql": sql_query, "params": params}
+
+
+def remember_intent(query: str, intent_data: dict, tenant: str = None):
+    if intent_data.get("intent") == "greeting" or intent_data.get("sql"):
+        get_chat_cache().store_sql(query, intent_data, tenant)
+
+
+def direct_result(intent_data: dict):
     intent = intent_data.get("intent")
-    sql_query = intent_data.get("sql")
-    needs_formatting = intent_data.get("needs_formatting", False)
 
     if intent == "greeting":
         return {
@@ -274,7 +351,7 @@ def answer(query: str):
             "db_available": True
         }
 
-    if intent == "fallback" or not sql_query:
+    if intent == "fallback" or not intent_data.get("sql"):
         return {
             "mode": "fallback",
             "intent": intent,
@@ -283,25 +360,37 @@ def answer(query: str):
             "db_available": True
         }
 
-    sql_result = execute_sql(sql_query)
+    return None
+
+
+def run_query(intent_data: dict, tenant: str = None):
+    # Returns (cached answer or None, SQL rows, whether the rows were cut off
+    # at MAX_RESULT_ROWS, data version).
+    sql_query = intent_data.get("sql")
+    params = tuple(intent_data.get("params") or ())
+
+    data_version = get_database(tenant).data_version()
+
+    with span("answer_cache"):
+        cached = get_chat_cache().lookup_answer(sql_query, params, data_version, tenant)
+    record_cache_lookup("answer", cached is not None)
+    if cached is not None:
+        return cached, None, False, data_version
 
+    with span("execute_sql") as timing:
+        sql_result, truncated = execute_sql(sql_query, params=params, tenant=tenant)
+        timing["rows"] = len(sql_result) if sql_result is not None else None
     if sql_result is not None:
-        if needs_formatting and sql_result:
-            formatted_answer = format_sql_results(intent, sql_result, query)
-        elif sql_result:
-            formatted_answer = json.dumps(sql_result, ensure_ascii=False, indent=2)
-        else:
-            formatted_answer = "No results found for your query."
+        SQL_ROWS.observe(len(sql_result), intent=intent_data.get("intent"))
+        annotate(rows=len(sql_result), truncated=truncated)
+    return None, sql_result, truncated, data_version
 
-        return {
-            "mode": "sql",
-            "intent": intent,
-            "sql": sql_query,
-            "result": formatted_answer,
-            "raw_result": sql_result,
-            "db_available": True
-        }
-    else:
+
+def query_result(intent_data: dict, sql_result, formatted_answer, data_version, tenant: str = None):
+    intent = intent_data.get("intent")
+    sql_query = intent_data.get("sql")
+
+    if sql_result is None:
         return {
             "mode": "error",
             "intent": intent,
@@ -310,9 +399,215 @@ def answer(query: str):
             "db_available": True
         }
 
+    result = {
+        "mode": "sql",
+        "intent": intent,
+        "sql": sql_query,
+        "result": formatted_answer,
+        "raw_result": sql_result,
+        "db_available": True
+    }
+    params = tuple(intent_data.get("params") or ())
+    get_chat_cache().store_answer(sql_query, params, data_version, result, tenant)
+    return result
+
+
+def needs_llm_formatting(intent_data: dict, sql_result) -> bool:
+    return bool(intent_data.get("needs_formatting", False) and sql_result)
+
+
+def unformatted_answer(sql_result) -> str:
+    if sql_result:
+        return json.dumps(sql_result, ensure_ascii=False, indent=2)
+    return "No results found for your query."
+
+
+def local_answer(intent_data: dict, sql_result, truncated: bool = False):
+    # The answer text when no LLM call is needed: raw rows for intents that do
+    # not ask for formatting, a template for simple result shapes. None means
+    # the formatter LLM has to write it (or the query failed). Templates add
+    # rows up, so a result cut off at MAX_RESULT_ROWS goes to the LLM, which
+    # is told the sums are partial.
+    if sql_result is None:
+        return None
+    with span("format_local"):
+        if needs_llm_formatting(intent_data, sql_result):
+            if truncated:
+                return None
+            return render_template_answer(intent_data.get("intent"), sql_result)
+        return unformatted_answer(sql_result)
+
+
+def answer_key(query: str, tenant: str = None):
+    # Single-flight key: the normalized question and the data version it is
+    # answered against, per tenant.
+    database = get_database(tenant)
+    version = database.data_version() if database.is_available() else None
+    return tenant or DEFAULT_TENANT, normalize_query(query), version
+
+
+def answer(query: str, tenant: str = None):
+    # Every call is traced: per-stage spans, intent, rows and cache results
+    # end up in the /metrics histograms and /metrics/traces.
+    started = time.perf_counter()
+    with trace("answer"):
+        result = ANSWER_FLIGHTS.do(answer_key(query, tenant), _answer, query, tenant)
+        record_answer(result, time.perf_counter() - started)
+    return result
+
+
+def _answer(query: str, tenant: str = None):
+
+    early, table_name, intent_data = resolve_intent_locally(query, tenant)
+    if early is not None:
+        return early
+
+    if intent_data is None:
+        intent_data = classify_intent_and_generate_sql(query, table_name)
+        intent_data = route_product_search(intent_data, table_name, tenant)
+        remember_intent(query, intent_data, tenant)
+
+    direct = direct_result(intent_data)
+    if direct is not None:
+        return direct
+
+    cached, sql_result, truncated, data_version = run_query(intent_data, tenant)
+    if cached is not None:
+        return cached
+
+    formatted_answer = local_answer(intent_data, sql_result, truncated)
+    if formatted_answer is None and needs_llm_formatting(intent_data, sql_result):
+        formatted_answer = format_sql_results(intent_data.get("intent"), sql_result, query, truncated)
+
+    return query_result(intent_data, sql_result, formatted_answer, data_version, tenant)
+
+
+async def run_blocking(func, *args):
+    # The worker runs in a copy of the caller's context, so its spans land in
+    # the caller's trace.
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, context.run, func, *args)
+
+
+async def aanswer(query: str, tenant: str = None):
+    started = time.perf_counter()
+    with trace("aanswer"):
+        key = await run_blocking(answer_key, query, tenant)
+        result = await ANSWER_FLIGHTS.ado(key, _aanswer, query, tenant)
+        record_answer(result, time.perf_counter() - started)
+    return result
+
+
+async def _aanswer(query: str, tenant: str = None):
+    # Same pipeline as answer(), but the LLM calls are awaited on the shared
+    # async client and SQLite/cache work is pushed to DB_EXECUTOR.
+
+    early, table_name, intent_data = await run_blocking(resolve_intent_locally, query, tenant)
+    if early is not None:
+        return early
+
+    if intent_data is None:
+        intent_data = await aclassify_intent_and_generate_sql(query, table_name)
+        intent_data = route_product_search(intent_data, table_name, tenant)
+        await run_blocking(remember_intent, query, intent_data, tenant)
+
+    direct = direct_result(intent_data)
+    if direct is not None:
+        return direct
+
+    cached, sql_result, truncated, data_version = await run_blocking(run_query, intent_data, tenant)
+    if cached is not None:
+        return cached
+
+    formatted_answer = local_answer(intent_data, sql_result, truncated)
+    if formatted_answer is None and needs_llm_formatting(intent_data, sql_result):
+        formatted_answer = await aformat_sql_results(intent_data.get("intent"), sql_result, query, truncated)
+
+    return await run_blocking(query_result, intent_data, sql_result, formatted_answer, data_version, tenant)
+
+
+async def astream_answer(query: str, tenant: str = None):
+    started = time.perf_counter()
+    with trace("astream_answer"):
+        key = await run_blocking(answer_key, query, tenant)
+
+        # The same question is already being answered: replay its result.
+        shared = await ANSWER_FLIGHTS.join(key)
+        if shared is not None:
+            yield "meta", {"intent": shared["intent"], "sql": shared["sql"], "rows": shared.get("raw_result")}
+            yield "token", {"text": shared["result"]}
+            record_answer(shared, time.perf_counter() - started)
+            yield "done", shared
+            return
+
+        flight = ANSWER_FLIGHTS.lead(key)
+        try:
+            async for event, data in _astream_answer(query, tenant):
+                if event == "done":
+                    flight.set_result(data)
+                    record_answer(data, time.perf_counter() - started)
+                yield event, data
+        except Exception as e:
+            if not flight.done():
+                flight.set_exception(e)
+            raise
+        finally:
+            # Client gone mid-stream: waiting requests compute it themselves.
+            ANSWER_FLIGHTS.abandon(flight)
+
+
+async def _astream_answer(query: str, tenant: str = None):
+    # Streaming variant of aanswer(). Yields (event, data) pairs:
+    #   "meta"  - intent, SQL and raw rows as soon as the query has run
+    #   "token" - the formatted answer, chunk by chunk as the LLM produces it
+    #   "done"  - the same dict aanswer() would have returned
+
+    early, table_name, intent_data = await run_blocking(resolve_intent_locally, query, tenant)
+    if early is not None:
+        yield "done", early
+        return
+
+    if intent_data is None:
+        intent_data = await aclassify_intent_and_generate_sql(query, table_name)
+        intent_data = route_product_search(intent_data, table_name, tenant)
+        await run_blocking(remember_intent, query, intent_data, tenant)
+
+    direct = direct_result(intent_data)
+    if direct is not None:
+        yield "done", direct
+        return
+
+    cached, sql_result, truncated, data_version = await run_blocking(run_query, intent_data, tenant)
+    if cached is not None:
+        yield "meta", {"intent": cached["intent"], "sql": cached["sql"], "rows": cached.get("raw_result")}
+        yield "done", cached
+        return
+
+    yield "meta", {"intent": intent_data.get("intent"), "sql": intent_data.get("sql"), "rows": sql_result}
+
+    formatted_answer = local_answer(intent_data, sql_result, truncated)
+    if formatted_answer is None and needs_llm_formatting(intent_data, sql_result):
+        chunks = []
+        prompt = build_format_prompt(query, sql_result, truncated)
+        started = time.perf_counter()
+        with span("format_llm") as timing:
+            stream = await get_llm().astream_complete(prompt)
+            async for response in stream:
+                if response.delta:
+                    if not chunks:
+                        timing["first_token_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                    chunks.append(response.delta)
+                    yield "token", {"text": response.delta}
+            formatted_answer = "".join(chunks).strip()
+            timing.update(prompt_tokens=estimate_tokens(prompt), response_tokens=estimate_tokens(formatted_answer))
+    elif formatted_answer is not None:
+        yield "token", {"text": formatted_answer}
+
+    yield "done", await run_blocking(query_result, intent_data, sql_result, formatted_answer, data_version, tenant)
+
 if __name__ == "__main__":
     print("[INFO] Checking database...")
-    db_ok = check_database()
+    db_ok = get_database().is_available()
     print(f"[INFO] Database status: {'OK' if db_ok else 'NOT AVAILABLE'}")
 
     test_queries = [
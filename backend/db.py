@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import threading
+
+from backend.load_data import DB_PATH, get_data_version, migrate_database
+from backend.tenants import TenantLRU, tenant_db_path
+
+# Read-side tuning for every pooled connection: 256 MiB of the file memory-mapped,
+# a 64 MiB page cache (negative cache_size is in KiB) and in-memory temp b-trees.
+READ_PRAGMAS = (
+    "PRAGMA query_only = 1",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA temp_store = MEMORY",
+)
+
+TABLE_NAME_CANDIDATES = ("receipts", "transactions", "receipt")
+
+
+class Database:
+    # Created once per tenant. Schema metadata (tables, the receipts table
+    # name and its columns) is discovered at startup and cached; every thread
+    # gets its own read-only connection, reused for the life of the thread.
+    # `available` is the cheap liveness flag the chat pipeline checks per message.
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._file_id = None
+        self.available = False
+        self.tables = []
+        self.table_name = "transactions"
+        self.columns = []
+        self.refresh()
+
+    def refresh(self):
+        # Re-reads the schema; also picks up a database file that was rebuilt
+        # by create_database() since the connections were opened.
+        with self._lock:
+            self._generation += 1
+            self._file_id = self._stat()
+            try:
+                if self._file_id is None:
+                    raise FileNotFoundError(self.db_path)
+                conn = self._connect()
+                try:
+                    self.tables = [row[0] for row in conn.execute(
+                        "SELECT name FROM sqlite_master WHERE type='table'")]
+                    self.table_name = next(
+                        (t for t in self.tables if t.lower() in TABLE_NAME_CANDIDATES),
+                        self.tables[0] if self.tables else "transactions",
+                    )
+                    self.columns = [row[1] for row in conn.execute(
+                        f'PRAGMA table_info("{self.table_name}")')]
+                finally:
+                    conn.close()
+                self.available = bool(self.tables)
+            except (sqlite3.Error, OSError) as e:
+                print(f"[ERROR] Database not available: {e}")
+                self.available = False
+                self.tables, self.columns = [], []
+
+            if self.available:
+                print(f"[INFO] Database ready. Found tables: {self.tables}")
+            return self.available
+
+    def is_available(self):
+        if self._stat() != self._file_id:
+            self.refresh()
+        return self.available
+
+    def connection(self):
+        self.is_available()
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            local.conn = self._connect()
+            local.generation = self._generation
+        return local.conn
+
+    def data_version(self):
+        return get_data_version(self.connection())
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+
+def open_database(tenant):
+    db_path = tenant_db_path(tenant)
+    migrate_database(db_path)
+    return Database(db_path)
+
+
+_databases = TenantLRU(open_database)
+
+
+def get_database(tenant=None):
+    # One Database per tenant, at most MAX_OPEN_TENANTS of them open at once.
+    return _databases.get(tenant)
@@ -0,0 +1,220 @@
+import math
+import sqlite3
+from datetime import date
+
+# One row per store location (distinct unit_latitude/unit_longitude) with the
+# visit statistics the map needs, so the browser never sees raw receipts.
+GEO_SCHEMAS = {
+    "Store_Locations": """
+        CREATE TABLE IF NOT EXISTS Store_Locations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            org_name TEXT,
+            unit_name TEXT,
+            unit_street_name TEXT,
+            unit_municipality TEXT,
+            items INTEGER NOT NULL,
+            spend REAL NOT NULL,
+            receipts INTEGER NOT NULL,
+            weekend_receipts INTEGER NOT NULL,
+            work_hour_receipts INTEGER NOT NULL,
+            weeks INTEGER NOT NULL,
+            first_day TEXT,
+            last_day TEXT,
+            UNIQUE (latitude, longitude)
+        )
+    """,
+}
+
+# Points are stored as zero-area boxes keyed by Store_Locations.id.
+RTREE_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS Store_Locations_RTree
+    USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+"""
+
+# Work hours are 08:00-18:59 UTC, Monday to Friday.
+LOCATION_STATS_SQL = """
+    SELECT unit_latitude, unit_longitude, MIN(rowid), COUNT(*), TOTAL(price * quantity),
+           COUNT(DISTINCT fs_receipt_id),
+           COUNT(DISTINCT CASE WHEN strftime('%w', issue_day) IN ('0', '6')
+                               THEN fs_receipt_id END),
+           COUNT(DISTINCT CASE WHEN strftime('%w', issue_day) NOT IN ('0', '6')
+                                AND CAST(strftime('%H', issue_ts, 'unixepoch') AS INTEGER) BETWEEN 8 AND 18
+                               THEN fs_receipt_id END),
+           COUNT(DISTINCT strftime('%Y-%W', issue_day)),
+           MIN(issue_day), MAX(issue_day)
+    FROM Receipts
+"""
+
+LOCATION_COLUMNS = [
+    "id", "latitude", "longitude", "org_name", "unit_name", "unit_street_name", "unit_municipality",
+    "items", "spend", "receipts", "weekend_receipts", "work_hour_receipts", "weeks", "first_day", "last_day",
+]
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def create_geo_tables(conn):
+    for ddl in GEO_SCHEMAS.values():
+        conn.execute(ddl)
+    try:
+        conn.execute(RTREE_SCHEMA)
+    except sqlite3.OperationalError as e:
+        # SQLite built without the R*Tree module: bounding-box queries fall
+        # back to the (latitude, longitude) index of Store_Locations.
+        print(f"[WARN] R*Tree not available, using the B-tree index for map queries: {e}")
+
+
+def has_rtree(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'Store_Locations_RTree'"
+    ).fetchone() is not None
+
+
+def build_store_locations(conn, locations=None):
+    # locations=None rebuilds everything, otherwise only the given
+    # (latitude, longitude) pairs are recomputed from Receipts. Ids of existing
+    # locations are kept, so the R*Tree only needs rows for new ones.
+    create_geo_tables(conn)
+    rtree = has_rtree(conn)
+
+    if locations is None:
+        conn.execute("DELETE FROM Store_Locations")
+        if rtree:
+            conn.execute("DELETE FROM Store_Locations_RTree")
+        stats = conn.execute(
+            LOCATION_STATS_SQL
+            + " WHERE unit_latitude IS NOT NULL AND unit_longitude IS NOT NULL"
+            + " GROUP BY unit_latitude, unit_longitude"
+        ).fetchall()
+    else:
+        stats = []
+        for latitude, longitude in sorted(set(locations)):
+            row = conn.execute(
+                LOCATION_STATS_SQL + " WHERE unit_latitude = ? AND unit_longitude = ?",
+                (latitude, longitude),
+            ).fetchone()
+            if row[0] is not None:
+                stats.append(row)
+
+    # Names come from the first receipt row seen at the location.
+    rows = []
+    for latitude, longitude, first_rowid, *counts in stats:
+        names = conn.execute(
+            "SELECT org_name, unit_name, unit_street_name, unit_municipality FROM Receipts WHERE rowid = ?",
+            (first_rowid,),
+        ).fetchone()
+        rows.append((latitude, longitude, *names, *counts))
+
+    conn.executemany("""
+        INSERT INTO Store_Locations (
+            latitude, longitude, org_name, unit_name, unit_street_name, unit_municipality,
+            items, spend, receipts, weekend_receipts, work_hour_receipts, weeks, first_day, last_day
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (latitude, longitude) DO UPDATE SET
+            items = excluded.items,
+            spend = excluded.spend,
+            receipts = excluded.receipts,
+            weekend_receipts = excluded.weekend_receipts,
+            work_hour_receipts = excluded.work_hour_receipts,
+            weeks = excluded.weeks,
+            first_day = excluded.first_day,
+            last_day = excluded.last_day
+    """, rows)
+
+    if rtree:
+        conn.execute("""
+            INSERT INTO Store_Locations_RTree (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT id, latitude, latitude, longitude, longitude FROM Store_Locations
+            WHERE id NOT IN (SELECT id FROM Store_Locations_RTree)
+        """)
+    return len(rows)
+
+
+def _locations(cursor):
+    return [dict(zip(LOCATION_COLUMNS, row)) for row in cursor]
+
+
+def locations_in_bbox(conn, min_lat=-90.0, max_lat=90.0, min_lon=-180.0, max_lon=180.0):
+    columns = ", ".join(f"s.{column}" for column in LOCATION_COLUMNS)
+    bounds = (min_lat, max_lat, min_lon, max_lon)
+    if has_rtree(conn):
+        # The R*Tree stores 32-bit floats rounded outwards, so its candidates
+        # are re-checked against the exact coordinates.
+        return _locations(conn.execute(f"""
+            SELECT {columns}
+            FROM Store_Locations_RTree r JOIN Store_Locations s ON s.id = r.id
+            WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+              AND s.latitude BETWEEN ? AND ? AND s.longitude BETWEEN ? AND ?
+        """, bounds + bounds))
+    return _locations(conn.execute(f"""
+        SELECT {columns} FROM Store_Locations s
+        WHERE s.latitude BETWEEN ? AND ? AND s.longitude BETWEEN ? AND ?
+    """, bounds))
+
+
+def home_location(conn):
+    # Most visited location, weighted a little by spend, as the map page
+    # has always picked it.
+    columns = ", ".join(LOCATION_COLUMNS)
+    rows = _locations(conn.execute(f"""
+        SELECT {columns} FROM Store_Locations
+        ORDER BY items * 0.7 + spend * 0.0003 DESC, id
+        LIMIT 1
+    """))
+    return rows[0] if rows else None
+
+
+def detect_places(conn):
+    # Home, work and vacation spots: work is the location 0.5-30 km from home
+    # visited most in work hours and weeks, vacation the best scoring far-off
+    # (> 20 km) stay of more than a day that is weekend-heavy or expensive.
+    home = home_location(conn)
+    if home is None:
+        return {"home": None, "work": None, "vacation": None}
+
+    locations = [
+        dict(location, home_km=distance_km(home["latitude"], home["longitude"],
+                                           location["latitude"], location["longitude"]))
+        for location in locations_in_bbox(conn) if location["id"] != home["id"]
+    ]
+
+    work_candidates = [location for location in locations if 0.5 < location["home_km"] < 30]
+    work = max(
+        work_candidates,
+        key=lambda l: l["items"] * 0.4 + l["work_hour_receipts"] * 0.3 + l["weeks"] * 0.3,
+        default=None,
+    )
+
+    def vacation_score(location):
+        days = (date.fromisoformat(location["last_day"]) - date.fromisoformat(location["first_day"])).days
+        weekend_ratio = location["weekend_receipts"] / location["receipts"]
+        avg_spend = location["spend"] / location["items"]
+        if days < 1 or not (weekend_ratio >= 0.4 or avg_spend > 25):
+            return None
+        return (
+            location["spend"] * 0.45
+            + (0.3 if weekend_ratio > 0.5 else 0.15)
+            + min(avg_spend / 80, 1) * 0.2
+            + (1 / (days + 1)) * 0.05
+        )
+
+    scored = [
+        (vacation_score(location), location) for location in locations
+        if location["home_km"] > 20 and location is not work
+        and location["receipts"] and location["first_day"] and location["last_day"]
+    ]
+    scored = [(score, location) for score, location in scored if score is not None]
+    vacation = max(scored, key=lambda pair: pair[0])[1] if scored else None
+
+    return {"home": home, "work": work, "vacation": vacation}
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    # Haversine distance, the same formula the map page used in the browser.
+    to_rad = math.radians
+    d_lat = to_rad(lat2 - lat1)
+    d_lon = to_rad(lon2 - lon1)
+    x = math.sin(d_lat / 2) ** 2 + math.cos(to_rad(lat1)) * math.cos(to_rad(lat2)) * math.sin(d_lon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(x), math.sqrt(1 - x))
@@ -0,0 +1,443 @@
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from backend.columnar_store import COLUMNAR_DIR, columnar_dir_for, read_receipts_columns
+from backend.db import get_database
+from backend.load_data import get_data_version
+from backend.single_flight import SingleFlight
+from backend.tenants import TenantLRU
+
+INSIGHTS_COLUMNS = [
+    "fs_receipt_id",
+    "fs_receipt_issue_date",
+    "name",
+    "price",
+    "quantity",
+    "org_name",
+    "ai_category",
+    "unit_municipality",
+]
+
+
+# Applied one after another, in this order, like the original per-name loop:
+# the patterns overlap, so a single alternation gives different names
+# ("v.o.s.r.o." is "v.o." when s.r.o. goes first, "r.o." when v.o.s. does).
+STORE_SUFFIX_PATTERNS = [
+    re.compile(pattern, flags=re.IGNORECASE)
+    for pattern in (
+        r",?\s*s\.r\.o\.?",
+        r",?\s*v\.o\.s\.?",
+        r",?\s*a\.s\.?",
+        r",?\s*spol\.\s*s\s*r\.o\.?",
+        r",?\s*Slovenská republika",
+        r",?\s*Slovakia",
+        r",?\s*SR",
+        r",?\s*Inc\.?",
+        r",?\s*Ltd\.?",
+        r",?\s*GmbH",
+    )
+]
+
+# Byte n-gram lengths used to find substring candidates in group_store_names().
+# Long names are filed under a long n-gram, which keeps the candidate lists short.
+STORE_GRAM_SIZES = (4, 8)
+
+
+def normalize_store_names(store_names):
+    # Normalizes each distinct name once and maps the result back, so the cost
+    # follows the number of merchants rather than the number of receipt lines.
+    codes, uniques = pd.factorize(store_names)
+    normalized = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    for pattern in STORE_SUFFIX_PATTERNS:
+        normalized = normalized.str.replace(pattern, "", regex=True)
+    normalized = (
+        normalized
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.rstrip(",")
+        .str.strip()
+    )
+    result = normalized.to_numpy(dtype=object).take(codes)
+    result[codes == -1] = "Unknown"
+    return pd.Series(result, index=getattr(store_names, "index", None), dtype=object)
+
+
+def _ramp(counts):
+    # [0, 1, .., c0 - 1, 0, 1, .., c1 - 1, ...]
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def _store_grams(data, starts, lengths, size):
+    # Every `size`-byte window inside one name, in name order: (name index,
+    # window bytes packed into a uint64).
+    windows = np.maximum(lengths - size + 1, 0)
+    owners = np.repeat(np.arange(len(lengths)), windows)
+    positions = starts[owners] + _ramp(windows)
+    codes = np.zeros(len(positions), dtype=np.uint64)
+    for shift in range(size):
+        codes |= data[positions + shift].astype(np.uint64) << np.uint64(8 * shift)
+    return owners, codes
+
+
+def _containment_candidates(encoded):
+    # (a, b) index pairs of names where a may be contained in b; a superset of
+    # the true pairs, checked by the caller.
+    #
+    # Each name is filed under its rarest n-gram of the longest size in
+    # STORE_GRAM_SIZES that fits (names shorter than all of them under the
+    # whole name). A name can only be contained in strings that include that
+    # n-gram, so every window of every name is joined with the few names filed
+    # under it instead of comparing all pairs. UTF-8 bytes are used, for which
+    # substring containment is the same as for the decoded text.
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    starts = np.cumsum(lengths) - lengths
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    signature_sizes = lengths.copy()
+    for size in STORE_GRAM_SIZES:
+        signature_sizes[lengths >= size] = size
+
+    found_a, found_b = [], []
+    for size in np.unique(signature_sizes[signature_sizes > 0]):
+        owners, codes = _store_grams(data, starts, lengths, size)
+        gram_ids, inverse, counts = np.unique(codes, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+
+        # rarest own gram of every name filed under this size (windows are
+        # grouped by name, so this is a segmented minimum)
+        own = np.flatnonzero(signature_sizes[owners] == size)
+        own_owners = owners[own]
+        own_counts = counts[inverse[own]]
+        segment_starts = np.flatnonzero(np.append(True, own_owners[1:] != own_owners[:-1]))
+        segment_lengths = np.diff(np.append(segment_starts, len(own)))
+        rarest = np.flatnonzero(own_counts == np.repeat(np.minimum.reduceat(own_counts, segment_starts), segment_lengths))
+        rarest = rarest[np.append(True, own_owners[rarest[1:]] != own_owners[rarest[:-1]])]
+        filed_names = own_owners[rarest]
+        filed_ids = inverse[own[rarest]]
+
+        # names filed under each gram id (CSR), joined with every window
+        filed_names = filed_names[np.argsort(filed_ids, kind="stable")]
+        filed_counts = np.bincount(filed_ids, minlength=len(gram_ids))
+        filed_offsets = np.cumsum(filed_counts) - filed_counts
+
+        hits = filed_counts[inverse]
+        windows = np.flatnonzero(hits)
+        hits = hits[windows]
+        a = filed_names[np.repeat(filed_offsets[inverse[windows]], hits) + _ramp(hits)]
+        b = np.repeat(owners[windows], hits)
+        found_a.append(a[a != b])
+        found_b.append(b[a != b])
+
+    # the empty name is contained in every other one
+    for empty in np.flatnonzero(lengths == 0):
+        others = np.flatnonzero(lengths > 0)
+        found_a.append(np.full(len(others), empty))
+        found_b.append(others)
+
+    if not found_a:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(found_a), np.concatenate(found_b)
+
+
+def group_store_names(store_names):
+    # Maps every distinct name to the earliest preceding name that contains it
+    # or is contained in it (case-insensitive), else to itself.
+    store_names = list(store_names)
+    if not store_names:
+        return {}
+
+    codes, lowered = pd.factorize(pd.Series(store_names, dtype=object).str.lower())
+    lowered = list(lowered)
+    _, first_position = np.unique(codes, return_index=True)
+
+    a, b = _containment_candidates([name.encode("utf-8") for name in lowered])
+    contained = np.fromiter(
+        (lowered[x] in lowered[y] for x, y in zip(a.tolist(), b.tolist())), dtype=bool, count=len(a)
+    )
+    a, b = a[contained], b[contained]
+
+    # earliest[i]: first position of any other name similar to lowered[i]
+    missing = len(store_names)
+    earliest = np.full(len(lowered), missing, dtype=np.int64)
+    np.minimum.at(earliest, b, first_position[a])
+    np.minimum.at(earliest, a, first_position[b])
+
+    positions = np.arange(len(store_names))
+    own_first = first_position[codes]
+    similar = earliest[codes]
+    target = np.minimum(
+        np.where(own_first < positions, own_first, missing),
+        np.where(similar < positions, similar, missing),
+    )
+    target = np.where(target == missing, positions, target)
+
+    store_map = {}
+    for name, position in zip(store_names, target.tolist()):
+        store_map.setdefault(name, store_names[position])
+    return store_map
+
+
+def get_top_category(series):
+    series_clean = series.dropna()
+    if len(series_clean) == 0:
+        return "Unknown"
+    if isinstance(series_clean.dtype, pd.CategoricalDtype):
+        # Break ties by first appearance, as on plain strings, not by category order.
+        series_clean = series_clean.astype(str)
+    vc = series_clean.value_counts()
+    if len(vc) > 0:
+        return vc.index[0]
+    return "Unknown"
+
+
+def detect_vacation_blocks(cities, dates):
+    # Longest run of consecutive calendar days for every city at once, from
+    # parallel city/date sequences. (city, day) pairs are packed into one
+    # sorted int64 key; a run starts wherever the city changes or the gap is
+    # not exactly one day. Ties go to the earliest run and runs shorter than
+    # two days are dropped. Returns one dict per city, in city order.
+    city_codes, city_names = pd.factorize(pd.Series(cities, dtype=object), sort=True)
+    days = pd.to_datetime(pd.Series(dates, dtype=object), errors="coerce")
+    valid = (city_codes >= 0) & days.notna().to_numpy()
+    if not valid.any():
+        return []
+
+    day_numbers = days[valid].to_numpy().astype("datetime64[D]").astype(np.int64)
+    first_day = day_numbers.min()
+    keys = np.sort((city_codes[valid].astype(np.int64) << 32) | (day_numbers - first_day))
+    keys = keys[np.append(True, np.diff(keys) != 0)]
+    key_cities = keys >> 32
+    key_days = keys & 0xFFFFFFFF
+
+    new_run = np.ones(len(keys), dtype=bool)
+    new_run[1:] = (np.diff(key_days) != 1) | (np.diff(key_cities) != 0)
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], len(keys)) - 1
+    lengths = ends - starts + 1
+    run_cities = key_cities[starts]
+
+    # Per city: longest run first, earliest among equals (runs are already
+    # in chronological order within a city).
+    order = np.lexsort((starts, -lengths, run_cities))
+    best = order[np.append(True, np.diff(run_cities[order]) != 0)]
+    best = best[lengths[best] >= 2]
+
+    results = []
+    for run in best:
+        start = pd.Timestamp(np.datetime64(int(key_days[starts[run]] + first_day), "D"))
+        end = pd.Timestamp(np.datetime64(int(key_days[ends[run]] + first_day), "D"))
+        results.append({
+            "city": city_names[run_cities[run]],
+            "consecutive_days": int(lengths[run]),
+            "start_date": start.date(),
+            "end_date": end.date(),
+            "weekday_range": f"{start.strftime('%a')}–{end.strftime('%a')}",
+        })
+    return results
+
+
+def load_receipts_frame(conn, columns=INSIGHTS_COLUMNS, columnar_dir=COLUMNAR_DIR):
+    # Memory-mapped columnar cache first, SQLite when it is missing or stale.
+    df = read_receipts_columns(columns, data_version=get_data_version(conn), out_dir=columnar_dir)
+    if df is not None:
+        return df
+    column_list = ", ".join(columns)
+    return pd.read_sql(f"SELECT {column_list} FROM Receipts", conn)
+
+
+def build_insights(df):
+    df["fs_receipt_issue_date"] = pd.to_datetime(df["fs_receipt_issue_date"], errors="coerce")
+    df["Purchase_Date"] = df["fs_receipt_issue_date"].dt.date
+    df["Month"] = df["fs_receipt_issue_date"].dt.strftime("%Y-%m")
+    df["Weekday"] = df["fs_receipt_issue_date"].dt.day_name()
+    df["Hour"] = df["fs_receipt_issue_date"].dt.hour
+    df["Spend"] = df["price"] * df["quantity"]
+
+    df["normalized_store"] = normalize_store_names(df["org_name"])
+    store_map = group_store_names(list(df["normalized_store"].unique()))
+
+    df["store_group"] = df["normalized_store"].map(store_map)
+    spend_per_month = df.groupby("Month")["Spend"].sum().reset_index()
+
+    store_stats = df.groupby("store_group").agg({
+        "Spend": "sum",
+        "ai_category": get_top_category
+    }).reset_index()
+
+    store_stats = store_stats.rename(columns={
+        "store_group": "org_name",
+        "ai_category": "top_category"
+    })
+
+    basket_totals = df.groupby("fs_receipt_id")["Spend"].sum()
+    avg_basket = basket_totals.mean()
+    median_basket = basket_totals.median()
+
+    category_share = (
+        df.groupby("ai_category")["Spend"].sum()
+        .sort_values(ascending=False)
+        .reset_index()
+    )
+
+    spend_by_city = df.groupby("unit_municipality")["Spend"].sum().reset_index()
+
+    store_visits = df.groupby("store_group")["fs_receipt_id"].nunique()
+    store_month_spend = df.groupby(["store_group", "Month"])["Spend"].sum().reset_index()
+    avg_month_spend = store_month_spend.groupby("store_group")["Spend"].mean()
+
+    store_stats = store_stats.merge(
+        store_visits.rename("visit_count"),
+        left_on="org_name",
+        right_index=True,
+        how="left"
+    )
+
+    store_stats = store_stats.merge(
+        avg_month_spend.rename("avg_spend_per_month"),
+        left_on="org_name",
+        right_index=True,
+        how="left"
+    )
+
+    store_stats["avg_spend_per_visit"] = store_stats["Spend"] / store_stats["visit_count"]
+    store_stats["months_active"] = store_month_spend.groupby("store_group")["Month"].nunique().values
+
+    spend_per_store = store_stats
+
+    df["Qty_Anomaly"] = df["quantity"] > 5
+    median_price = df.groupby("name")["price"].median()
+    df = df.join(median_price, on="name", rsuffix="_median")
+    df["Price_Anomaly"] = df["price"] > 2 * df["price_median"]
+
+    if df["unit_municipality"].notna().any():
+        home_city = df["unit_municipality"].mode().iloc[0]
+    else:
+        home_city = None
+
+    df["Location_Anomaly"] = (
+        df["unit_municipality"] != home_city if home_city else False
+    )
+
+    travel_events = df[df["Location_Anomaly"]]
+
+    duplicate_items = df[df.duplicated(
+        subset=["name", "price", "fs_receipt_id"], keep=False
+    )]
+
+    weekend_days = ["Saturday", "Sunday"]
+    weekend_travel = travel_events[travel_events["Weekday"].isin(weekend_days)]
+    weekend_travel_counts = (
+        weekend_travel.groupby("unit_municipality")["Spend"]
+        .sum()
+        .reset_index()
+        .sort_values("Spend", ascending=False)
+    )
+
+    vacation_cities = detect_vacation_blocks(
+        travel_events["unit_municipality"], travel_events["Purchase_Date"]
+    )
+
+    vacation_cities = [x for x in vacation_cities if x["city"] != home_city]
+    vacation_cities = sorted(vacation_cities, key=lambda x: x["consecutive_days"], reverse=True)
+
+    # Only the aggregated results are kept; the frame itself is dropped after
+    # the build so a worker does not pin the whole receipt history in memory.
+    return {
+        "home_city": home_city,
+        "vacation_cities": vacation_cities,
+        "spend_per_store": spend_per_store.to_dict(orient="records"),
+        "category_share": category_share.to_dict(orient="records"),
+        "avg_basket": float(avg_basket),
+        "median_basket": float(median_basket),
+        "spend_per_month": spend_per_month.to_dict(orient="records"),
+        "spend_by_city": spend_by_city.to_dict(orient="records"),
+        "weekend_travel_counts": weekend_travel_counts.to_dict(orient="records"),
+        "anomaly_counts": {
+            "quantity": int(df["Qty_Anomaly"].sum()),
+            "price": int(df["Price_Anomaly"].sum()),
+            "location": int(df["Location_Anomaly"].sum()),
+            "duplicate_items": len(duplicate_items),
+        },
+    }
+
+
+class InsightsEngine:
+    # Builds the /insights aggregates from SQLite on first use and caches them
+    # under the data version from Ingest_Log. When a newer version shows up the
+    # stale snapshot keeps being served while a background thread rebuilds it.
+    # Builds go through INSIGHTS_BUILDS keyed on (tenant, version), so
+    # concurrent requests for a version share one build.
+
+    def __init__(self, database=None, tenant=None):
+        self.database = database
+        self.tenant = tenant
+        # (insights, data version) replaced as one tuple, so readers never pair
+        # one build's aggregates with another build's version
+        self._snapshot = None
+
+    def db(self):
+        return self.database or get_database(self.tenant)
+
+    def data_version(self):
+        return self.db().data_version()
+
+    def get(self):
+        return self.snapshot()[0]
+
+    def snapshot(self):
+        # The served insights together with the data version they were built
+        # for, which may trail the database while a rebuild is running.
+        version = self.data_version()
+
+        if self._snapshot is None:
+            self._build(version)
+        elif version != self._snapshot[1]:
+            self.refresh(version)
+
+        return self._snapshot
+
+    def refresh(self, version=None):
+        if version is None:
+            version = self.data_version()
+        # One waiting thread per version is enough; a second one started in a
+        # race just joins the same build.
+        if INSIGHTS_BUILDS.in_flight(self._build_key(version)):
+            return
+        thread = threading.Thread(target=self._rebuild, args=(version,), daemon=True)
+        thread.start()
+
+    def _rebuild(self, version):
+        try:
+            self._build(version)
+        except Exception as e:
+            print(f"[ERROR] Insights rebuild failed: {e}")
+
+    def _build_key(self, version):
+        # Explicit databases (benchmarks, tests) are not shared between engines.
+        return (self.tenant if self.database is None else id(self.database), version)
+
+    def _build(self, version):
+        previous = self._snapshot
+        snapshot = INSIGHTS_BUILDS.do(self._build_key(version), self._load, version)
+        # A build that finishes after a newer one must not replace it.
+        if self._snapshot is previous:
+            self._snapshot = snapshot
+
+    def _load(self, version):
+        database = self.db()
+        insights = build_insights(load_receipts_frame(
+            database.connection(), columnar_dir=columnar_dir_for(database.db_path)))
+        print(f"[INFO] Insights built for data version {version}")
+        return (insights, version)
+
+
+INSIGHTS_BUILDS = SingleFlight("insights")
+
+_insights_engines = TenantLRU(lambda tenant: InsightsEngine(tenant=tenant))
+
+
+def get_insights_engine(tenant=None):
+    return _insights_engines.get(tenant)
@@ -0,0 +1,208 @@
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+from backend.db import get_database
+from backend.insights_engine import normalize_store_names
+from backend.metrics import annotate
+from backend.tenants import TenantLRU
+
+INTENT_EMBEDDINGS_PATH = "intent_embeddings.json"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Minimum cosine similarity to the best centroid, and minimum lead over the
+# runner-up, before a query is answered without the classification LLM call.
+ROUTER_THRESHOLD = 0.55
+ROUTER_MARGIN = 0.05
+
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|hola|ahoj|čau|cau|good (morning|afternoon|evening)|dobr[ýy] de[nň])"
+    r"(\s+there)?[\s!.,?👋]*$",
+    flags=re.IGNORECASE,
+)
+
+# The templates ignore dates, so anything that narrows the period goes to the LLM.
+PERIOD_PATTERN = re.compile(
+    r"\b(today|yesterday|tomorrow|week|weekend|month|year|since|last|this|"
+    r"january|february|march|april|may|june|july|august|september|october|november|december|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|\d{4}|\d{1,2}\.\d{1,2}\.)\b",
+    flags=re.IGNORECASE,
+)
+
+# "on milk", "for groceries", "at the market": the query narrows the spending
+# to something that is not a known store or category (a product, usually).
+NARROWING_PATTERN = re.compile(
+    r"\b(on|for|at|from)\s+(?!total\b|all\b|everything\b|average\b)\w+",
+    flags=re.IGNORECASE,
+)
+
+# centroid name -> (intent reported by answer(), SQL template, entity it needs)
+INTENT_TEMPLATES = {
+    "total_spend": (
+        "spending_total",
+        "SELECT SUM(price) as total, COUNT(*) as count FROM {table}",
+        None,
+    ),
+    "store_spend": (
+        "spending_store",
+        "SELECT org_name, SUM(price) as total, COUNT(*) as count FROM {table} "
+        "WHERE org_name LIKE ? GROUP BY org_name ORDER BY total DESC LIMIT 10",
+        "store",
+    ),
+    "category_spend": (
+        "spending_category",
+        "SELECT ai_category, SUM(price) as total, COUNT(*) as count FROM {table} "
+        "WHERE ai_category = ? GROUP BY ai_category",
+        "category",
+    ),
+}
+
+
+class SentenceTransformerEmbedder:
+    # Default local embedder; produces the same 384-dim space as intent_embeddings.json.
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+
+    def __call__(self, texts):
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+def default_embedder():
+    # Without an embedder the router only answers greetings; every other query
+    # goes to the classification LLM. Called once per process by get_intent_router.
+    try:
+        return SentenceTransformerEmbedder()
+    except ImportError:
+        print("[WARN] sentence-transformers is not installed")
+    except Exception as e:
+        print(f"[WARN] Failed to load embedding model {EMBEDDING_MODEL}: {e}")
+    print("[WARN] Intent routing is off: only greetings are answered locally, "
+          "all other queries go to the classification LLM")
+    return None
+
+
+def load_centroids(path=INTENT_EMBEDDINGS_PATH):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    names = list(data)
+    matrix = np.asarray([data[name] for name in names], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return names, matrix
+
+
+class IntentRouter:
+    # Nearest-centroid classifier run before classify_intent_and_generate_sql().
+    # route() returns intent data in the same shape as the LLM step (plus the
+    # query parameters), or None when the LLM has to decide.
+
+    def __init__(self, embedder=None, embeddings_path=INTENT_EMBEDDINGS_PATH,
+                 threshold=ROUTER_THRESHOLD, margin=ROUTER_MARGIN):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.margin = margin
+        self.intent_names, self.centroids = load_centroids(embeddings_path)
+        # tenant -> {"version": data version, "entities": stores and categories}
+        self._entities = TenantLRU(lambda tenant: {})
+
+    def classify(self, query):
+        if self.embedder is None:
+            return None, 0.0
+
+        vector = np.asarray(self.embedder([query]), dtype=np.float32).reshape(-1)
+        vector /= np.linalg.norm(vector) or 1.0
+        scores = self.centroids @ vector
+
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else -1.0
+        if best < self.threshold or best - runner_up < self.margin:
+            return None, best
+        return self.intent_names[order[0]], best
+
+    def route(self, query, table_name, tenant=None):
+        if GREETING_PATTERN.match(query):
+            return {"intent": "greeting", "sql": None, "params": (), "needs_formatting": False}
+
+        if PERIOD_PATTERN.search(query):
+            return None
+
+        name, score = self.classify(query)
+        if name not in INTENT_TEMPLATES:
+            return None
+
+        intent, template, entity = INTENT_TEMPLATES[name]
+        store, category, _ = self.query_entities(query, tenant)
+        found = {"store": store, "category": category}
+
+        # A store or category the template does not filter on would be
+        # silently dropped ("at Lidl on dairy" answered with all of Lidl, or
+        # with the all-time total), so such queries go to the LLM.
+        if any(value is not None for key, value in found.items() if key != entity):
+            return None
+        if entity is None:
+            if NARROWING_PATTERN.search(query):
+                return None
+            params = ()
+        else:
+            if found[entity] is None:
+                return None
+            params = (f"%{store}%",) if entity == "store" else (category,)
+
+        annotate(routed_template=name, router_score=round(float(score), 2))
+        return {
+            "intent": intent,
+            "sql": template.format(table=table_name),
+            "params": params,
+            "needs_formatting": True,
+        }
+
+    def query_entities(self, query, tenant=None):
+        # Everything a cached SQL statement depends on besides the wording.
+        entities = self.entities(tenant)
+        return (
+            self._match(query, entities["stores"]),
+            self._match(query, entities["categories"]),
+            tuple(sorted(m.lower() for m in PERIOD_PATTERN.findall(query))),
+        )
+
+    def entities(self, tenant=None):
+        database = get_database(tenant)
+        version = database.data_version()
+        cached = self._entities.get(tenant)
+        if cached.get("version") != version:
+            conn = database.connection()
+            stores = [row[0] for row in conn.execute(
+                "SELECT DISTINCT org_name FROM Receipts WHERE org_name IS NOT NULL")]
+            categories = [row[0] for row in conn.execute(
+                "SELECT DISTINCT ai_category FROM Receipts WHERE ai_category IS NOT NULL")]
+            stores = {s for s in normalize_store_names(pd.Series(stores)) if len(s) >= 2}
+            cached["entities"] = {
+                "stores": sorted(stores, key=len, reverse=True),
+                "categories": sorted(categories, key=len, reverse=True),
+            }
+            cached["version"] = version
+        return cached["entities"]
+
+    @staticmethod
+    def _match(query, candidates):
+        # Longest candidate that appears in the query as whole words.
+        lowered = query.lower()
+        for candidate in candidates:
+            if re.search(rf"(?<!\w){re.escape(candidate.lower())}(?!\w)", lowered):
+                return candidate
+        return None
+
+
+_router = None
+
+
+def get_intent_router():
+    global _router
+    if _router is None:
+        _router = IntentRouter(embedder=default_embedder())
+    return _router
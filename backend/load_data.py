@@ -1,29 +1,362 @@
 import pandas as pd
 import sqlite3
 import os
+import argparse
+import glob
+import time
+import uuid
 
-def create_database():
-    DB_PATH = r"data/data_base/data.db"
+from backend.anomaly_detector import detect_anomalies
+from backend.columnar_store import columnar_dir_for, read_manifest, write_columnar_cache
+from backend.geo_index import build_store_locations
+from backend.product_search import index_products
 
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
-        print("The old database has been deleted.")
+DB_PATH = r"data/data_base/data.db"
+RECEIPTS_CSV = r"data/Receipts.csv"
 
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+# Bumped whenever RECEIPTS_SCHEMA or its indexes change; stored in PRAGMA user_version.
+SCHEMA_VERSION = 9
 
-    conn = sqlite3.connect(DB_PATH)
+RECEIPTS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Receipts (
+        id INTEGER,
+        quantity REAL,
+        name TEXT,
+        price REAL,
+        fs_receipt_id INTEGER,
+        fs_receipt_issue_date TEXT,
+        issue_day TEXT,
+        issue_ts INTEGER,
+        org_id INTEGER,
+        org_ico INTEGER,
+        org_dic INTEGER,
+        org_building_number TEXT,
+        org_country TEXT,
+        org_ic_dph TEXT,
+        org_municipality TEXT,
+        org_postal_code REAL,
+        org_name TEXT,
+        org_street_name TEXT,
+        unit_id INTEGER,
+        unit_building_number TEXT,
+        unit_country TEXT,
+        unit_municipality TEXT,
+        unit_postal_code REAL,
+        unit_property_registration_number TEXT,
+        unit_street_name TEXT,
+        unit_name TEXT,
+        ai_name_without_brand_and_quantity TEXT,
+        ai_name_in_english_without_brand_and_quantity TEXT,
+        ai_brand TEXT,
+        ai_category TEXT,
+        ai_quantity_value REAL,
+        ai_quantity_unit TEXT,
+        unit_latitude REAL,
+        unit_longitude REAL
+    )
+"""
+
+RECEIPTS_INDEXES = {
+    "idx_receipts_id": "Receipts (id)",
+    "idx_receipts_issue_day": "Receipts (issue_day)",
+    "idx_receipts_issue_ts": "Receipts (issue_ts)",
+    "idx_receipts_org_name": "Receipts (org_name)",
+    "idx_receipts_ai_category": "Receipts (ai_category)",
+    "idx_receipts_fs_receipt_id": "Receipts (fs_receipt_id)",
+    "idx_receipts_unit_municipality": "Receipts (unit_municipality)",
+    "idx_receipts_location": "Receipts (unit_latitude, unit_longitude)",
+}
+
+# `total` is SUM(price), what the sort_by_* endpoints have always reported;
+# `spend` is SUM(price * quantity), the amount actually paid, as in the insights.
+ROLLUP_TABLES = {
+    "Spending_Daily": """
+        CREATE TABLE IF NOT EXISTS Spending_Daily (
+            day TEXT PRIMARY KEY,
+            total REAL NOT NULL,
+            spend REAL NOT NULL,
+            items INTEGER NOT NULL
+        )
+    """,
+    "Spending_Monthly": """
+        CREATE TABLE IF NOT EXISTS Spending_Monthly (
+            month TEXT PRIMARY KEY,
+            total REAL NOT NULL,
+            spend REAL NOT NULL,
+            items INTEGER NOT NULL
+        )
+    """,
+    "Spending_Yearly": """
+        CREATE TABLE IF NOT EXISTS Spending_Yearly (
+            year TEXT PRIMARY KEY,
+            total REAL NOT NULL,
+            spend REAL NOT NULL,
+            items INTEGER NOT NULL
+        )
+    """,
+    "Spending_Weekday": """
+        CREATE TABLE IF NOT EXISTS Spending_Weekday (
+            weekday INTEGER PRIMARY KEY,
+            total REAL NOT NULL,
+            spend REAL NOT NULL,
+            items INTEGER NOT NULL
+        )
+    """,
+}
+
+INGEST_LOG_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Ingest_Log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source TEXT NOT NULL,
+        rows_read INTEGER NOT NULL,
+        rows_inserted INTEGER NOT NULL,
+        seconds REAL NOT NULL,
+        ingested_at TEXT NOT NULL DEFAULT (datetime('now')),
+        generation TEXT NOT NULL DEFAULT (lower(hex(randomblob(16))))
+    )
+"""
+
+APPEND_CHUNK_SIZE = 100_000
+
+
+def build_rollups(conn, days=None):
+    # days=None rebuilds everything, otherwise only the given YYYY-MM-DD days
+    # are recomputed from Receipts; the coarser rollups are re-derived from
+    # Spending_Daily, which holds at most one row per calendar day.
+    for ddl in ROLLUP_TABLES.values():
+        conn.execute(ddl)
+
+    if days is None:
+        conn.execute("DELETE FROM Spending_Daily")
+        conn.execute("""
+            INSERT INTO Spending_Daily (day, total, spend, items)
+            SELECT issue_day, SUM(price), TOTAL(price * quantity), COUNT(*)
+            FROM Receipts
+            WHERE price IS NOT NULL AND issue_day IS NOT NULL
+            GROUP BY issue_day
+        """)
+    else:
+        days = sorted(set(days))
+        conn.executemany("DELETE FROM Spending_Daily WHERE day = ?", [(d,) for d in days])
+        conn.executemany("""
+            INSERT INTO Spending_Daily (day, total, spend, items)
+            SELECT issue_day, SUM(price), TOTAL(price * quantity), COUNT(*)
+            FROM Receipts
+            WHERE price IS NOT NULL AND issue_day = ?
+            GROUP BY issue_day
+        """, [(d,) for d in days])
+
+    conn.execute("DELETE FROM Spending_Monthly")
+    conn.execute("""
+        INSERT INTO Spending_Monthly (month, total, spend, items)
+        SELECT substr(day, 1, 7), SUM(total), SUM(spend), SUM(items)
+        FROM Spending_Daily GROUP BY substr(day, 1, 7)
+    """)
+
+    conn.execute("DELETE FROM Spending_Yearly")
+    conn.execute("""
+        INSERT INTO Spending_Yearly (year, total, spend, items)
+        SELECT substr(day, 1, 4), SUM(total), SUM(spend), SUM(items)
+        FROM Spending_Daily GROUP BY substr(day, 1, 4)
+    """)
+
+    conn.execute("DELETE FROM Spending_Weekday")
+    conn.execute("""
+        INSERT INTO Spending_Weekday (weekday, total, spend, items)
+        SELECT CAST(strftime('%w', day) AS INTEGER), SUM(total), SUM(spend), SUM(items)
+        FROM Spending_Daily GROUP BY strftime('%w', day)
+    """)
+
+
+def receipt_columns(conn, table="Receipts"):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def normalize_dates(conn):
+    # issue_day / issue_ts are derived with SQLite's own date functions so the
+    # ingest and the migration produce exactly what DATE(fs_receipt_issue_date)
+    # used to return at query time.
+    conn.execute("""
+        UPDATE Receipts
+        SET issue_day = DATE(fs_receipt_issue_date),
+            issue_ts = CAST(strftime('%s', fs_receipt_issue_date) AS INTEGER)
+        WHERE issue_day IS NULL AND fs_receipt_issue_date IS NOT NULL
+    """)
+
+
+def create_indexes(conn):
+    for index_name, target in RECEIPTS_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+
+
+def log_ingest(conn, source, rows_read, rows_inserted, seconds):
+    conn.execute(INGEST_LOG_SCHEMA)
+    conn.execute(
+        "INSERT INTO Ingest_Log (source, rows_read, rows_inserted, seconds, generation) VALUES (?, ?, ?, ?, ?)",
+        (source, rows_read, rows_inserted, seconds, uuid.uuid4().hex),
+    )
+
+
+def add_ingest_generation(conn):
+    # Ingest_Log tables from before SCHEMA_VERSION 8 have no generation column;
+    # their rows get random tokens as well.
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(Ingest_Log)")]
+    if "generation" not in columns:
+        conn.execute("ALTER TABLE Ingest_Log ADD COLUMN generation TEXT")
+    conn.execute("UPDATE Ingest_Log SET generation = lower(hex(randomblob(16))) WHERE generation IS NULL")
+    # Databases built before Ingest_Log existed get an entry for their rows,
+    # so they have a version of their own too.
+    if conn.execute("SELECT COUNT(*) FROM Ingest_Log").fetchone()[0] == 0:
+        rows = conn.execute("SELECT COUNT(*) FROM Receipts").fetchone()[0]
+        log_ingest(conn, "existing rows", rows, rows, 0.0)
+
+
+def get_data_version(conn):
+    # "<ingest id>-<random generation>" of the latest ingest; caches key on it.
+    # The id alone starts again at 1 when create_database() rebuilds the file,
+    # the generation token makes versions unique across database files.
+    try:
+        row = conn.execute("SELECT id, generation FROM Ingest_Log ORDER BY id DESC LIMIT 1").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return f"{row[0]}-{row[1]}" if row else 0
+
+
+def rebuild_receipts_table(conn):
+    conn.execute("ALTER TABLE Receipts RENAME TO Receipts_old")
+    conn.execute(RECEIPTS_SCHEMA)
+    old_columns = set(receipt_columns(conn, "Receipts_old"))
+    columns = [c for c in receipt_columns(conn) if c in old_columns]
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    conn.execute(
+        f"INSERT INTO Receipts ({column_list}) SELECT {column_list} FROM Receipts_old"
+    )
+    conn.execute("DROP TABLE Receipts_old")
+    normalize_dates(conn)
+
+
+def migrate_database(db_path=DB_PATH):
+    # Brings a data.db created by an older create_database() up to
+    # SCHEMA_VERSION in place:
+    #   0 -> 1  explicit Receipts schema, issue_day/issue_ts, indexes, rollups
+    #   1 -> 2  index on id and Ingest_Log, needed by append_receipts()
+    #   2 -> 3  WAL journal, so API readers are not blocked by an append
+    #   3 -> 4  `spend` (price * quantity) column in the rollup tables
+    #   4 -> 5  Anomalies and the running statistics behind them
+    #   5 -> 6  Store_Locations and its R*Tree index, behind /api/geo
+    #   6 -> 7  Products_FTS full-text index for product searches
+    #   7 -> 8  generation token in Ingest_Log, part of the data version
+    #   8 -> 9  Products_FTS rebuilt with the trigram tokenizer (substring matches)
+    if not os.path.exists(db_path):
+        return
+
+    conn = sqlite3.connect(db_path)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        conn.execute("PRAGMA journal_mode = WAL")
+        with conn:
+            if version < 1:
+                rebuild_receipts_table(conn)
+            conn.execute(INGEST_LOG_SCHEMA)
+            add_ingest_generation(conn)
+            create_indexes(conn)
+            if version < 4:
+                for table in ROLLUP_TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+            build_rollups(conn)
+            detect_anomalies(conn)
+            build_store_locations(conn)
+            if version < 9:
+                conn.execute("DROP TABLE IF EXISTS Products_FTS")
+            index_products(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        if version < 1:
+            conn.execute("VACUUM")
+        print(f"Migrated {db_path} from schema version {version} to {SCHEMA_VERSION}")
+    finally:
+        conn.close()
+
+
+def remove_database_files(db_path, suffixes=("", "-wal", "-shm")):
+    # The database file and the WAL files SQLite keeps next to it.
+    for suffix in suffixes:
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+def create_database(db_path=DB_PATH, csv_file=RECEIPTS_CSV):
+    # Builds the new database next to the old one and moves it into place at
+    # the end: API readers keep using the old file until the new one is
+    # complete, and a -wal left over from the old file is never replayed onto
+    # the new one.
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    build_path = db_path + ".build"
+    remove_database_files(build_path)
+
+    conn = sqlite3.connect(build_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(RECEIPTS_SCHEMA)
+    conn.execute(INGEST_LOG_SCHEMA)
 
     csv_tables = {
-        "Receipts": "data/Receipts.csv",
+        "Receipts": csv_file,
     }
 
     for table_name, csv_file in csv_tables.items():
         try:
-            df = pd.read_csv(csv_file, encoding="utf-8", sep=",")
-            df.to_sql(table_name, conn, index=False, if_exists="replace", chunksize=15000)
+            started = time.perf_counter()
+            columns = receipt_columns(conn, table_name)
+            df = pd.read_csv(csv_file, encoding="utf-8", sep=",", usecols=lambda c: c in columns)
+            df.to_sql(table_name, conn, index=False, if_exists="append", chunksize=15000)
+            log_ingest(conn, csv_file, len(df), len(df), time.perf_counter() - started)
             print(f"Imported {table_name}")
         except Exception as e:
             print(f"Import error {table_name}: {e}")
+            log_ingest(conn, csv_file, 0, 0, 0.0)
+
+    normalize_dates(conn)
+    create_indexes(conn)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
+    try:
+        with conn:
+            build_rollups(conn)
+        print(f"Built rollups: {', '.join(ROLLUP_TABLES)}")
+    except Exception as e:
+        print(f"Rollup error: {e}")
+
+    try:
+        with conn:
+            flagged = detect_anomalies(conn)
+        print(f"Flagged {flagged} anomalies")
+    except Exception as e:
+        print(f"Anomaly detection error: {e}")
+
+    try:
+        with conn:
+            locations = build_store_locations(conn)
+        print(f"Indexed {locations} store locations")
+    except Exception as e:
+        print(f"Store location error: {e}")
+
+    try:
+        with conn:
+            indexed = index_products(conn)
+        print(f"Indexed {indexed} products for full-text search")
+    except Exception as e:
+        print(f"Product index error: {e}")
+
+    try:
+        manifest = write_columnar_cache(conn, get_data_version(conn), out_dir=columnar_dir_for(db_path))
+        if manifest:
+            print(f"Built columnar cache: {len(manifest['partitions'])} partitions")
+    except Exception as e:
+        print(f"Columnar cache error: {e}")
 
     for table in csv_tables.keys():
         count = pd.read_sql(f"SELECT COUNT(*) as total FROM {table};", conn)
@@ -31,5 +364,150 @@ def create_database():
     tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type='table';", conn)
     print(tables)
 
+    # Closing the last connection checkpoints the build's WAL and removes it.
     conn.close()
-    print("\nDatabase created successfully:", DB_PATH)
+    replaced = os.path.exists(db_path)
+    remove_database_files(db_path, suffixes=("-wal", "-shm"))
+    os.replace(build_path, db_path)
+    if replaced:
+        print("The old database has been replaced.")
+    print("\nDatabase created successfully:", db_path)
+
+
+def refresh_columnar_cache(db_path=DB_PATH):
+    # Rebuilds the database's columnar cache unless it already matches it.
+    if not os.path.exists(db_path):
+        return
+
+    conn = sqlite3.connect(db_path)
+    try:
+        version = get_data_version(conn)
+        out_dir = columnar_dir_for(db_path)
+        manifest = read_manifest(out_dir)
+        if manifest is None or manifest.get("data_version") != version:
+            write_columnar_cache(conn, version, out_dir=out_dir)
+    finally:
+        conn.close()
+
+
+def expand_receipt_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.csv"))))
+        else:
+            files.append(path)
+    return files
+
+
+def append_receipts(paths, db_path=DB_PATH):
+    # Incremental ingest: new CSV files (or directories of them) are staged in a
+    # temp table, rows whose id or fs_receipt_id is already stored are dropped,
+    # and the rest is appended together with the rollup refresh, anomaly
+    # scoring, store location and product index updates in a single
+    # transaction, so readers never see a half-loaded database.
+    files = expand_receipt_files(paths)
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Database not found: {db_path}. Run create_database() first.")
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    try:
+        columns = [c for c in receipt_columns(conn) if c not in ("issue_day", "issue_ts")]
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        placeholders = ", ".join("?" for _ in columns)
+
+        conn.execute("DROP TABLE IF EXISTS temp.Receipts_staging")
+        conn.execute(f"CREATE TEMP TABLE Receipts_staging AS SELECT {column_list} FROM Receipts WHERE 0")
+
+        base_version = get_data_version(conn)
+        last_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM Receipts").fetchone()[0]
+        rows_read = 0
+        for csv_file in files:
+            for chunk in pd.read_csv(csv_file, encoding="utf-8", sep=",", chunksize=APPEND_CHUNK_SIZE):
+                chunk = chunk.reindex(columns=columns)
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                conn.executemany(
+                    f"INSERT INTO temp.Receipts_staging ({column_list}) VALUES ({placeholders})",
+                    chunk.itertuples(index=False, name=None),
+                )
+                rows_read += len(chunk)
+
+        with conn:
+            inserted = conn.execute(f"""
+                INSERT INTO Receipts ({column_list})
+                SELECT {column_list} FROM temp.Receipts_staging AS s
+                WHERE s.rowid IN (SELECT MIN(rowid) FROM temp.Receipts_staging GROUP BY id)
+                  AND NOT EXISTS (SELECT 1 FROM Receipts r WHERE r.id = s.id)
+                  AND NOT EXISTS (SELECT 1 FROM Receipts r WHERE r.fs_receipt_id = s.fs_receipt_id)
+            """).rowcount
+            normalize_dates(conn)
+
+            days = [row[0] for row in conn.execute(
+                "SELECT DISTINCT DATE(fs_receipt_issue_date) FROM temp.Receipts_staging "
+                "WHERE fs_receipt_issue_date IS NOT NULL"
+            )]
+            locations = conn.execute(
+                "SELECT DISTINCT unit_latitude, unit_longitude FROM temp.Receipts_staging "
+                "WHERE unit_latitude IS NOT NULL AND unit_longitude IS NOT NULL"
+            ).fetchall()
+            seconds = time.perf_counter() - started
+            # Only a change of data is an ingest: re-uploading receipts that
+            # are all stored already keeps the data version, and every cache
+            # keyed on it, as it is.
+            if inserted:
+                build_rollups(conn, days=[d for d in days if d])
+                detect_anomalies(conn)
+                build_store_locations(conn, locations=locations)
+                index_products(conn, after_rowid=last_rowid)
+                seconds = time.perf_counter() - started
+                log_ingest(conn, ", ".join(files), rows_read, inserted, seconds)
+
+        conn.execute("DROP TABLE IF EXISTS temp.Receipts_staging")
+
+        # The manifest has to follow every change of the data version, or
+        # readers treat the Arrow cache as stale and fall back to SQLite.
+        version = get_data_version(conn)
+        if version != base_version:
+            months = sorted({d[:7] for d in days if d})
+            write_columnar_cache(conn, version, months=months,
+                                 base_version=base_version, out_dir=columnar_dir_for(db_path))
+    finally:
+        conn.close()
+
+    rate = rows_read / seconds if seconds > 0 else 0.0
+    print(f"Appended {inserted} of {rows_read} rows from {len(files)} file(s) "
+          f"in {seconds:.2f}s ({rate:,.0f} rows/sec)")
+    return {
+        "files": files,
+        "rows_read": rows_read,
+        "rows_inserted": inserted,
+        "seconds": seconds,
+        "rows_per_sec": rate,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or migrate data/data_base/data.db")
+    parser.add_argument("--migrate", action="store_true",
+                        help="upgrade an existing database in place instead of rebuilding it")
+    parser.add_argument("--append", nargs="+", metavar="PATH",
+                        help="append new receipt CSV files or directories to the existing database")
+    parser.add_argument("--tenant", metavar="ID",
+                        help="work on data/tenants/ID/data_base/data.db instead of the default database")
+    parser.add_argument("--csv", default=RECEIPTS_CSV,
+                        help="receipt CSV a full build imports (default: data/Receipts.csv)")
+    args = parser.parse_args()
+
+    # imported here because backend.tenants itself imports this module
+    from backend.tenants import tenant_db_path
+    db_path = tenant_db_path(args.tenant)
+
+    if args.migrate:
+        migrate_database(db_path)
+        refresh_columnar_cache(db_path)
+    elif args.append:
+        migrate_database(db_path)
+        append_receipts(args.append, db_path)
+    else:
+        create_database(db_path, args.csv)
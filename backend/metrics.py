@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the latency histogram buckets: sub-millisecond
+# rollup reads up to multi-second LLM calls.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000)
+
+# Finished request traces kept for /metrics/traces; METRICS_LOG=1 also prints
+# each of them as one JSON line.
+MAX_RECENT_TRACES = int(os.getenv("MAX_RECENT_TRACES", "200"))
+METRICS_LOG = os.getenv("METRICS_LOG", "0") == "1"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    # Cumulative buckets in the Prometheus text format. observe() is a dict
+    # lookup, a bisect and a few additions under a lock.
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts (last one is +Inf), sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _labels(self.labelnames, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Latency of one pipeline stage (chat pipeline and /api/date handlers)",
+    ("stage",),
+)
+ANSWER_SECONDS = Histogram(
+    "chat_answer_duration_seconds", "Latency of a whole answer() call by intent and result mode",
+    ("intent", "mode"),
+)
+SQL_ROWS = Histogram("chat_sql_rows", "Rows returned by the chat SQL query", ("intent",), buckets=ROW_BUCKETS)
+CACHE_LOOKUPS = Counter("chat_cache_lookups_total", "Chat cache lookups by tier and result", ("cache", "result"))
+LLM_TOKENS = Counter(
+    "chat_llm_tokens_total", "Estimated LLM tokens by pipeline stage and direction", ("stage", "kind"),
+)
+
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, ANSWER_SECONDS, SQL_ROWS, CACHE_LOOKUPS, LLM_TOKENS]
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+class Trace:
+    # Spans and attributes (intent, rows, cache results, tokens) of one
+    # request or answer() call.
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.attributes = {}
+        self.spans = []
+        self.seconds = None
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "started": round(self.started, 3),
+            "ms": round(self.seconds * 1000, 3) if self.seconds is not None else None,
+            **self.attributes,
+            "spans": self.spans,
+        }
+
+
+_current_trace = ContextVar("current_trace", default=None)
+_recent_traces = deque(maxlen=MAX_RECENT_TRACES)
+
+
+def recent_traces():
+    return [trace.as_dict() for trace in list(_recent_traces)]
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(name):
+    # Starts a trace unless one is already active (answer() inside an HTTP
+    # request joins the request's trace). Only the outermost call finishes it.
+    active = _current_trace.get()
+    if active is not None:
+        yield active
+        return
+
+    current = Trace(name)
+    _current_trace.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - started
+        # Set rather than reset with a token: a streaming generator can be
+        # closed from another context than the one it started in.
+        _current_trace.set(None)
+        _recent_traces.append(current)
+        if METRICS_LOG:
+            print(f"[TRACE] {json.dumps(current.as_dict(), default=str)}")
+
+
+@contextmanager
+def span(stage, **attributes):
+    # Times one stage into STAGE_SECONDS and, inside a trace, records it there
+    # with its attributes. The yielded dict takes attributes known only at
+    # the end; prompt_tokens/response_tokens in it are also counted in
+    # LLM_TOKENS.
+    record = dict(attributes)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        for kind in ("prompt_tokens", "response_tokens"):
+            if kind in record:
+                LLM_TOKENS.inc(record[kind], stage=stage, kind=kind.split("_")[0])
+        active = _current_trace.get()
+        if active is not None:
+            active.spans.append({"stage": stage, "ms": round(seconds * 1000, 3), **record})
+
+
+def annotate(**attributes):
+    active = _current_trace.get()
+    if active is not None:
+        active.attributes.update(attributes)
+
+
+def record_answer(result, seconds):
+    intent, mode = result.get("intent"), result.get("mode")
+    ANSWER_SECONDS.observe(seconds, intent=intent, mode=mode)
+    annotate(intent=intent, mode=mode)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+    annotate(**{f"{cache}_cache": "hit" if hit else "miss"})
+
+
+def route_template(scope):
+    # "/api/geo/stores/{location_id}/items" for "/api/geo/stores/42/items".
+    # Routes of included routers only know their own part of the path, so
+    # the prefix is whatever of the raw path precedes that part.
+    route = scope.get("route")
+    if route is None or not hasattr(route, "path"):
+        return "unmatched"
+    concrete = getattr(route, "path_format", route.path)
+    for name, value in scope.get("path_params", {}).items():
+        concrete = concrete.replace(f"{{{name}}}", str(value))
+    path = scope["path"]
+    if not concrete:
+        # @router.get("") under a prefix: the whole path is the prefix
+        prefix = path
+    elif path.endswith(concrete):
+        prefix = path[:-len(concrete)]
+    else:
+        prefix = ""
+    return prefix + route.path
+
+
+class MetricsMiddleware:
+    # Pure ASGI middleware (streaming responses pass through untouched): times
+    # every HTTP request into REQUEST_SECONDS, labelled with the matched route
+    # template rather than the raw path, and opens the trace that the chat
+    # pipeline and /api/date handlers record their spans into.
+
+    def __init__(self, app, skip_prefixes=("/metrics",)):
+        self.app = app
+        self.skip_prefixes = skip_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.skip_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with trace(f'{scope["method"]} {scope["path"]}') as current:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = route_template(scope)
+                current.name = f'{scope["method"]} {route}'
+                current.attributes["status"] = status["code"]
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, method=scope["method"], route=route, status=status["code"],
+                )
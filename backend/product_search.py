@@ -0,0 +1,147 @@
+import re
+
+PRODUCT_COLUMNS = (
+    "name",
+    "ai_name_without_brand_and_quantity",
+    "ai_name_in_english_without_brand_and_quantity",
+    "ai_brand",
+)
+
+# External-content FTS5 index over the product name columns of Receipts: only
+# the inverted index is stored, the text stays in Receipts (rowids match).
+# The trigram tokenizer makes a phrase query a case-insensitive substring
+# match, the same thing LIKE '%...%' does, for terms of 3 or more characters.
+PRODUCTS_FTS_SCHEMA = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS Products_FTS USING fts5(
+        {", ".join(PRODUCT_COLUMNS)},
+        content='Receipts',
+        content_rowid='rowid',
+        tokenize='trigram'
+    )
+"""
+# Shortest LIKE term the trigram index can look up.
+MIN_TERM_LENGTH = 3
+
+# `<product column> LIKE '%term%'`, optionally inside LOWER()/UPPER(), the way
+# the SQL prompt asks the LLM to write product searches.
+_COLUMN_NAMES = "|".join(PRODUCT_COLUMNS)
+_PREDICATE = (
+    rf"""(?:(?:LOWER|UPPER)\(\s*)?\b(?:\w+\.)?"?(?:{_COLUMN_NAMES})"?(?:\s*\))?"""
+    r"""\s+LIKE\s+'%[^'%_]+%'"""
+)
+LIKE_PREDICATE = re.compile(_PREDICATE, flags=re.IGNORECASE)
+LIKE_GROUP = re.compile(rf"\(\s*{_PREDICATE}(?:\s+OR\s+{_PREDICATE})*\s*\)", flags=re.IGNORECASE)
+# The same OR chain without parentheses, when it is the whole WHERE clause.
+LIKE_WHERE_CHAIN = re.compile(
+    rf"(?<=\bWHERE )\s*{_PREDICATE}(?:\s+OR\s+{_PREDICATE})+"
+    r"(?=\s*(?:;|\)|\bGROUP\b|\bORDER\b|\bLIMIT\b|\bHAVING\b|$))",
+    flags=re.IGNORECASE,
+)
+LIKE_TERM = re.compile(
+    rf"""\b(?:\w+\.)?"?({_COLUMN_NAMES})"?(?:\s*\))?\s+LIKE\s+'%([^'%_]+)%'""", flags=re.IGNORECASE
+)
+ANY_PRODUCT_LIKE = re.compile(
+    rf"""\b(?:{_COLUMN_NAMES})"?(?:\s*\))?\s+(?:NOT\s+)?LIKE\b""", flags=re.IGNORECASE
+)
+AGGREGATE = re.compile(r"\b(?:SUM|COUNT|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(|\bGROUP\s+BY\b", flags=re.IGNORECASE)
+NOT_AN_ALIAS = {
+    "where", "group", "order", "limit", "join", "left", "inner", "cross", "natural",
+    "on", "union", "having", "window", "except", "intersect",
+}
+
+
+def create_products_index(conn):
+    conn.execute(PRODUCTS_FTS_SCHEMA)
+
+
+def index_products(conn, after_rowid=None):
+    # after_rowid=None (re)builds the whole index from Receipts, otherwise only
+    # rows appended after that rowid are added. Receipts rows are never
+    # updated in place, so appends are all the index has to follow.
+    create_products_index(conn)
+    if after_rowid is None:
+        conn.execute("INSERT INTO Products_FTS (Products_FTS) VALUES ('rebuild')")
+        return conn.execute("SELECT COUNT(*) FROM Receipts").fetchone()[0]
+
+    columns = ", ".join(PRODUCT_COLUMNS)
+    return conn.execute(f"""
+        INSERT INTO Products_FTS (rowid, {columns})
+        SELECT rowid, {columns} FROM Receipts WHERE rowid > ?
+    """, (after_rowid,)).rowcount
+
+
+def match_phrase(column, term):
+    # '%whole milk%' -> {name} : "whole milk"  (any row containing the text)
+    return f'{{{column.lower()}}} : "{term.replace(chr(34), chr(34) * 2)}"'
+
+
+def rewrite_product_search(sql_query, table_name):
+    # Joins an LLM-written query that filters on LIKE '%...%' product
+    # predicates with a ranked Products_FTS MATCH on the same terms, so only
+    # the rows the index finds are read instead of the whole table. The LIKE
+    # predicates stay in place and decide the final rows: the trigram match
+    # folds all of Unicode's case while LIKE only folds ASCII, so the index
+    # finds a superset and the result is exactly what the LIKE query returns.
+    # A listing without its own ORDER BY is sorted by relevance. Returns
+    # (sql, params), or None when the query does not have a shape this can
+    # rewrite safely (terms under MIN_TERM_LENGTH characters, NOT LIKE, LIKE
+    # ORed with other predicates, ...); it then runs unchanged.
+    if "?" in sql_query or len(re.findall(r"\bFROM\b", sql_query, flags=re.IGNORECASE)) != 1:
+        return None
+
+    groups, predicates = [], []
+
+    def replace(match):
+        terms = LIKE_TERM.findall(match.group(0))
+        if not all(len(term) >= MIN_TERM_LENGTH and re.search(r"\w", term) for _, term in terms):
+            raise ValueError(match.group(0))
+        groups.append(" OR ".join(match_phrase(column, term) for column, term in terms))
+        predicates.append(match.group(0))
+        return f"\x00{len(groups) - 1}\x00"
+
+    try:
+        rewritten = re.sub(r"\bWHERE\s+", "WHERE ", sql_query, flags=re.IGNORECASE)
+        rewritten = LIKE_WHERE_CHAIN.sub(replace, rewritten)
+        rewritten = LIKE_GROUP.sub(replace, rewritten)
+        rewritten = LIKE_PREDICATE.sub(replace, rewritten)
+    except ValueError:
+        return None
+
+    # Only predicates ANDed with the rest of the WHERE clause can become a
+    # join; anything else (NOT LIKE, OR with other columns, ...) stays LIKE.
+    if not groups or ANY_PRODUCT_LIKE.search(rewritten):
+        return None
+    if re.search(r"\b(?:OR|NOT)\s*\x00|\x00\d+\x00\s*OR\b", rewritten, flags=re.IGNORECASE):
+        return None
+
+    table = re.compile(
+        rf'(?P<table>\bFROM\s+"?{re.escape(table_name)}"?)(?:\s+(?:AS\s+)?(?P<alias>\w+))?',
+        flags=re.IGNORECASE,
+    )
+    found = table.search(rewritten)
+    if found is None:
+        return None
+    alias = found.group("alias")
+    end = found.end()
+    if alias and alias.lower() in NOT_AN_ALIAS:
+        alias, end = None, found.end("table")
+
+    source = f"{table_name} {alias}" if alias else table_name
+    rewritten = (
+        f"{rewritten[:found.start()]}FROM {source} "
+        "JOIN (SELECT rowid AS match_rowid, rank AS match_rank "
+        "FROM Products_FTS WHERE Products_FTS MATCH ?) AS product_match "
+        f"ON product_match.match_rowid = {alias or table_name}.rowid{rewritten[end:]}"
+    )
+    rewritten = re.sub(r"\x00(\d+)\x00", lambda placeholder: predicates[int(placeholder.group(1))], rewritten)
+
+    if not AGGREGATE.search(rewritten) and not re.search(r"\bORDER\s+BY\b", rewritten, flags=re.IGNORECASE):
+        rewritten = rewritten.rstrip().rstrip(";")
+        limit = re.search(r"\bLIMIT\b", rewritten, flags=re.IGNORECASE)
+        if limit:
+            rewritten = f"{rewritten[:limit.start()]}ORDER BY product_match.match_rank {rewritten[limit.start():]}"
+        else:
+            rewritten = f"{rewritten} ORDER BY product_match.match_rank"
+
+    match_query = " AND ".join(f"({group})" for group in groups)
+    return rewritten, (match_query,)
@@ -0,0 +1,91 @@
+import csv
+import io
+import re
+
+# The formatter LLM never sees more than this many rows; larger results are
+# summarized as top rows + column totals + an evenly spaced sample of the rest.
+COMPACT_MAX_ROWS = 20
+COMPACT_TOP_ROWS = 10
+COMPACT_SAMPLE_ROWS = 5
+MAX_TEXT_LENGTH = 80
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    # Word pieces plus punctuation, close enough to a BPE count for reporting.
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def _compact_value(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        if len(value) > MAX_TEXT_LENGTH:
+            return value[:MAX_TEXT_LENGTH] + "…"
+    return value
+
+
+def _to_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_compact_value(row.get(column)) for column in columns])
+    return buffer.getvalue().rstrip("\n")
+
+
+def _numeric_columns(columns, rows):
+    return [
+        column for column in columns
+        if any(isinstance(row.get(column), (int, float)) for row in rows)
+        and all(row.get(column) is None or isinstance(row.get(column), (int, float)) for row in rows)
+    ]
+
+
+def truncation_note(rows):
+    return (f"The query matched more rows than were returned: these are only the first {len(rows)}, "
+            f"so sums and counts over them are partial, not totals.")
+
+
+def compact_result(rows, truncated=False):
+    # Returns a small, fixed-size text payload describing an SQL result.
+    # Up to COMPACT_MAX_ROWS rows are sent verbatim as CSV; beyond that the
+    # totals are pre-computed here so the LLM does not have to add up rows.
+    # truncated: the rows were cut off at the SQL row cap, so the totals only
+    # cover what was returned and the payload says so.
+    if not rows:
+        return "(no rows)"
+
+    columns = list(rows[0].keys())
+    if len(rows) <= COMPACT_MAX_ROWS:
+        if truncated:
+            return truncation_note(rows) + "\n" + _to_csv(columns, rows)
+        return _to_csv(columns, rows)
+
+    parts = [
+        truncation_note(rows) if truncated else f"{len(rows)} rows returned.",
+        f"First {COMPACT_TOP_ROWS} rows:",
+        _to_csv(columns, rows[:COMPACT_TOP_ROWS]),
+    ]
+
+    numeric = _numeric_columns(columns, rows)
+    if numeric:
+        summary = []
+        for column in numeric:
+            values = [row[column] for row in rows if row.get(column) is not None]
+            if values:
+                summary.append(
+                    f"{column}: sum={round(sum(values), 2)}, min={round(min(values), 2)}, "
+                    f"max={round(max(values), 2)}, avg={round(sum(values) / len(values), 2)}"
+                )
+        heading = "Partial totals over the returned rows only:" if truncated else "Totals over all returned rows:"
+        parts += [heading, "\n".join(summary)]
+
+    tail = rows[COMPACT_TOP_ROWS:]
+    step = max(1, len(tail) // COMPACT_SAMPLE_ROWS)
+    sample = tail[::step][:COMPACT_SAMPLE_ROWS]
+    parts += [f"Sample of the remaining {len(tail)} rows:", _to_csv(columns, sample)]
+
+    return "\n".join(parts)
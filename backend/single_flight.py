@@ -0,0 +1,129 @@
+import asyncio
+import threading
+
+from backend.metrics import Counter, REGISTRY, annotate
+
+FLIGHTS = Counter(
+    "single_flight_calls_total", "Calls by flight group, run by the caller (leader) or joined (shared)",
+    ("group", "role"),
+)
+REGISTRY.append(FLIGHTS)
+
+
+class FlightAbandoned(Exception):
+    # The leader went away (e.g. a streaming client disconnected) before it
+    # had a result; whoever was waiting computes it on their own.
+    pass
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution: the first caller
+    # (the leader) runs it, the others wait and get the same result or
+    # exception. Nothing is kept once the call finishes, so this only merges
+    # requests that overlap in time; caching stays with the callers.
+    #
+    # do() is for threads, ado() for coroutines on an event loop, lead() for
+    # callers that produce the result themselves (the chat token stream).
+
+    def __init__(self, group):
+        self.group = group
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._futures = {}
+
+    def _record(self, shared):
+        FLIGHTS.inc(group=self.group, role="shared" if shared else "leader")
+        annotate(coalesced=shared)
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._flights
+
+    def do(self, key, func, *args):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        self._record(not leader)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func(*args)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def join(self, key):
+        # The result of the call in flight for key on the running loop; None
+        # when there is none or its leader abandoned it.
+        existing = self._futures.get((asyncio.get_running_loop(), key))
+        if existing is None:
+            return None
+        self._record(True)
+        try:
+            return await asyncio.shield(existing)
+        except FlightAbandoned:
+            return None
+
+    def lead(self, key):
+        # Registers the caller as leader and returns the future it must resolve
+        # (set_result, set_exception, or abandon()).
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._register((loop, key), future)
+        self._record(False)
+        return future
+
+    @staticmethod
+    def abandon(future):
+        if not future.done():
+            future.set_exception(FlightAbandoned())
+
+    def _register(self, flight_key, future):
+        self._futures[flight_key] = future
+
+        def finished(done):
+            if self._futures.get(flight_key) is done:
+                del self._futures[flight_key]
+            # Marks the exception as retrieved when nobody was waiting.
+            if not done.cancelled():
+                done.exception()
+
+        future.add_done_callback(finished)
+
+    async def ado(self, key, func, *args):
+        # Futures are bound to their loop, so flights are kept per loop.
+        loop = asyncio.get_running_loop()
+        existing = self._futures.get((loop, key))
+        if existing is not None:
+            self._record(True)
+            try:
+                # shield(): a follower that is cancelled must not cancel the
+                # computation for everybody else.
+                return await asyncio.shield(existing)
+            except FlightAbandoned:
+                pass
+
+        task = loop.create_task(func(*args))
+        self._register((loop, key), task)
+        self._record(False)
+        return await asyncio.shield(task)
@@ -0,0 +1,86 @@
+import os
+import re
+import sqlite3
+import time
+
+# Ceilings for SQL written by the LLM. Hand-written queries do not go through here.
+MAX_RESULT_ROWS = int(os.getenv("SQL_MAX_ROWS", "500"))
+TIME_BUDGET_SECONDS = float(os.getenv("SQL_TIME_BUDGET", "2.0"))
+# Number of SQLite VM instructions between two deadline checks.
+PROGRESS_STEPS = 10_000
+
+READ_ONLY_PATTERN = re.compile(r"^\s*(select|with)\b", flags=re.IGNORECASE)
+
+
+class SQLGuardError(Exception):
+    pass
+
+
+def table_names(conn, sql_query):
+    # Lower-cased names a plan node can use for a stored table: the table
+    # itself and every alias it gets in the query. CTEs and subqueries do not
+    # appear here, so scans of their (usually few) materialized rows are not
+    # mistaken for full table scans.
+    tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    names = set()
+    for table in tables:
+        pattern = rf"\b{re.escape(table)}\b(?:\s+as)?\s+(\w+)"
+        names.add(table.lower())
+        names.update(alias.lower() for alias in re.findall(pattern, sql_query, flags=re.IGNORECASE))
+    return names
+
+
+def check_query_plan(conn, sql_query, params=()):
+    # Rejects plans whose cost grows with the square of the table size: two
+    # full table scans nested in the same loop (a join without a usable index,
+    # e.g. a cartesian self-join) or a full table scan inside a correlated
+    # subquery.
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql_query}", params).fetchall()
+    details = {node_id: detail for node_id, _, _, detail in plan}
+    parents = {node_id: parent for node_id, parent, _, _ in plan}
+    tables = table_names(conn, sql_query)
+
+    scans_per_loop = {}
+    for node_id, parent, _, detail in plan:
+        if not detail.startswith("SCAN ") or detail.split()[1].lower() not in tables:
+            continue
+        scans_per_loop[parent] = scans_per_loop.get(parent, 0) + 1
+        if scans_per_loop[parent] > 1:
+            raise SQLGuardError(f"query joins full scans without an index: {detail}")
+
+        ancestor = parent
+        while ancestor in details:
+            if details[ancestor].startswith("CORRELATED"):
+                raise SQLGuardError(f"correlated subquery scans the whole table: {detail}")
+            ancestor = parents[ancestor]
+
+    return plan
+
+
+def guarded_execute(conn, sql_query, params=(), max_rows=MAX_RESULT_ROWS,
+                    time_budget=TIME_BUDGET_SECONDS):
+    # Runs a single read-only statement and returns (rows as dicts, truncated).
+    # At most max_rows rows are materialized; a query still running after
+    # time_budget seconds is interrupted through the progress handler.
+    if not READ_ONLY_PATTERN.match(sql_query):
+        raise SQLGuardError("only SELECT statements are allowed")
+
+    check_query_plan(conn, sql_query, params)
+
+    deadline = time.monotonic() + time_budget
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    try:
+        cursor.execute(sql_query, params)
+        rows = cursor.fetchmany(max_rows + 1)
+    except sqlite3.OperationalError as e:
+        if time.monotonic() > deadline:
+            raise SQLGuardError(f"query exceeded the {time_budget:g}s time budget") from e
+        raise
+    finally:
+        cursor.close()
+        conn.set_progress_handler(None, 0)
+
+    truncated = len(rows) > max_rows
+    return [dict(row) for row in rows[:max_rows]], truncated
@@ -0,0 +1,138 @@
+import re
+
+# Result shapes up to this many rows are rendered locally as a ranked list.
+MAX_TEMPLATE_ROWS = 10
+
+MONEY_COLUMN = re.compile(r"total|sum|price|spen[dt]|amount|cost|avg|average", flags=re.IGNORECASE)
+COUNT_COLUMN = re.compile(r"count|items|visits|purchases|times|quantity|qty|num", flags=re.IGNORECASE)
+
+LABEL_NAMES = {
+    "ai_category": "categories",
+    "org_name": "stores",
+    "unit_municipality": "cities",
+    "name": "products",
+    "ai_name_without_brand_and_quantity": "products",
+    "ai_name_in_english_without_brand_and_quantity": "products",
+    "ai_brand": "brands",
+}
+
+LIST_HEADERS = {
+    "most_frequent": "📊 Your most frequent {label}:",
+    "spending_category": "🛒 Spending by category:",
+    "spending_store": "🏪 Spending by store:",
+    "spending_time": "📅 Spending by period:",
+    "spending_total": "💰 Spending overview:",
+}
+
+# A store/category answer is only templated when it is grouped by that column;
+# e.g. a list of product prices at one store goes to the LLM.
+EXPECTED_LABELS = {
+    "spending_store": "org_name",
+    "spending_category": "ai_category",
+}
+
+
+def is_count_column(column):
+    return bool(COUNT_COLUMN.search(column))
+
+
+def is_money_column(column):
+    # total_quantity, total_purchases or avg_quantity are counts, not euros.
+    return bool(MONEY_COLUMN.search(column)) and not is_count_column(column)
+
+
+def format_euro(value):
+    return f"{value:,.2f}€"
+
+
+def format_count(value):
+    return f"{int(value):,}" if float(value).is_integer() else f"{value:,.2f}"
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _describe(columns, row):
+    # "883 items · 1,234.56€" for the numeric columns of one row
+    parts = []
+    for column in columns:
+        value = row.get(column)
+        if value is None:
+            continue
+        if is_money_column(column):
+            parts.append(format_euro(value))
+        elif is_count_column(column):
+            unit = "items" if column.lower() in ("count", "count(*)") else column
+            if unit == "items" and value == 1:
+                unit = "item"
+            parts.append(f"{format_count(value)} {unit}")
+        else:
+            return None
+    return " · ".join(parts)
+
+
+def render_template_answer(intent, rows):
+    # Returns the finished answer for simple result shapes (a single row of
+    # totals, or a short ranked list with one label column), or None when the
+    # formatter LLM should write it.
+    if not rows or len(rows) > MAX_TEMPLATE_ROWS:
+        return None
+
+    columns = list(rows[0].keys())
+    if any(all(r.get(c) is None for r in rows) for c in columns):
+        return None
+    numeric = [c for c in columns if all(_is_number(r.get(c)) or r.get(c) is None for r in rows)]
+    labels = [c for c in columns if c not in numeric]
+    if not numeric or len(labels) > 1:
+        return None
+    if not any(is_money_column(c) or is_count_column(c) for c in numeric):
+        return None
+
+    money = [c for c in numeric if is_money_column(c)]
+
+    if not labels:
+        if len(rows) != 1:
+            return None
+        row = rows[0]
+        description = _describe(numeric, row)
+        if description is None:
+            return None
+        if intent == "spending_total" and money and row.get(money[0]) is not None:
+            counts = [c for c in numeric if c not in money and row.get(c) is not None]
+            text = f"💰 In total you spent {format_euro(row[money[0]])}"
+            if counts:
+                text += f" across {format_count(row[counts[0]])} purchased items"
+            return text + "."
+        return f"💰 Result: {description}."
+
+    label = labels[0]
+    if EXPECTED_LABELS.get(intent, label) != label:
+        return None
+
+    if len(rows) == 1 and money:
+        row = rows[0]
+        if row.get(money[0]) is None:
+            return None
+        counts = [c for c in numeric if c not in money and row.get(c) is not None]
+        suffix = f" ({_describe(counts[:1], row)})" if counts else ""
+        if intent == "spending_store":
+            return f"🏪 You spent {format_euro(row[money[0]])} at {row[label]}{suffix}."
+        if intent == "spending_category":
+            return f"🛒 You spent {format_euro(row[money[0]])} on {row[label]}{suffix}."
+
+    header = LIST_HEADERS.get(intent)
+    if header is None:
+        return None
+
+    lines = [header.format(label=LABEL_NAMES.get(label, label))]
+    for position, row in enumerate(rows, start=1):
+        description = _describe(numeric, row)
+        if description is None:
+            return None
+        lines.append(f"{position}. {row[label] if row[label] is not None else 'Unknown'} — {description}")
+
+    if money and len(rows) > 1:
+        total = sum(row[money[0]] for row in rows if row.get(money[0]) is not None)
+        lines.append(f"\nTogether: {format_euro(total)}")
+    return "\n".join(lines)
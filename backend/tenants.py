@@ -0,0 +1,115 @@
+import hmac
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from backend.load_data import DB_PATH
+
+# Every tenant (user or customer) has its own SQLite file with the same schema,
+# rollups, anomalies and columnar cache as the single-user database. Generated
+# SQL therefore cannot reach another tenant's rows: it only ever runs on the
+# caller's file. The default tenant is the original data/data_base/data.db.
+DEFAULT_TENANT = "default"
+TENANTS_DIR = r"data/tenants"
+TENANT_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# X-Tenant-ID is only trusted from the authenticating proxy, which proves
+# itself with this shared secret in X-Tenant-Proxy-Secret (and must strip both
+# headers from client requests). Without a secret the API is single-tenant and
+# any X-Tenant-ID header is refused.
+TENANT_PROXY_SECRET = os.getenv("TENANT_PROXY_SECRET", "")
+
+# Per-tenant handles (database connections, insights snapshots, router
+# entities) kept in memory at once; the least recently used are dropped.
+MAX_OPEN_TENANTS = int(os.getenv("MAX_OPEN_TENANTS", "64"))
+
+
+def tenant_db_path(tenant=None):
+    tenant = tenant or DEFAULT_TENANT
+    if tenant == DEFAULT_TENANT:
+        return DB_PATH
+    if not TENANT_PATTERN.match(tenant):
+        raise ValueError(f"Invalid tenant id: {tenant!r}")
+    return os.path.join(TENANTS_DIR, tenant, "data_base", "data.db")
+
+
+def tenant_id(
+    x_tenant_id: Optional[str] = Header(None),
+    x_tenant_proxy_secret: Optional[str] = Header(None),
+) -> str:
+    # FastAPI dependency: the tenant from the X-Tenant-ID header, set by the
+    # authenticating proxy in front of the API; requests without it use the
+    # default tenant.
+    if x_tenant_id is None:
+        return DEFAULT_TENANT
+    if not TENANT_PROXY_SECRET or not hmac.compare_digest(
+            (x_tenant_proxy_secret or "").encode(), TENANT_PROXY_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="X-Tenant-ID is only accepted from the tenant proxy")
+    tenant = x_tenant_id
+    if not TENANT_PATTERN.match(tenant):
+        raise HTTPException(status_code=400, detail="Invalid X-Tenant-ID")
+    if tenant != DEFAULT_TENANT and not os.path.exists(tenant_db_path(tenant)):
+        raise HTTPException(status_code=404, detail=f"Unknown tenant: {tenant}")
+    return tenant
+
+
+class TenantLRU:
+    # Thread-safe tenant -> object map bounded to maxsize entries. An evicted
+    # object stays usable for whoever still holds it and is freed afterwards.
+    # The factory (opening and migrating a database) runs under a per-tenant
+    # lock, so one slow tenant does not hold up the others.
+
+    def __init__(self, factory, maxsize=MAX_OPEN_TENANTS):
+        self.factory = factory
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, tenant):
+        # Caller holds self._lock.
+        item = self._items.get(tenant)
+        if item is not None:
+            self._items.move_to_end(tenant)
+        return item
+
+    def get(self, tenant=None):
+        tenant = tenant or DEFAULT_TENANT
+        with self._lock:
+            item = self._lookup(tenant)
+            if item is not None:
+                return item
+            building = self._building.setdefault(tenant, threading.Lock())
+
+        with building:
+            # Built by whoever held the tenant lock before us
+            with self._lock:
+                item = self._lookup(tenant)
+            if item is not None:
+                return item
+
+            try:
+                item = self.factory(tenant)
+            except BaseException:
+                with self._lock:
+                    self._release(tenant, building)
+                raise
+
+            with self._lock:
+                self._items[tenant] = item
+                self._release(tenant, building)
+                while len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+            return item
+
+    def _release(self, tenant, building):
+        # Caller holds self._lock.
+        if self._building.get(tenant) is building:
+            del self._building[tenant]
+
+    def __len__(self):
+        return len(self._items)
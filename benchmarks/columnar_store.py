@@ -0,0 +1,127 @@
+# Run from the repository root: python -m benchmarks.columnar_store
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from backend.columnar_store import read_receipts_columns, write_columnar_cache
+from backend.insights_engine import INSIGHTS_COLUMNS
+from backend.load_data import DB_PATH, RECEIPTS_SCHEMA, normalize_dates
+
+METHODS = ("csv", "sqlite", "columnar")
+
+
+def make_database(source_db, scale, workdir):
+    # Copies Receipts `scale` times, each copy shifted by a year with fresh ids,
+    # and exports the result as CSV as well, for the read_csv baseline.
+    db_path = os.path.join(workdir, "data.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(RECEIPTS_SCHEMA)
+    conn.execute("ATTACH DATABASE ? AS source", (source_db,))
+    columns = [row[1] for row in conn.execute('PRAGMA table_info("Receipts")')
+               if row[1] not in ("issue_day", "issue_ts")]
+    id_offset = conn.execute("SELECT MAX(id) + 1 FROM source.Receipts").fetchone()[0]
+    receipt_offset = conn.execute("SELECT MAX(fs_receipt_id) + 1 FROM source.Receipts").fetchone()[0]
+
+    with conn:
+        for copy in range(scale):
+            select = []
+            for column in columns:
+                if column == "id":
+                    select.append(f"id + {copy * id_offset}")
+                elif column == "fs_receipt_id":
+                    select.append(f"fs_receipt_id + {copy * receipt_offset}")
+                elif column == "fs_receipt_issue_date":
+                    select.append(f"DATETIME(fs_receipt_issue_date, '+{copy} years')")
+                else:
+                    select.append(f'"{column}"')
+            conn.execute(
+                f"INSERT INTO Receipts ({', '.join(columns)}) "
+                f"SELECT {', '.join(select)} FROM source.Receipts ORDER BY rowid"
+            )
+        normalize_dates(conn)
+        conn.execute("CREATE INDEX idx_receipts_issue_day ON Receipts (issue_day)")
+    conn.execute("DETACH DATABASE source")
+
+    csv_path = os.path.join(workdir, "Receipts.csv")
+    pd.read_sql("SELECT * FROM Receipts", conn).to_csv(csv_path)
+
+    columnar_dir = os.path.join(workdir, "columnar")
+    started = time.perf_counter()
+    write_columnar_cache(conn, 0, out_dir=columnar_dir)
+    build_seconds = time.perf_counter() - started
+
+    rows = conn.execute("SELECT COUNT(*) FROM Receipts").fetchone()[0]
+    conn.close()
+    return rows, build_seconds
+
+
+def load(method, workdir):
+    if method == "csv":
+        # What the insights module did before the SQLite/columnar stores existed.
+        return pd.read_csv(os.path.join(workdir, "Receipts.csv"))
+    if method == "sqlite":
+        conn = sqlite3.connect(os.path.join(workdir, "data.db"))
+        try:
+            return pd.read_sql(f"SELECT {', '.join(INSIGHTS_COLUMNS)} FROM Receipts", conn)
+        finally:
+            conn.close()
+    return read_receipts_columns(INSIGHTS_COLUMNS, out_dir=os.path.join(workdir, "columnar"))
+
+
+def peak_rss_kib():
+    # High-water mark of this process (Linux); ru_maxrss would include the
+    # parent's peak inherited across fork.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def child(method, workdir):
+    # Runs in a fresh interpreter so the peak RSS belongs to one loader only.
+    baseline_rss = peak_rss_kib()
+    started = time.perf_counter()
+    df = load(method, workdir)
+    seconds = time.perf_counter() - started
+    peak_rss = peak_rss_kib()
+    print(json.dumps({
+        "seconds": round(seconds, 4),
+        "frame_mib": round(df.memory_usage(deep=True).sum() / 2**20, 2),
+        "peak_rss_mib": round(peak_rss / 1024, 1),
+        "load_rss_mib": round((peak_rss - baseline_rss) / 1024, 1),
+    }))
+
+
+def run(scale, source_db=DB_PATH):
+    with tempfile.TemporaryDirectory() as workdir:
+        rows, build_seconds = make_database(source_db, scale, workdir)
+        report = {"scale": scale, "rows": rows, "columnar_build_seconds": round(build_seconds, 3)}
+        for method in METHODS:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.columnar_store", "--child", method, workdir],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            report[method] = json.loads(output.strip().splitlines()[-1])
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receipts load time and memory: CSV vs SQLite vs columnar cache")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 50],
+                        help="how many shifted copies of data/data_base/data.db to benchmark")
+    parser.add_argument("--child", nargs=2, metavar=("METHOD", "WORKDIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+    else:
+        for scale in args.scales:
+            print(run(scale))
@@ -0,0 +1,163 @@
+# Run from the repository root: python -m benchmarks.end_to_end --rows 10000 1000000 --out results.json
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.synthetic_receipts import write_receipts_csv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHAT_QUERIES = [
+    "hello",
+    "how much did I spend in total?",
+    "how much did I spend at Lidl?",
+    "dairy spending",
+    "what do I buy most often?",
+    "show me my milk purchases",
+]
+
+
+def timed(func, *args, repeats=1, **kwargs):
+    # (result of the last call, median seconds)
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        times.append(time.perf_counter() - started)
+    return result, statistics.median(times)
+
+
+def date_endpoints(db_path):
+    # The /api/date/* requests the frontend makes, over the data's own range.
+    conn = sqlite3.connect(db_path)
+    try:
+        first, last = conn.execute("SELECT MIN(day), MAX(day) FROM Spending_Daily").fetchone()
+    finally:
+        conn.close()
+    month = last[:7]
+    return {
+        "sort_by_year": "/api/date/sort_by_year",
+        "sort_by_week": "/api/date/sort_by_week",
+        "sort_by_month": "/api/date/sort_by_month",
+        "total_by_date": f"/api/date/total_by_date?date={last}",
+        "totals_by_date": f"/api/date/totals_by_date?from={month}-01&to={last}",
+        "spending_daily": f"/api/date/spending?from={first}&to={last}&granularity=day",
+        "spending_store": f"/api/date/spending?from={first}&to={last}&granularity=month&store=Lidl",
+        "insights": "/api/date/insights",
+    }
+
+
+def child(csv_path, llm_latency, repeats):
+    # Runs inside the work directory, so every relative data/ path of the
+    # backend points at the synthetic database.
+    from backend import creating_promt
+    from backend.creating_promt import answer
+    from backend.insights_engine import get_insights_engine
+    from backend.load_data import DB_PATH, create_database
+    from benchmarks.stub_llm import StubLLM
+
+    report = {}
+    _, report["create_database_seconds"] = timed(create_database, DB_PATH, csv_path)
+    with sqlite3.connect(DB_PATH) as conn:
+        report["rows"] = conn.execute("SELECT COUNT(*) FROM Receipts").fetchone()[0]
+    report["db_mib"] = round(os.path.getsize(DB_PATH) / 2**20, 1)
+
+    # First call builds the snapshot, later ones are served from it.
+    _, report["insights_build_seconds"] = timed(get_insights_engine().get)
+    _, report["insights_cached_seconds"] = timed(get_insights_engine().get, repeats=repeats)
+
+    from fastapi.testclient import TestClient
+    from main import app
+
+    endpoints = {}
+    with TestClient(app) as client:
+        for name, url in date_endpoints(DB_PATH).items():
+            response, seconds = timed(client.get, url, repeats=repeats)
+            endpoints[name] = {
+                "status": response.status_code,
+                "median_ms": round(seconds * 1000, 2),
+                "bytes": len(response.content),
+            }
+    report["endpoints"] = endpoints
+
+    llm = StubLLM(latency=llm_latency)
+    creating_promt._llm = llm
+    chat = {}
+    for query in CHAT_QUERIES:
+        calls = llm.calls
+        result, cold = timed(answer, query)
+        _, warm = timed(answer, query, repeats=repeats)
+        chat[query] = {
+            "intent": result.get("intent"),
+            "mode": result.get("mode"),
+            "llm_calls": llm.calls - calls,
+            "cold_ms": round(cold * 1000, 2),
+            "warm_ms": round(warm * 1000, 2),
+        }
+    report["chat"] = chat
+    report["llm_latency_seconds"] = llm_latency
+    return report
+
+
+def run(rows, llm_latency=0.0, repeats=5, seed=7):
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "Receipts.csv")
+        generate_seconds = write_receipts_csv(csv_path, rows, seed=seed)
+        shutil.copy(os.path.join(REPO_ROOT, "intent_embeddings.json"), workdir)
+
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.end_to_end", "--child", csv_path,
+             "--llm-latency", str(llm_latency), "--repeats", str(repeats)],
+            cwd=workdir, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        return {"requested_rows": rows, "generate_csv_seconds": round(generate_seconds, 3), **report}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end timings on synthetic receipts with a stub LLM")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000],
+                        help="synthetic dataset sizes, e.g. 10000 1000000 10000000")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="seconds the stub LLM spends on every call")
+    parser.add_argument("--repeats", type=int, default=5, help="timed repeats per request (median is kept)")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    parser.add_argument("--child", metavar="CSV", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.llm_latency, args.repeats)))
+    else:
+        report = {"environment": environment(), "runs": []}
+        for rows in args.rows:
+            report["runs"].append(run(rows, args.llm_latency, args.repeats))
+            print(json.dumps(report["runs"][-1]), flush=True)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
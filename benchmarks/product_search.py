@@ -0,0 +1,89 @@
+# Run from the repository root: python -m benchmarks.product_search
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from backend.load_data import DB_PATH, RECEIPTS_SCHEMA
+from backend.product_search import PRODUCT_COLUMNS, index_products, rewrite_product_search
+
+TERMS = ("mlieko", "milk", "rajo", "chlieb", "banan", "coca")
+
+# The shapes the SQL prompt asks the LLM for: a listing and a total.
+QUERIES = {
+    "listing": (
+        "SELECT name, price, fs_receipt_issue_date FROM Receipts "
+        "WHERE (name LIKE '%{term}%' OR ai_name_without_brand_and_quantity LIKE '%{term}%' "
+        "OR ai_name_in_english_without_brand_and_quantity LIKE '%{term}%') LIMIT 20"
+    ),
+    "total": (
+        "SELECT SUM(price) as total, COUNT(*) as count FROM Receipts "
+        "WHERE (name LIKE '%{term}%' OR ai_name_without_brand_and_quantity LIKE '%{term}%' "
+        "OR ai_name_in_english_without_brand_and_quantity LIKE '%{term}%')"
+    ),
+}
+
+
+def make_database(source_db, scale, workdir):
+    # Copies the product columns of Receipts `scale` times.
+    db_path = os.path.join(workdir, "data.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(RECEIPTS_SCHEMA)
+    conn.execute("ATTACH DATABASE ? AS source", (source_db,))
+    columns = ", ".join(("price", "fs_receipt_issue_date") + PRODUCT_COLUMNS)
+    with conn:
+        for _ in range(scale):
+            conn.execute(f"INSERT INTO Receipts ({columns}) SELECT {columns} FROM source.Receipts ORDER BY rowid")
+    conn.execute("DETACH DATABASE source")
+
+    started = time.perf_counter()
+    with conn:
+        index_products(conn)
+    build_seconds = time.perf_counter() - started
+    return conn, build_seconds
+
+
+def timed(conn, sql, params=(), repeats=5):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+        times.append(time.perf_counter() - started)
+    return rows, statistics.median(times)
+
+
+def run(scale, source_db=DB_PATH):
+    with tempfile.TemporaryDirectory() as workdir:
+        conn, build_seconds = make_database(source_db, scale, workdir)
+        rows = conn.execute("SELECT COUNT(*) FROM Receipts").fetchone()[0]
+        report = {"scale": scale, "rows": rows, "fts_build_seconds": round(build_seconds, 3)}
+
+        for name, template in QUERIES.items():
+            like_total = fts_total = 0.0
+            for term in TERMS:
+                sql = template.format(term=term)
+                fts_sql, params = rewrite_product_search(sql, "Receipts")
+                like_rows, like_seconds = timed(conn, sql)
+                fts_rows, fts_seconds = timed(conn, fts_sql, params)
+                like_total += like_seconds
+                fts_total += fts_seconds
+                if name == "total":
+                    report[f"matches_{term}"] = {"like": like_rows[0][1], "fts": fts_rows[0][1]}
+            report[name] = {
+                "like_ms": round(like_total / len(TERMS) * 1000, 2),
+                "fts_ms": round(fts_total / len(TERMS) * 1000, 2),
+            }
+        conn.close()
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Product search: LIKE '%...%' scans vs the Products_FTS index")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 125],
+                        help="how many copies of data/data_base/data.db's receipts to search (125 ~ 1M rows)")
+    args = parser.parse_args()
+
+    for scale in args.scales:
+        print(run(scale))
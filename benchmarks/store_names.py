@@ -0,0 +1,133 @@
+# Run from the repository root: python -m benchmarks.store_names
+import argparse
+import random
+import re
+import time
+
+import pandas as pd
+
+from backend.insights_engine import group_store_names, normalize_store_names
+
+SUFFIXES = ["", " s.r.o.", ", s.r.o.", " spol. s r.o.", " a.s.", " v.o.s.", " SK", " Slovakia", " GmbH", " Ltd."]
+CITIES = ["Bratislava", "Košice", "Žilina", "Nitra", "Trnava", "Prešov", "Martin", "Poprad"]
+GENERIC_WORDS = ["Potraviny", "Pizzeria", "Lekáreň", "Café", "Drogéria", "Pekáreň", "Reštaurácia", "Bistro"]
+CONSONANTS = "bcdfghjklmnprstvzž"
+VOWELS = "aeiouy"
+
+
+# Implementation used by the insights pipeline before the vectorized version,
+# kept here as the reference for timings and for the equivalence check.
+def legacy_normalize_store_name(store_name):
+    if pd.isna(store_name):
+        return "Unknown"
+
+    name = str(store_name).strip()
+
+    patterns_to_remove = [
+        r",?\s*s\.r\.o\.?",
+        r",?\s*v\.o\.s\.?",
+        r",?\s*a\.s\.?",
+        r",?\s*spol\.\s*s\s*r\.o\.?",
+        r",?\s*Slovenská republika",
+        r",?\s*Slovakia",
+        r",?\s*SR",
+        r",?\s*Inc\.?",
+        r",?\s*Ltd\.?",
+        r",?\s*GmbH",
+    ]
+
+    for pattern in patterns_to_remove:
+        name = re.sub(pattern, "", name, flags=re.IGNORECASE)
+
+    name = re.sub(r"\s+", " ", name).strip()
+    name = name.rstrip(",").strip()
+
+    return name
+
+
+def legacy_group_store_names(unique_stores):
+    def similar(a, b):
+        a = a.lower()
+        b = b.lower()
+        return a in b or b in a
+
+    store_map = {}
+    for s in unique_stores:
+        found = False
+        for k in list(store_map.keys()):
+            if similar(s, k):
+                store_map[s] = k
+                found = True
+                break
+        if not found:
+            store_map[s] = s
+    return store_map
+
+
+def make_store_names(merchants, rows, seed=7):
+    rng = random.Random(seed)
+    brands = set()
+    while len(brands) < merchants:
+        word = "".join(
+            rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(2, 4))
+        ).capitalize()
+        if rng.random() < 0.3:
+            word = rng.choice(GENERIC_WORDS) + " " + word
+        if rng.random() < 0.3:
+            word += " " + rng.choice(CITIES)
+        if rng.random() < 0.1:
+            word += " " + str(rng.randint(1, 999))
+        brands.add(word)
+    brands = sorted(brands)
+    rng.shuffle(brands)
+    merchant_names = [brand + rng.choice(SUFFIXES) for brand in brands]
+    return pd.Series([rng.choice(merchant_names) for _ in range(rows)])
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def run(merchants, rows, legacy=True):
+    names = make_store_names(merchants, rows)
+
+    normalized, normalize_seconds = timed(normalize_store_names, names)
+    unique_stores = list(normalized.unique())
+    groups, group_seconds = timed(group_store_names, unique_stores)
+
+    report = {
+        "merchants": merchants,
+        "rows": rows,
+        "normalize_seconds": round(normalize_seconds, 4),
+        "group_seconds": round(group_seconds, 4),
+        "groups": len(set(groups.values())),
+    }
+
+    if legacy:
+        legacy_normalized, legacy_normalize_seconds = timed(
+            lambda s: s.apply(legacy_normalize_store_name), names
+        )
+        legacy_groups, legacy_group_seconds = timed(
+            legacy_group_store_names, list(legacy_normalized.unique())
+        )
+        report.update({
+            "legacy_normalize_seconds": round(legacy_normalize_seconds, 4),
+            "legacy_group_seconds": round(legacy_group_seconds, 4),
+            "identical": bool(
+                legacy_normalized.tolist() == normalized.tolist() and legacy_groups == groups
+            ),
+        })
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store-name normalization/grouping benchmark")
+    parser.add_argument("--legacy-limit", type=int, default=5_000,
+                        help="largest merchant count the O(n^2) legacy grouping is run for")
+    args = parser.parse_args()
+
+    for merchants, rows in [(1_000, 50_000), (5_000, 200_000), (20_000, 500_000), (100_000, 1_000_000)]:
+        print(run(merchants, rows, legacy=merchants <= args.legacy_limit))
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import re
+import time
+
+from llama_index.core.base.llms.types import CompletionResponse
+
+from backend.intent_router import GREETING_PATTERN
+
+SQL_PROMPT_QUERY = re.compile(r'User query: "(.*)"')
+FORMAT_PROMPT_QUERY = re.compile(r"User's question: \"(.*)\"")
+TABLE_NAME = re.compile(r'Use table name "(\w+)"')
+
+CATEGORY_WORDS = {
+    "dairy": "Dairy", "bakery": "Bakery", "fruit": "Fruit", "vegetable": "Vegetables",
+    "meat": "Meat", "drink": "Beverages", "beverage": "Beverages", "snack": "Snacks",
+    "household": "Household", "cosmetic": "Cosmetics", "fuel": "Fuel", "clothes": "Clothing",
+}
+
+
+class StubLLM:
+    # Deterministic stand-in for the Groq client with the methods the chat
+    # pipeline calls. The SQL step maps keywords of the question to the same
+    # kind of JSON the real model returns; the formatting step echoes a short
+    # summary. `latency` seconds are spent per call (split across the chunks
+    # when streaming), so runs can model a fast or a slow provider.
+
+    def __init__(self, latency=0.0, chunk_size=16):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def respond(self, prompt):
+        self.calls += 1
+        question = SQL_PROMPT_QUERY.search(prompt)
+        if question:
+            table = TABLE_NAME.search(prompt)
+            return json.dumps(self.classify(question.group(1), table.group(1) if table else "Receipts"))
+        question = FORMAT_PROMPT_QUERY.search(prompt)
+        rows = prompt.count("\n")
+        return f"📊 Here is what I found for \"{question.group(1) if question else ''}\" ({rows} lines of data)."
+
+    @staticmethod
+    def classify(query, table):
+        lowered = query.lower()
+        if GREETING_PATTERN.match(query):
+            return {"intent": "greeting", "sql": None, "needs_formatting": False}
+        store = re.search(r"\bat ([\w'.-]+)", query)
+        if store:
+            return {
+                "intent": "spending_store",
+                "sql": f"SELECT org_name, SUM(price) as total, COUNT(*) as count FROM {table} "
+                       f"WHERE org_name LIKE '%{store.group(1)}%' GROUP BY org_name ORDER BY total DESC LIMIT 10",
+                "needs_formatting": True,
+            }
+        for word, category in CATEGORY_WORDS.items():
+            if word in lowered:
+                return {
+                    "intent": "spending_category",
+                    "sql": f"SELECT ai_category, SUM(price) as total, COUNT(*) as count FROM {table} "
+                           f"WHERE ai_category = '{category}' GROUP BY ai_category",
+                    "needs_formatting": True,
+                }
+        if "most" in lowered or "often" in lowered:
+            return {
+                "intent": "most_frequent",
+                "sql": f"SELECT ai_category, COUNT(*) as count, SUM(price) as total FROM {table} "
+                       "GROUP BY ai_category ORDER BY count DESC LIMIT 5",
+                "needs_formatting": True,
+            }
+        if "total" in lowered or "spend" in lowered:
+            return {
+                "intent": "spending_total",
+                "sql": f"SELECT SUM(price) as total, COUNT(*) as count FROM {table}",
+                "needs_formatting": True,
+            }
+        product = re.sub(r"[^\w ]", "", lowered).split()[-1] if lowered.strip() else ""
+        if not product:
+            return {"intent": "fallback", "sql": None, "needs_formatting": False}
+        return {
+            "intent": "product_search",
+            "sql": f"SELECT name, price, fs_receipt_issue_date FROM {table} "
+                   f"WHERE (name LIKE '%{product}%' OR ai_name_in_english_without_brand_and_quantity "
+                   f"LIKE '%{product}%') ORDER BY fs_receipt_issue_date DESC LIMIT 10",
+            "needs_formatting": True,
+        }
+
+    def complete(self, prompt, **kwargs):
+        time.sleep(self.latency)
+        return CompletionResponse(text=self.respond(prompt))
+
+    async def acomplete(self, prompt, **kwargs):
+        await asyncio.sleep(self.latency)
+        return CompletionResponse(text=self.respond(prompt))
+
+    async def astream_complete(self, prompt, **kwargs):
+        text = self.respond(prompt)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+
+        async def stream():
+            sent = ""
+            for chunk in chunks:
+                await asyncio.sleep(self.latency / len(chunks))
+                sent += chunk
+                yield CompletionResponse(text=sent, delta=chunk)
+
+        return stream()
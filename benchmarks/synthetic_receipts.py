@@ -0,0 +1,264 @@
+# Run from the repository root: python -m benchmarks.synthetic_receipts --rows 1000000 --out /tmp/Receipts.csv
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Chains with their relative popularity and the kind of goods they sell;
+# popularity falls off roughly like a Zipf distribution, as in real data.
+STORES = [
+    ("Lidl Slovenská republika, v.o.s.", "Lidl", "grocery", 30),
+    ("Kaufland Slovenská republika v.o.s.", "Kaufland", "grocery", 22),
+    ("TESCO STORES SR, a.s.", "Tesco", "grocery", 18),
+    ("BILLA s.r.o.", "Billa", "grocery", 14),
+    ("COOP Jednota Slovensko, spotrebné družstvo", "COOP Jednota", "grocery", 10),
+    ("Terno real estate s.r.o.", "Terno", "grocery", 5),
+    ("dm drogerie markt s.r.o.", "dm", "drugstore", 8),
+    ("ROSSMANN, spol. s r.o.", "Rossmann", "drugstore", 4),
+    ("Dr.Max Slovensko s. r. o.", "Dr.Max", "pharmacy", 4),
+    ("BENU Slovensko s.r.o.", "BENU", "pharmacy", 2),
+    ("Slovnaft, a.s.", "Slovnaft", "fuel", 6),
+    ("Shell Slovakia, s.r.o.", "Shell", "fuel", 3),
+    ("OMV Slovensko, s.r.o.", "OMV", "fuel", 3),
+    ("McDonald's Slovakia, spol. s r.o.", "McDonald's", "restaurant", 5),
+    ("KFC Slovakia s.r.o.", "KFC", "restaurant", 2),
+    ("Bistro u Kocúra s.r.o.", "Bistro u Kocúra", "restaurant", 1),
+    ("Pepco Slovakia s. r. o.", "Pepco", "clothing", 2),
+    ("Inditex Slovakia, s. r. o.", "Zara", "clothing", 2),
+    ("DECATHLON Slovakia s.r.o.", "Decathlon", "sport", 1),
+    ("IKEA Bratislava, s.r.o.", "IKEA", "home", 1),
+    ("HORNBACH Baumarkt SK spol. s r.o.", "Hornbach", "home", 1),
+    ("NAY a.s.", "NAY", "electronics", 1),
+]
+
+# name, latitude, longitude, postal code; the first one is the shopper's home.
+CITIES = [
+    ("Bratislava", 48.1486, 17.1077, 81101),
+    ("Trnava", 48.3774, 17.5872, 91701),
+    ("Nitra", 48.3069, 18.0864, 94901),
+    ("Senec", 48.2196, 17.4003, 90301),
+    ("Žilina", 49.2231, 18.7394, 1001),
+    ("Banská Bystrica", 48.7363, 19.1462, 97401),
+    ("Poprad", 49.0596, 20.2975, 5801),
+    ("Košice", 48.7164, 21.2611, 4001),
+    ("Prešov", 48.9984, 21.2339, 8001),
+    ("Liptovský Mikuláš", 49.0811, 19.6120, 3101),
+    ("Vysoké Tatry", 49.1392, 20.2208, 5960),
+    ("Piešťany", 48.5918, 17.8271, 92101),
+]
+# Share of receipts from the home city on workdays and on weekends.
+HOME_SHARE = {"weekday": 0.9, "weekend": 0.6}
+
+# category -> [(Slovak name, English name, brand, typical price, unit value, unit)]
+PRODUCTS = {
+    "Dairy": [("Mlieko polotučné", "Semi-skimmed Milk", "Rajo", 1.09, 1, "l"),
+              ("Jogurt biely", "White Yogurt", "Danone", 0.59, 150, "g"),
+              ("Maslo", "Butter", "Rajo", 2.49, 250, "g"),
+              ("Syr Eidam", "Edam Cheese", "Milsy", 2.19, 200, "g")],
+    "Bakery": [("Chlieb konzumný", "Bread", None, 1.39, 1, "kg"),
+               ("Rožok", "Bread Roll", None, 0.12, 40, "g"),
+               ("Croissant", "Croissant", None, 0.69, 60, "g")],
+    "Fruit": [("Banány", "Bananas", "Chiquita", 1.29, 1, "kg"),
+              ("Jablká", "Apples", None, 1.49, 1, "kg"),
+              ("Pomaranče", "Oranges", None, 1.69, 1, "kg")],
+    "Vegetables": [("Paradajky", "Tomatoes", None, 2.49, 1, "kg"),
+                   ("Zemiaky", "Potatoes", None, 0.99, 2, "kg"),
+                   ("Uhorka šalátová", "Cucumber", None, 0.79, 1, "ks")],
+    "Meat": [("Kuracie prsia", "Chicken Breast", None, 7.99, 1, "kg"),
+             ("Bravčová krkovička", "Pork Neck", None, 6.49, 1, "kg"),
+             ("Šunka výberová", "Ham", "Mecom", 1.99, 100, "g")],
+    "Beverages": [("Coca-Cola", "Coca-Cola", "Coca-Cola", 1.79, 1.5, "l"),
+                  ("Minerálna voda", "Mineral Water", "Budiš", 0.69, 1.5, "l"),
+                  ("Pivo svetlé", "Lager Beer", "Zlatý Bažant", 1.19, 0.5, "l"),
+                  ("Káva zrnková", "Coffee Beans", "Tchibo", 8.99, 500, "g")],
+    "Snacks": [("Čokoláda mliečna", "Milk Chocolate", "Milka", 1.49, 100, "g"),
+               ("Chipsy solené", "Salted Crisps", "Bohemia", 1.89, 140, "g"),
+               ("Tyčinka Horalky", "Wafer Bar", "Sedita", 0.45, 50, "g")],
+    "Household": [("Prací gél", "Laundry Gel", "Persil", 12.99, 2, "l"),
+                  ("Toaletný papier", "Toilet Paper", "Zewa", 3.99, 8, "ks"),
+                  ("Saponát na riad", "Dish Soap", "Jar", 2.29, 900, "ml")],
+    "Cosmetics": [("Šampón", "Shampoo", "Nivea", 3.49, 400, "ml"),
+                  ("Zubná pasta", "Toothpaste", "Colgate", 2.19, 75, "ml"),
+                  ("Sprchový gél", "Shower Gel", "Balea", 1.29, 300, "ml")],
+    "Pharmacy": [("Ibuprofen 400 mg", "Ibuprofen", "Ibalgin", 4.99, 24, "ks"),
+                 ("Vitamín C", "Vitamin C", "Celaskon", 6.49, 30, "ks")],
+    "Fuel": [("Natural 95", "Petrol 95", None, 62.0, 40, "l"),
+             ("Diesel", "Diesel", None, 58.0, 40, "l")],
+    "Fast Food": [("Big Mac Menu", "Big Mac Meal", "McDonald's", 8.90, 1, "ks"),
+                  ("Hranolky stredné", "Medium Fries", None, 2.60, 1, "ks"),
+                  ("Obedové menu", "Lunch Menu", None, 7.50, 1, "ks")],
+    "Clothing": [("Tričko bavlnené", "Cotton T-shirt", None, 7.99, 1, "ks"),
+                 ("Džínsy", "Jeans", None, 29.99, 1, "ks"),
+                 ("Ponožky 3 páry", "Socks 3 Pairs", None, 4.99, 3, "ks")],
+    "Sport": [("Bežecké topánky", "Running Shoes", "Kalenji", 49.99, 1, "ks"),
+              ("Fľaša na vodu", "Water Bottle", "Quechua", 6.99, 0.7, "l")],
+    "Home": [("Úložný box", "Storage Box", None, 9.99, 1, "ks"),
+             ("Žiarovka LED", "LED Bulb", "Philips", 3.49, 1, "ks"),
+             ("Skrutky sada", "Screw Set", None, 5.99, 100, "ks")],
+    "Electronics": [("USB-C kábel", "USB-C Cable", "Xiaomi", 9.99, 1, "ks"),
+                    ("Slúchadlá", "Headphones", "JBL", 39.99, 1, "ks")],
+}
+
+# store kind -> category weights
+KIND_CATEGORIES = {
+    "grocery": {"Dairy": 18, "Bakery": 16, "Fruit": 12, "Vegetables": 12, "Meat": 10,
+                "Beverages": 14, "Snacks": 10, "Household": 5, "Cosmetics": 3},
+    "drugstore": {"Cosmetics": 60, "Household": 30, "Snacks": 10},
+    "pharmacy": {"Pharmacy": 85, "Cosmetics": 15},
+    "fuel": {"Fuel": 60, "Beverages": 25, "Snacks": 15},
+    "restaurant": {"Fast Food": 80, "Beverages": 20},
+    "clothing": {"Clothing": 100},
+    "sport": {"Sport": 80, "Clothing": 20},
+    "home": {"Home": 85, "Household": 15},
+    "electronics": {"Electronics": 100},
+}
+# Mean number of items on a receipt from each kind of store.
+KIND_BASKET = {"grocery": 7, "drugstore": 3, "pharmacy": 1.5, "fuel": 1.3, "restaurant": 2,
+               "clothing": 2, "sport": 1.5, "home": 3, "electronics": 1.2}
+
+LAST_DAY = pd.Timestamp("2025-10-31")
+DEFAULT_CHUNK_ROWS = 500_000
+
+
+def _catalog():
+    categories = list(PRODUCTS)
+    products = [(category, *product) for category in categories for product in PRODUCTS[category]]
+    by_category = {
+        category: np.array([i for i, p in enumerate(products) if p[0] == category])
+        for category in categories
+    }
+    return products, by_category
+
+
+def _receipt_times(rng, count, years):
+    # Days uniform over the period, hours peaking in the late afternoon.
+    first_day = LAST_DAY - pd.Timedelta(days=365 * years)
+    days = rng.integers(0, 365 * years, size=count)
+    hours = np.clip(rng.normal(15, 3, size=count).round(), 6, 22).astype(np.int64)
+    seconds = rng.integers(0, 3600, size=count)
+    return first_day + pd.to_timedelta(days, unit="D") + pd.to_timedelta(hours * 3600 + seconds, unit="s")
+
+
+def generate_receipts(rows, seed=7, years=3, chunk_rows=DEFAULT_CHUNK_ROWS):
+    # Yields DataFrames with the columns of data/Receipts.csv, `rows` item rows
+    # in total, chunk by chunk so 10M rows never sit in memory at once.
+    rng = np.random.default_rng(seed)
+    products, by_category = _catalog()
+    store_weights = np.array([s[3] for s in STORES], dtype=float)
+    store_weights /= store_weights.sum()
+    store_kinds = np.array([s[2] for s in STORES])
+    mean_basket = float(np.dot(store_weights, [KIND_BASKET[k] for k in store_kinds]))
+
+    next_item_id = 1
+    next_receipt_id = 1
+    written = 0
+    while written < rows:
+        wanted = min(chunk_rows, rows - written)
+        receipt_count = max(1, int(wanted / mean_basket * 1.1))
+
+        stores = rng.choice(len(STORES), size=receipt_count, p=store_weights)
+        times = _receipt_times(rng, receipt_count, years)
+        weekend = times.dayofweek.to_numpy() >= 5
+        home_share = np.where(weekend, HOME_SHARE["weekend"], HOME_SHARE["weekday"])
+        away = rng.integers(1, len(CITIES), size=receipt_count)
+        cities = np.where(rng.random(receipt_count) < home_share, 0, away)
+
+        baskets = np.array([KIND_BASKET[k] for k in store_kinds[stores]])
+        items = 1 + rng.poisson(baskets - 1)
+        receipt_of_item = np.repeat(np.arange(receipt_count), items)[:wanted]
+        n = len(receipt_of_item)
+
+        item_stores = stores[receipt_of_item]
+        product = np.empty(n, dtype=np.int64)
+        for kind, weights in KIND_CATEGORIES.items():
+            mask = store_kinds[item_stores] == kind
+            if not mask.any():
+                continue
+            names = list(weights)
+            p = np.array([weights[c] for c in names], dtype=float)
+            chosen = rng.choice(len(names), size=mask.sum(), p=p / p.sum())
+            picks = np.empty(mask.sum(), dtype=np.int64)
+            for i, category in enumerate(names):
+                hit = chosen == i
+                picks[hit] = rng.choice(by_category[category], size=hit.sum())
+            product[mask] = picks
+
+        base_price = np.array([p[4] for p in products])[product]
+        price = np.round(base_price * rng.lognormal(0, 0.15, size=n), 2)
+        # Mostly one piece; now and then a multipack or a bulk buy.
+        quantity = rng.choice([1.0, 2.0, 3.0, 6.0, 10.0], size=n, p=[0.82, 0.1, 0.05, 0.02, 0.01])
+
+        item_cities = cities[receipt_of_item]
+        units = item_stores * len(CITIES) + item_cities
+        # Every store unit sits at its own point near the city centre.
+        unit_rng = np.random.default_rng(seed + 1)
+        unit_offsets = unit_rng.normal(0, 0.02, size=(len(STORES) * len(CITIES), 2))
+        city_lat = np.array([c[1] for c in CITIES])[item_cities]
+        city_lon = np.array([c[2] for c in CITIES])[item_cities]
+
+        store_names = np.array([s[0] for s in STORES], dtype=object)
+        brands = np.array([s[1] for s in STORES], dtype=object)
+        city_names = np.array([c[0] for c in CITIES], dtype=object)
+        postal_codes = np.array([float(c[3]) for c in CITIES])
+        # formatted once per receipt, not once per item
+        stamps = np.asarray(times.strftime("%Y-%m-%d %H:%M:%S.000000 +00:00"), dtype=object)
+        column = lambda index: np.array([p[index] for p in products], dtype=object)[product]
+
+        yield pd.DataFrame({
+            "id": np.arange(next_item_id, next_item_id + n),
+            "quantity": quantity,
+            "name": column(1),
+            "price": price,
+            "fs_receipt_id": next_receipt_id + receipt_of_item,
+            "fs_receipt_issue_date": stamps[receipt_of_item],
+            "org_id": item_stores + 1,
+            "org_ico": 30_000_000 + item_stores,
+            "org_dic": 2_020_000_000 + item_stores,
+            "org_building_number": "1",
+            "org_country": "Slovensko",
+            "org_ic_dph": [f"SK{2_020_000_000 + s}" for s in item_stores],
+            "org_municipality": "Bratislava",
+            "org_postal_code": 81101.0,
+            "org_name": store_names[item_stores],
+            "org_street_name": "Hlavná",
+            "unit_id": units + 1,
+            "unit_building_number": (units % 97 + 1).astype(str),
+            "unit_country": "Slovensko",
+            "unit_municipality": city_names[item_cities],
+            "unit_postal_code": postal_codes[item_cities],
+            "unit_property_registration_number": None,
+            "unit_street_name": "Obchodná",
+            "unit_name": brands[item_stores] + " " + city_names[item_cities],
+            "ai_name_without_brand_and_quantity": column(1),
+            "ai_name_in_english_without_brand_and_quantity": column(2),
+            "ai_brand": column(3),
+            "ai_category": column(0),
+            "ai_quantity_value": column(5),
+            "ai_quantity_unit": column(6),
+            "unit_latitude": np.round(city_lat + unit_offsets[units, 0], 6),
+            "unit_longitude": np.round(city_lon + unit_offsets[units, 1], 6),
+        })
+
+        next_item_id += n
+        next_receipt_id += int(receipt_of_item[-1]) + 1
+        written += n
+
+
+def write_receipts_csv(path, rows, seed=7, years=3):
+    started = time.perf_counter()
+    for i, chunk in enumerate(generate_receipts(rows, seed=seed, years=years)):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic Receipts.csv")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--out", default="Receipts.csv")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--years", type=int, default=3)
+    args = parser.parse_args()
+
+    seconds = write_receipts_csv(args.out, args.rows, seed=args.seed, years=args.years)
+    print(f"Wrote {args.rows} rows to {args.out} in {seconds:.1f}s")
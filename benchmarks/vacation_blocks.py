@@ -0,0 +1,122 @@
+# Run from the repository root: python -m benchmarks.vacation_blocks
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from backend.insights_engine import detect_vacation_blocks
+
+
+# Implementation used by the insights pipeline before the vectorized version,
+# kept here as the reference for timings and for the equivalence check.
+def legacy_detect_longest_consecutive_block(date_list):
+    dates = sorted(set(pd.to_datetime(date_list)))
+    if len(dates) == 0:
+        return None
+
+    best_start = dates[0]
+    best_end = dates[0]
+    best_len = 1
+
+    cur_start = dates[0]
+    cur_end = dates[0]
+    cur_len = 1
+
+    for i in range(1, len(dates)):
+        if (dates[i] - dates[i - 1]).days == 1:
+            cur_end = dates[i]
+            cur_len += 1
+        else:
+            if cur_len > best_len:
+                best_len = cur_len
+                best_start = cur_start
+                best_end = cur_end
+            cur_start = dates[i]
+            cur_end = dates[i]
+            cur_len = 1
+
+    if cur_len > best_len:
+        best_len = cur_len
+        best_start = cur_start
+        best_end = cur_end
+
+    if best_len < 2:
+        return None
+
+    return {
+        "consecutive_days": best_len,
+        "start_date": best_start.date(),
+        "end_date": best_end.date(),
+        "weekday_range": f"{best_start.strftime('%a')}–{best_end.strftime('%a')}",
+    }
+
+
+def legacy_vacation_blocks(travel_events):
+    vacation_cities = []
+    for city, group in travel_events.groupby("unit_municipality"):
+        result = legacy_detect_longest_consecutive_block(group["Purchase_Date"].unique())
+        if result:
+            vacation_cities.append({
+                "city": city,
+                **result
+            })
+    return vacation_cities
+
+
+def make_travel_events(cities, years, rows, seed=11):
+    # Receipt rows outside the home city over `years` years: mostly single-day
+    # trips plus some multi-day stays, several rows per day.
+    rng = random.Random(seed)
+    first_day = date(2020, 1, 1)
+    span = 365 * years
+    names = [f"City {i:05d}" for i in range(cities)]
+
+    city_column, day_column = [], []
+    while len(city_column) < rows:
+        city = rng.choice(names)
+        start = first_day + timedelta(days=rng.randrange(span))
+        length = 1 if rng.random() < 0.7 else rng.randint(2, 14)
+        for offset in range(length):
+            for _ in range(rng.randint(1, 4)):
+                city_column.append(city)
+                day_column.append(start + timedelta(days=offset))
+
+    return pd.DataFrame({
+        "unit_municipality": city_column[:rows],
+        "Purchase_Date": day_column[:rows],
+    })
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def run(cities, years, rows):
+    travel_events = make_travel_events(cities, years, rows)
+
+    blocks, seconds = timed(
+        detect_vacation_blocks, travel_events["unit_municipality"], travel_events["Purchase_Date"]
+    )
+    legacy_blocks, legacy_seconds = timed(legacy_vacation_blocks, travel_events)
+
+    return {
+        "cities": cities,
+        "years": years,
+        "rows": rows,
+        "vectorized_seconds": round(seconds, 4),
+        "legacy_seconds": round(legacy_seconds, 4),
+        "cities_with_blocks": len(blocks),
+        "identical": blocks == legacy_blocks,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vacation block detection benchmark")
+    parser.parse_args()
+
+    for cities, years, rows in [(50, 2, 10_000), (500, 5, 200_000), (5_000, 10, 1_000_000)]:
+        print(run(cities, years, rows))
@@ -1,3 +1,14 @@
+// Server-sent events arrive as "event: <name>\ndata: <json>\n\n" blocks.
+function parseEvent(block) {
+  let event = "message";
+  let data = "";
+  for (const line of block.split("\n")) {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) data += line.slice(5).trim();
+  }
+  return { event, data: data ? JSON.parse(data) : null };
+}
+
 export default function useChat({ session, updateMessages }) {
   const { messages } = session || {};
 
@@ -5,26 +16,49 @@ export default function useChat({ session, updateMessages }) {
     const newMsgs = [...messages, { role: "user", text }];
     updateMessages(session.id, newMsgs);
 
+    const showAnswer = (answer) =>
+      updateMessages(session.id, [
+        ...newMsgs,
+        { role: "assistant", text: answer },
+      ]);
+
     try {
-      const res = await fetch("http://localhost:8000/api/chat/process_text", {
+      const res = await fetch("http://localhost:8000/api/chat/stream_text", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ text }),
       });
 
-      if (!res.ok) throw new Error("Failed to get response");
-      const data = await res.json();
+      if (!res.ok || !res.body) throw new Error("Failed to get response");
 
-      updateMessages(session.id, [
-        ...newMsgs,
-        { role: "assistant", text: data.response },
-      ]);
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let answer = "";
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const { event, data } = parseEvent(buffer.slice(0, boundary));
+          buffer = buffer.slice(boundary + 2);
+
+          if (event === "token") {
+            answer += data.text;
+            showAnswer(answer);
+          } else if (event === "done") {
+            showAnswer(data.result);
+          } else if (event === "error") {
+            throw new Error(data.message);
+          }
+        }
+      }
     } catch (err) {
       console.error("Chat error:", err);
-      updateMessages(session.id, [
-        ...newMsgs,
-        { role: "assistant", text: "Server error. Try again." },
-      ]);
+      showAnswer("Server error. Try again.");
     }
   };
 
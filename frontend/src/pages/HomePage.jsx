@@ -4,38 +4,38 @@ import SpendingsChat from "../components/SpendingsChat.jsx"
 import { useEffect, useState } from "react"
 
 export default function Home() {
-  const [todayTotal, setTodayTotal] = useState(0)
+  const [totals, setTotals] = useState({})
   const [selectedDate, setSelectedDate] = useState("2023-06-08")
 
   const maxDate = new Date("2023-06-08")
+  const todayTotal = totals[selectedDate] ?? 0
 
   useEffect(() => {
-    async function loadData() {
-      const totalToday = await fetch(
-        `http://localhost:8000/api/date/total_by_date?date=${selectedDate}`
+    if (selectedDate in totals) return
+
+    // One request loads every day of the selected month.
+    const month = selectedDate.slice(0, 7)
+    const [year, monthNumber] = month.split("-").map(Number)
+    const lastDay = new Date(Date.UTC(year, monthNumber, 0)).getUTCDate()
+
+    fetch(
+      `http://localhost:8000/api/date/totals_by_date?from=${month}-01&to=${month}-${String(lastDay).padStart(2, "0")}`
+    )
+      .then((r) => r.json())
+      .then((d) =>
+        setTotals((prev) => ({
+          ...prev,
+          ...Object.fromEntries(d.totals.map(({ date, total }) => [date, total])),
+        }))
       )
-        .then((r) => r.json())
-        .then((d) => d.total)
-        .catch(() => 0)
-
-      setTodayTotal(totalToday)
-    }
-
-    loadData()
-  }, [selectedDate])
-
-  async function updateDate(newDate) {
-    const formatted = newDate.toISOString().split("T")[0]
-    setSelectedDate(formatted)
-    try {
-      const res = await fetch(
-        `http://localhost:8000/api/date/total_by_date?date=${formatted}`
-      )
-      const data = await res.json()
-      if (data?.total !== undefined) setTodayTotal(data.total)
-    } catch (err) {
-      console.error("Fetch by date failed:", err)
-    }
+      .catch((err) => {
+        console.error("Fetch by date failed:", err)
+        setTotals((prev) => ({ ...prev, [selectedDate]: 0 }))
+      })
+  }, [selectedDate, totals])
+
+  function updateDate(newDate) {
+    setSelectedDate(newDate.toISOString().split("T")[0])
   }
 
   return (
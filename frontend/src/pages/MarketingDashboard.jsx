@@ -8,7 +8,7 @@ export default function MarketingDashboard() {
     const [data, setData] = useState(null)
 
     useEffect(() => {
-        fetch("http://127.0.0.1:8000/api/date/insights")
+        fetch("http://127.0.0.1:8000/api/date/insights?page_size=5&sort=Spend&order=desc")
             .then(res => res.json())
             .then(setData)
             .catch(console.error)
@@ -68,8 +68,6 @@ export default function MarketingDashboard() {
 
                                 <div className="space-y-2 mt-1">
                                     {data.spend_per_store
-                                        .sort((a, b) => b.Spend - a.Spend)
-                                        .slice(0, 5)
                                         .map((item, idx) => (
                                             <div
                                                 key={idx}
@@ -1,8 +1,20 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+from backend.api_controller.anomalies_api_controller import router as anomalies_router
 from backend.api_controller.app_chat_api_controller import router as chat_router
 from backend.api_controller.date_sort_api_controller import router as date_router
+from backend.api_controller.geo_api_controller import router as geo_router
+from backend.db import get_database
+from backend.load_data import migrate_database, refresh_columnar_cache
+from backend.metrics import MetricsMiddleware, recent_traces, render_metrics
 
 app = FastAPI()
 
@@ -14,12 +26,46 @@ app.add_middleware(
     ],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"],
+    # Not "*": X-Tenant-ID and X-Tenant-Proxy-Secret must never come from a browser.
+    allow_headers=["Content-Type", "If-None-Match"],
+    expose_headers=["ETag"],
 )
 
+# Bodies under a kilobyte are sent as is. Brotli (with gzip for clients that
+# do not accept br) when brotli-asgi is installed, gzip otherwise. Neither
+# buffers the chat token stream: text/event-stream is left uncompressed.
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=1000, excluded_handlers=[r"/stream_text$"])
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Added last, so it is the outermost layer and times compression as well.
+app.add_middleware(MetricsMiddleware)
+
+
+@app.on_event("startup")
+def prepare_database():
+    migrate_database()
+    refresh_columnar_cache()
+    get_database()
+
 
 app.include_router(chat_router, prefix="/api/chat", tags=["Chat"])
 app.include_router(date_router, prefix="/api/date", tags=["Date"])
+app.include_router(anomalies_router, prefix="/api/anomalies", tags=["Anomalies"])
+app.include_router(geo_router, prefix="/api/geo", tags=["Geo"])
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    # Prometheus text exposition format.
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/traces", include_in_schema=False)
+def traces():
+    # Per-stage spans of the most recent requests, newest last.
+    return recent_traces()
 
 
 if __name__ == "__main__":
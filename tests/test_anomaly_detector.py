@@ -0,0 +1,124 @@
+import random
+import sqlite3
+import statistics
+
+import pytest
+
+from backend import anomaly_detector
+from backend.anomaly_detector import MedianSketch, detect_anomalies
+from backend.load_data import RECEIPTS_SCHEMA
+
+COLUMNS = ("fs_receipt_id", "issue_day", "name", "org_name", "unit_municipality", "price", "quantity")
+
+
+def make_conn(rows=()):
+    conn = sqlite3.connect(":memory:")
+    conn.execute(RECEIPTS_SCHEMA)
+    insert(conn, rows)
+    return conn
+
+
+def insert(conn, rows):
+    conn.executemany(
+        f"INSERT INTO Receipts ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})", rows
+    )
+
+
+def flagged(conn):
+    return conn.execute("SELECT receipt_rowid, kind, score, reference FROM Anomalies ORDER BY receipt_rowid, kind").fetchall()
+
+
+def receipt(receipt_id, name, price, quantity=1.0, city="Bratislava"):
+    return (receipt_id, "2024-05-01", name, "Lidl", city, price, quantity)
+
+
+@pytest.mark.parametrize("values, median", [
+    ([4.0], 4.0),
+    ([4.0, 2.0], 3.0),
+    ([5.0, 1.0, 3.0], 3.0),
+    ([5.0, 1.0, 3.0, 2.0], 2.5),
+    ([5.0, 1.0, 3.0, 2.0, 4.0], 3.0),
+])
+def test_sketch_is_exact_for_the_first_five_values(values, median):
+    sketch = MedianSketch()
+    for value in values:
+        sketch.add(value)
+    assert sketch.median() == median
+
+
+@pytest.mark.parametrize("draw", [
+    lambda rng: rng.uniform(0, 100),
+    lambda rng: rng.lognormvariate(1, 0.6),
+    lambda rng: rng.choice([0.99, 1.19, 1.29, 1.49]),
+])
+def test_sketch_tracks_the_median_of_a_long_stream(draw):
+    rng = random.Random(3)
+    values = [draw(rng) for _ in range(20_000)]
+    sketch = MedianSketch()
+    for value in values:
+        sketch.add(value)
+    exact = statistics.median(values)
+    assert sketch.median() == pytest.approx(exact, rel=0.03)
+
+
+def test_sketch_survives_a_json_round_trip():
+    rng = random.Random(4)
+    one, other = MedianSketch(), None
+    for i in range(500):
+        value = rng.uniform(0, 10)
+        one.add(value)
+        if i == 249:
+            other = MedianSketch.from_json(one.to_json())
+        elif i > 249:
+            other.add(value)
+    assert other.median() == one.median()
+    assert other.n == one.n == 500
+
+
+def test_flags_price_quantity_duplicate_and_location():
+    conn = make_conn([
+        receipt(1, "Milk", 1.0),
+        receipt(2, "Milk", 1.0),
+        receipt(3, "Milk", 1.0),
+        receipt(4, "Milk", 3.5),                    # 3.5 > 2 x median 1.0
+        receipt(5, "Water", 0.5, quantity=12),      # quantity over the limit
+        receipt(6, "Bread", 1.8),
+        receipt(6, "Bread", 1.8),                   # same item twice on receipt 6
+        receipt(7, "Cheese", 2.5, city="Wien"),     # away from the home city
+    ])
+    assert detect_anomalies(conn) == 4
+    assert flagged(conn) == [
+        (4, "price", 3.5, "1.0000"),
+        (5, "quantity", 12.0, "5"),
+        (7, "duplicate", None, "6"),
+        (8, "location", None, "Bratislava"),
+    ]
+
+
+def test_price_needs_enough_samples():
+    conn = make_conn([receipt(1, "Milk", 1.0), receipt(2, "Milk", 1.0), receipt(3, "Milk", 5.0)])
+    detect_anomalies(conn)
+    assert flagged(conn) == []
+
+
+def test_incremental_runs_match_a_single_run(monkeypatch):
+    rng = random.Random(9)
+    rows = [
+        receipt(rng.randint(1, 300), rng.choice(["Milk", "Bread", "Eggs", "Beer"]),
+                rng.choice([0.8, 1.0, 1.2, 2.9, 3.1]), quantity=rng.choice([1, 1, 2, 8]),
+                city=rng.choice(["Bratislava"] * 5 + ["Wien", "Praha"]))
+        for _ in range(2_000)
+    ]
+    once = make_conn(rows)
+    detect_anomalies(once)
+
+    monkeypatch.setattr(anomaly_detector, "DETECT_CHUNK_SIZE", 128)
+    batched = make_conn()
+    for start in range(0, len(rows), 700):
+        insert(batched, rows[start:start + 700])
+        detect_anomalies(batched)
+
+    assert flagged(batched) == flagged(once)
+    assert flagged(once)
+    # a run without new rows changes nothing
+    assert detect_anomalies(batched) == 0
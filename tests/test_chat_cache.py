@@ -0,0 +1,133 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from backend import chat_cache
+from backend.chat_cache import ChatCache, LRUCache
+
+INTENT = {"intent": "spending_total", "sql": "SELECT SUM(price) FROM Receipts", "needs_formatting": True}
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def embed_by_topic(texts):
+    # Queries about spending point one way, everything else another.
+    return np.asarray([[1.0, 0.0] if "spen" in text else [0.0, 1.0] for text in texts])
+
+
+def entities(query, tenant=None):
+    return tuple(store for store in ("lidl", "tesco") if store in query.lower())
+
+
+class Today:
+
+    def __init__(self, day):
+        self.day = day
+
+    def __call__(self):
+        return self.day
+
+
+@pytest.mark.parametrize("query", [
+    "How much did I spend this month?",
+    "What did I buy last week?",
+    "Spending today",
+    "How much did I spend in March?",
+])
+def test_sql_for_period_questions_is_kept_for_one_day(query):
+    today = Today(date(2024, 5, 31))
+    cache = ChatCache(today=today)
+    cache.store_sql(query, INTENT)
+    assert cache.lookup_sql(query) == INTENT
+
+    today.day = date(2024, 6, 1)
+    assert cache.lookup_sql(query) is None
+
+
+def test_sql_without_period_words_outlives_the_day():
+    today = Today(date(2024, 5, 31))
+    cache = ChatCache(today=today)
+    cache.store_sql("How much did I spend at Lidl?", INTENT)
+    today.day = date(2024, 6, 1)
+    assert cache.lookup_sql("how much did I spend at lidl") == INTENT
+
+
+def test_semantic_match_does_not_reach_an_earlier_day():
+    today = Today(date(2024, 5, 31))
+    cache = ChatCache(embedder=lambda texts: np.ones((1, 4)), today=today)
+    cache.store_sql("How much did I spend this month?", INTENT)
+    assert cache.lookup_sql("Total spending this month") == INTENT
+
+    today.day = date(2024, 6, 1)
+    assert cache.lookup_sql("Total spending this month") is None
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(chat_cache.time, "monotonic", clock)
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.put("key", "value")
+    clock.now += 59
+    assert cache.get("key") == "value"
+    clock.now += 2
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.keys() == ["a", "c"]
+
+
+def test_answers_are_dropped_when_the_data_version_changes():
+    cache = ChatCache()
+    cache.store_answer("SELECT 1", (), "1-a", {"result": "old"}, tenant="alice")
+    cache.store_answer("SELECT 1", (), "7-b", {"result": "bob's"}, tenant="bob")
+    assert cache.lookup_answer("SELECT 1", (), "1-a", tenant="alice") == {"result": "old"}
+
+    assert cache.lookup_answer("SELECT 1", (), "2-c", tenant="alice") is None
+    assert cache.lookup_answer("SELECT 1", (), "1-a", tenant="alice") is None
+    assert cache.lookup_answer("SELECT 1", (), "7-b", tenant="bob") == {"result": "bob's"}
+
+
+def test_answers_depend_on_the_parameters():
+    cache = ChatCache()
+    cache.store_answer("SELECT ? ", ("%Lidl%",), "1-a", {"result": "lidl"})
+    assert cache.lookup_answer("SELECT ? ", ("%Tesco%",), "1-a") is None
+
+
+def test_sql_is_kept_per_tenant():
+    cache = ChatCache()
+    cache.store_sql("Total spending", INTENT, tenant="alice")
+    assert cache.lookup_sql("total spending", tenant="alice") == INTENT
+    assert cache.lookup_sql("total spending", tenant="bob") is None
+
+
+def test_semantic_match_reuses_the_sql():
+    cache = ChatCache(embedder=embed_by_topic, signature=entities)
+    cache.store_sql("How much did I spend at Lidl?", INTENT)
+    assert cache.lookup_sql("Lidl spending please") == INTENT
+    assert cache.lookup_sql("Show my Lidl receipts") is None
+
+
+@pytest.mark.parametrize("query", [
+    "How much did I spend at Tesco?",
+    "How much did I spend at Lidl and Tesco?",
+    "How much did I spend at Lidl on 3 items?",
+])
+def test_semantic_match_needs_the_same_entities_and_numbers(query):
+    cache = ChatCache(embedder=embed_by_topic, signature=entities)
+    cache.store_sql("How much did I spend at Lidl?", INTENT)
+    assert cache.lookup_sql(query) is None
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from backend.insights_engine import InsightsEngine
+
+
+class FakeDatabase:
+    db_path = "unused.db"
+
+    def __init__(self, version):
+        self.version = version
+
+    def data_version(self):
+        return self.version
+
+    def connection(self):
+        return None
+
+
+def slow_engine(monkeypatch, database, builds):
+    def load(self, version):
+        builds.append(version)
+        time.sleep(0.2)
+        return ({"version": version}, version)
+
+    monkeypatch.setattr(InsightsEngine, "_load", load)
+    return InsightsEngine(database=database)
+
+
+def test_concurrent_cold_requests_share_one_build(monkeypatch):
+    builds = []
+    engine = slow_engine(monkeypatch, FakeDatabase("1-a"), builds)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(engine.snapshot())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert builds == ["1-a"]
+    assert results == [({"version": "1-a"}, "1-a")] * 8
+
+
+def test_new_version_is_rebuilt_once_in_the_background(monkeypatch):
+    builds = []
+    database = FakeDatabase("1-a")
+    engine = slow_engine(monkeypatch, database, builds)
+    engine.snapshot()
+
+    database.version = "2-b"
+    for _ in range(5):
+        assert engine.snapshot()[1] == "1-a"
+    deadline = time.monotonic() + 5
+    while engine.snapshot()[1] != "2-b" and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert builds == ["1-a", "2-b"]
+    assert engine.snapshot() == ({"version": "2-b"}, "2-b")
@@ -0,0 +1,66 @@
+import builtins
+
+import numpy as np
+import pytest
+
+from backend.intent_router import IntentRouter, default_embedder
+
+ENTITIES = {"stores": ["Lidl", "Tesco"], "categories": ["Dairy", "Bakery"]}
+
+
+def make_router(centroid):
+    # Embeds every query onto the given centroid, so classify() always picks it.
+    router = IntentRouter(embedder=lambda texts: None)
+    vector = router.centroids[router.intent_names.index(centroid)]
+    router.embedder = lambda texts: np.asarray([vector])
+    router.entities = lambda tenant=None: ENTITIES
+    return router
+
+
+def test_total_spend_without_entities_is_routed():
+    intent = make_router("total_spend").route("How much did I spend in total?", "Receipts")
+    assert intent["intent"] == "spending_total"
+    assert intent["params"] == ()
+
+
+@pytest.mark.parametrize("query", [
+    "How much did I spend at Lidl on dairy?",
+    "How much did I spend at Tesco?",
+    "How much did I spend on dairy?",
+    "How much did I spend on milk?",
+])
+def test_total_spend_with_a_filter_goes_to_the_llm(query):
+    assert make_router("total_spend").route(query, "Receipts") is None
+
+
+def test_store_spend_with_a_category_goes_to_the_llm():
+    assert make_router("store_spend").route("How much did I spend at Lidl on dairy?", "Receipts") is None
+
+
+def test_store_spend_is_routed_with_its_store():
+    intent = make_router("store_spend").route("How much did I spend at Lidl?", "Receipts")
+    assert intent["intent"] == "spending_store"
+    assert intent["params"] == ("%Lidl%",)
+
+
+def test_category_spend_is_routed_with_its_category():
+    intent = make_router("category_spend").route("How much goes to dairy?", "Receipts")
+    assert intent["intent"] == "spending_category"
+    assert intent["params"] == ("Dairy",)
+
+
+def test_missing_embedder_is_logged_and_only_greetings_are_routed(monkeypatch, capsys):
+    real_import = builtins.__import__
+
+    def no_sentence_transformers(name, *args, **kwargs):
+        if name == "sentence_transformers":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_sentence_transformers)
+    assert default_embedder() is None
+    assert "Intent routing is off" in capsys.readouterr().out
+
+    router = IntentRouter(embedder=None)
+    assert router.route("hello", "Receipts") is not None
+    assert router.route("How much did I spend in total?", "Receipts") is None
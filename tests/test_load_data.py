@@ -0,0 +1,185 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from backend.columnar_store import columnar_dir_for, read_manifest
+from backend.load_data import append_receipts, build_rollups, create_database, get_data_version
+
+RECEIPTS_CSV = "data/Receipts.csv"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "data_base" / "data.db")
+
+
+@pytest.fixture
+def receipts(tmp_path):
+    # The bundled receipts split into two CSVs in file order.
+    df = pd.read_csv(RECEIPTS_CSV)
+    first, second = tmp_path / "first.csv", tmp_path / "second.csv"
+    df.iloc[:6000].to_csv(first, index=False)
+    df.iloc[6000:].to_csv(second, index=False)
+    return str(first), str(second), len(df) - 6000
+
+
+@pytest.fixture
+def split_by_receipt(tmp_path):
+    # The bundled receipts as two CSVs that share no receipt, and the same
+    # rows in the same order as one CSV.
+    df = pd.read_csv(RECEIPTS_CSV)
+    receipt_ids = df["fs_receipt_id"].drop_duplicates()
+    in_first = df["fs_receipt_id"].isin(receipt_ids.iloc[:800])
+    paths = [tmp_path / name for name in ("first.csv", "second.csv", "all.csv")]
+    df[in_first].to_csv(paths[0], index=False)
+    df[~in_first].to_csv(paths[1], index=False)
+    pd.concat([df[in_first], df[~in_first]]).to_csv(paths[2], index=False)
+    return [str(path) for path in paths]
+
+
+# Everything an ingest derives from Receipts.
+DERIVED_QUERIES = [
+    "SELECT * FROM Receipts ORDER BY rowid",
+    "SELECT * FROM Spending_Daily ORDER BY day",
+    "SELECT * FROM Spending_Monthly ORDER BY month",
+    "SELECT * FROM Spending_Yearly ORDER BY year",
+    "SELECT * FROM Spending_Weekday ORDER BY weekday",
+    "SELECT receipt_rowid, kind, score, reference FROM Anomalies ORDER BY receipt_rowid, kind",
+    "SELECT * FROM City_Counts ORDER BY city",
+    "SELECT name, samples, sketch FROM Product_Price_Stats ORDER BY name",
+    "SELECT latitude, longitude, org_name, unit_name, unit_street_name, unit_municipality, items, spend, receipts, "
+    "weekend_receipts, work_hour_receipts, weeks, first_day, last_day FROM Store_Locations ORDER BY latitude, longitude",
+    "SELECT rowid FROM Products_FTS WHERE Products_FTS MATCH 'mlieko OR milk OR rajo' ORDER BY rowid",
+]
+
+
+def rounded(rows):
+    # Sums over the same rows in another order differ in the last bits.
+    return [tuple(round(value, 6) if isinstance(value, float) else value for value in row) for row in rows]
+
+
+def derived_tables(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [rounded(conn.execute(sql).fetchall()) for sql in DERIVED_QUERIES]
+    finally:
+        conn.close()
+
+
+def data_version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return get_data_version(conn)
+    finally:
+        conn.close()
+
+
+def count_receipts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM Receipts").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_rebuild_ignores_a_leftover_wal(db_path, receipts):
+    first, second, second_rows = receipts
+    create_database(db_path, first)
+
+    # A WAL with changes that never reached the old file, as left behind by
+    # a crashed writer.
+    writer = sqlite3.connect(db_path)
+    writer.execute("PRAGMA wal_autocheckpoint = 0")
+    with writer:
+        writer.execute("DELETE FROM Receipts")
+    with open(db_path + "-wal", "rb") as wal:
+        leftover = wal.read()
+    writer.close()
+    with open(db_path + "-wal", "wb") as wal:
+        wal.write(leftover)
+
+    create_database(db_path, second)
+
+    assert count_receipts(db_path) == second_rows
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    conn.close()
+
+
+def test_reader_keeps_the_old_file_during_a_rebuild(db_path, receipts):
+    first, second, second_rows = receipts
+    create_database(db_path, first)
+    reader = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    old_version = get_data_version(reader)
+
+    create_database(db_path, second)
+
+    assert reader.execute("SELECT COUNT(*) FROM Receipts").fetchone()[0] == 6000
+    reader.close()
+    conn = sqlite3.connect(db_path)
+    assert get_data_version(conn) != old_version
+    conn.close()
+    assert not os.path.exists(db_path + ".build")
+
+
+def test_append_matches_a_full_rebuild(tmp_path, split_by_receipt):
+    first, second, both = split_by_receipt
+    appended = str(tmp_path / "appended" / "data_base" / "data.db")
+    rebuilt = str(tmp_path / "rebuilt" / "data_base" / "data.db")
+
+    create_database(appended, first)
+    result = append_receipts([second], appended)
+    create_database(rebuilt, both)
+
+    assert result["rows_inserted"] > 0
+    assert count_receipts(appended) == count_receipts(rebuilt)
+    for appended_rows, rebuilt_rows in zip(derived_tables(appended), derived_tables(rebuilt)):
+        assert appended_rows == rebuilt_rows
+
+
+def test_reappending_the_same_file_keeps_the_version(db_path, split_by_receipt):
+    first, second, _ = split_by_receipt
+    create_database(db_path, first)
+    append_receipts([second], db_path)
+    version = data_version(db_path)
+    tables = derived_tables(db_path)
+
+    result = append_receipts([second], db_path)
+
+    assert result["rows_inserted"] == 0
+    assert data_version(db_path) == version
+    assert derived_tables(db_path) == tables
+    assert read_manifest(columnar_dir_for(db_path))["data_version"] == version
+
+
+def test_append_changes_the_version_and_restamps_the_manifest(db_path, split_by_receipt):
+    first, second, _ = split_by_receipt
+    create_database(db_path, first)
+    version = data_version(db_path)
+    assert read_manifest(columnar_dir_for(db_path))["data_version"] == version
+
+    append_receipts([second], db_path)
+
+    assert data_version(db_path) != version
+    assert read_manifest(columnar_dir_for(db_path))["data_version"] == data_version(db_path)
+
+
+def test_rollups_for_some_days_match_a_full_rebuild(db_path, receipts):
+    first, _, _ = receipts
+    create_database(db_path, first)
+    conn = sqlite3.connect(db_path)
+    try:
+        days = [day for (day,) in conn.execute(
+            "SELECT DISTINCT issue_day FROM Receipts WHERE issue_day IS NOT NULL ORDER BY issue_day LIMIT 5")]
+        with conn:
+            conn.execute("UPDATE Receipts SET price = price * 2 WHERE issue_day IN (?, ?)", days[:2])
+            conn.execute("DELETE FROM Receipts WHERE issue_day = ?", (days[2],))
+            build_rollups(conn, days=days)
+        incremental = [rounded(conn.execute(sql).fetchall()) for sql in DERIVED_QUERIES[1:5]]
+        with conn:
+            build_rollups(conn)
+        assert [rounded(conn.execute(sql).fetchall()) for sql in DERIVED_QUERIES[1:5]] == incremental
+    finally:
+        conn.close()
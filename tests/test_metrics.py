@@ -0,0 +1,60 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from backend.metrics import REQUEST_SECONDS, MetricsMiddleware, render_metrics, span, trace
+
+router = APIRouter()
+
+
+@router.get("")
+def list_items():
+    return []
+
+
+@router.get("/{item_id}/parts")
+def item_parts(item_id: int):
+    return {"item_id": item_id}
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router, prefix="/api/items")
+
+    @app.get("/health")
+    def health():
+        return "ok"
+
+    return TestClient(app)
+
+
+def routes():
+    return {key[1] for key in REQUEST_SECONDS._series}
+
+
+def test_included_router_root_route_keeps_its_prefix():
+    make_client().get("/api/items")
+    assert "/api/items" in routes()
+    assert "" not in routes()
+
+
+def test_path_params_are_reported_as_the_template():
+    make_client().get("/api/items/42/parts")
+    assert "/api/items/{item_id}/parts" in routes()
+    assert "/api/items/42/parts" not in routes()
+
+
+def test_app_route_and_unmatched_path():
+    client = make_client()
+    client.get("/health")
+    client.get("/nowhere")
+    assert {"/health", "unmatched"} <= routes()
+
+
+def test_spans_are_recorded_in_the_trace():
+    with trace("test") as current:
+        with span("stage_under_test", rows=3):
+            pass
+    assert current.spans[0]["stage"] == "stage_under_test"
+    assert current.spans[0]["rows"] == 3
+    assert 'stage_duration_seconds_count{stage="stage_under_test"} 1' in render_metrics()
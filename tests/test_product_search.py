@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+
+from backend.load_data import RECEIPTS_SCHEMA
+from backend.product_search import index_products, rewrite_product_search
+
+PRODUCTS = [
+    # name, english name, brand, price
+    ("Mlieko polotučné", "Semi-skimmed milk", "Rajo", 0.99),
+    ("Buttermilk", "Buttermilk", "Tami", 1.49),
+    ("MLIEKO trvanlivé", "Long-life milk", "Rajo", 1.19),
+    ("Chlieb", "Bread", None, 1.80),
+    ("Čokoláda", "Chocolate", "Milka", 2.30),
+    ("čokoládová tyčinka", "Chocolate bar", "Figaro", 0.80),
+]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(RECEIPTS_SCHEMA)
+    conn.executemany(
+        "INSERT INTO Receipts (name, ai_name_in_english_without_brand_and_quantity, ai_brand, price) "
+        "VALUES (?, ?, ?, ?)", PRODUCTS,
+    )
+    index_products(conn)
+    return conn
+
+
+def assert_same_rows(conn, sql):
+    rewritten = rewrite_product_search(sql, "Receipts")
+    assert rewritten is not None
+    fts_sql, params = rewritten
+    assert "Products_FTS MATCH ?" in fts_sql
+    like_rows = conn.execute(sql).fetchall()
+    assert sorted(conn.execute(fts_sql, params).fetchall(), key=repr) == sorted(like_rows, key=repr)
+    return like_rows, fts_sql, params
+
+
+def test_or_group(conn):
+    rows, _, params = assert_same_rows(conn, (
+        "SELECT name FROM Receipts WHERE (name LIKE '%mlieko%' "
+        "OR ai_name_in_english_without_brand_and_quantity LIKE '%milk%')"
+    ))
+    assert len(rows) == 3
+    assert params == ('({name} : "mlieko" OR {ai_name_in_english_without_brand_and_quantity} : "milk")',)
+
+
+def test_bare_like_chain(conn):
+    rows, _, _ = assert_same_rows(conn, (
+        "SELECT SUM(price) AS total, COUNT(*) AS count FROM Receipts "
+        "WHERE name LIKE '%milk%' OR ai_brand LIKE '%milk%'"
+    ))
+    assert rows[0][1] == 2
+
+
+def test_like_anded_with_another_predicate(conn):
+    rows, _, _ = assert_same_rows(conn, (
+        "SELECT name, price FROM Receipts WHERE LOWER(name) LIKE '%mlieko%' AND price > 1 ORDER BY price"
+    ))
+    assert rows == [("MLIEKO trvanlivé", 1.19)]
+
+
+def test_aliased_table(conn):
+    _, fts_sql, _ = assert_same_rows(conn, "SELECT r.name FROM Receipts AS r WHERE r.name LIKE '%chlieb%' LIMIT 5")
+    assert "ON product_match.match_rowid = r.rowid" in fts_sql
+    assert "ORDER BY product_match.match_rank LIMIT 5" in fts_sql
+
+
+def test_substring_inside_a_word_still_matches(conn):
+    rows, _, _ = assert_same_rows(conn, "SELECT name FROM Receipts WHERE name LIKE '%ilk%'")
+    assert rows == [("Buttermilk",)]
+
+
+def test_non_ascii_case_follows_like(conn):
+    # LIKE only folds ASCII case, so '%čoko%' does not find "Čokoláda".
+    rows, _, _ = assert_same_rows(conn, "SELECT name FROM Receipts WHERE name LIKE '%čoko%'")
+    assert rows == [("čokoládová tyčinka",)]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT name FROM Receipts WHERE name NOT LIKE '%milk%'",
+    "SELECT name FROM Receipts WHERE name LIKE '%milk%' OR price > 2",
+    "SELECT name FROM Receipts WHERE name LIKE '%ml%'",
+    "SELECT name FROM Receipts WHERE name LIKE 'mlieko%'",
+    "SELECT name FROM Receipts WHERE org_name LIKE '%lidl%'",
+    "SELECT name FROM Receipts WHERE name LIKE ?",
+    "SELECT name FROM Receipts WHERE price IN (SELECT price FROM Receipts WHERE name LIKE '%milk%')",
+])
+def test_unsupported_shapes_run_unchanged(sql):
+    assert rewrite_product_search(sql, "Receipts") is None
@@ -0,0 +1,72 @@
+from backend.creating_promt import build_format_prompt, local_answer
+from backend.result_compaction import COMPACT_MAX_ROWS, MAX_TEXT_LENGTH, compact_result, estimate_tokens
+
+
+def rows(count):
+    return [{"org_name": f"Store {i}", "total": 1.5} for i in range(count)]
+
+
+def test_empty_result():
+    assert compact_result([]) == "(no rows)"
+
+
+def test_small_result_is_sent_verbatim_as_csv():
+    payload = compact_result(rows(COMPACT_MAX_ROWS))
+    lines = payload.split("\n")
+    assert lines[0] == "org_name,total"
+    assert len(lines) == COMPACT_MAX_ROWS + 1
+    assert lines[-1] == f"Store {COMPACT_MAX_ROWS - 1},1.5"
+
+
+def test_large_result_gets_top_rows_totals_and_a_sample():
+    result = [{"org_name": f"Store {i}", "total": float(i)} for i in range(25)]
+    payload = compact_result(result)
+    assert payload.startswith("25 rows returned.\nFirst 10 rows:\norg_name,total\nStore 0,0.0")
+    assert "Totals over all returned rows:\ntotal: sum=300.0, min=0.0, max=24.0, avg=12.0" in payload
+    assert payload.endswith("Sample of the remaining 15 rows:\norg_name,total\n"
+                            "Store 10,10.0\nStore 13,13.0\nStore 16,16.0\nStore 19,19.0\nStore 22,22.0")
+    assert "Store 24" not in payload
+
+
+def test_text_columns_are_not_totalled():
+    result = [{"org_name": f"Store {i}", "code": "12" if i else None} for i in range(30)]
+    assert "Totals" not in compact_result(result)
+
+
+def test_values_are_rounded_and_long_text_is_cut():
+    payload = compact_result([{"item": "x  y\n" + "a" * 200, "price": 1.23456}])
+    item, price = payload.split("\n")[1].rsplit(",", 1)
+    assert price == "1.23"
+    assert item == "x y " + "a" * (MAX_TEXT_LENGTH - 4) + "…"
+
+
+def test_estimate_tokens_counts_words_and_punctuation():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("total: sum=300.0") == 7
+
+
+def test_truncated_result_says_totals_are_partial():
+    payload = compact_result(rows(500), truncated=True)
+    assert "500 rows returned." not in payload
+    assert "only the first 500" in payload
+    assert "Totals over all returned rows:" not in payload
+    assert "Partial totals over the returned rows only:" in payload
+
+
+def test_small_truncated_result_keeps_the_note():
+    payload = compact_result(rows(3), truncated=True)
+    assert payload.startswith("The query matched more rows than were returned")
+    assert payload.endswith("Store 2,1.5")
+
+
+def test_format_prompt_warns_about_partial_totals():
+    assert "partial" not in build_format_prompt("How much in total?", rows(500))
+    prompt = build_format_prompt("How much in total?", rows(500), truncated=True)
+    assert "never present them as totals" in prompt
+    assert "only the first 500" in prompt
+
+
+def test_truncated_result_is_not_summed_by_a_template():
+    intent = {"intent": "spending_store", "needs_formatting": True}
+    assert local_answer(intent, rows(3)) is not None
+    assert local_answer(intent, rows(3), truncated=True) is None
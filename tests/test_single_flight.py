@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.single_flight import SingleFlight
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight("test")
+    calls, results = [], []
+
+    def work(value):
+        calls.append(value)
+        time.sleep(0.2)
+        return value * 2
+
+    run_threads(8, lambda: results.append(flights.do("key", work, 21)))
+
+    assert calls == [21]
+    assert results == [42] * 8
+    assert not flights.in_flight("key")
+
+
+def test_different_keys_run_separately():
+    flights = SingleFlight("test")
+    calls = []
+    lock = threading.Lock()
+
+    def work(key):
+        with lock:
+            calls.append(key)
+        time.sleep(0.05)
+
+    threads = [threading.Thread(target=flights.do, args=(key, work, key)) for key in ("a", "b", "a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(set(calls)) == ["a", "b"]
+
+
+def test_followers_get_the_leaders_exception():
+    flights = SingleFlight("test")
+    errors = []
+
+    def work():
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flights.do("key", work)
+        except ValueError as e:
+            errors.append(e)
+
+    run_threads(4, call)
+    assert len(errors) == 4
+    assert len({id(e) for e in errors}) == 1
+
+
+def test_nothing_is_cached_after_the_call():
+    flights = SingleFlight("test")
+    calls = []
+    flights.do("key", calls.append, 1)
+    flights.do("key", calls.append, 2)
+    assert calls == [1, 2]
+
+
+def test_coroutines_share_one_task():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value + 1
+
+    async def main():
+        return await asyncio.gather(*(flights.ado("key", work, 1) for _ in range(5)))
+
+    assert asyncio.run(main()) == [2] * 5
+    assert calls == [1]
+
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    flights = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(flights.ado("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.ado("key", work))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_join_gets_the_result_of_a_lead():
+    flights = SingleFlight("test")
+
+    async def main():
+        assert await flights.join("key") is None
+        future = flights.lead("key")
+        joined = asyncio.create_task(flights.join("key"))
+        await asyncio.sleep(0)
+        future.set_result("answer")
+        return await joined
+
+    assert asyncio.run(main()) == "answer"
+
+
+def test_abandoned_lead_lets_followers_compute_themselves():
+    flights = SingleFlight("test")
+
+    async def work():
+        return "computed"
+
+    async def main():
+        future = flights.lead("key")
+        joined = asyncio.create_task(flights.join("key"))
+        follower = asyncio.create_task(flights.ado("key", work))
+        await asyncio.sleep(0)
+        SingleFlight.abandon(future)
+        return await joined, await follower
+
+    assert asyncio.run(main()) == (None, "computed")
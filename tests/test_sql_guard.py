@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from backend.sql_guard import SQLGuardError, check_query_plan, guarded_execute
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE Receipts (org_name TEXT, ai_category TEXT, price REAL)")
+    conn.executemany("INSERT INTO Receipts VALUES (?, ?, ?)",
+                     [("Lidl", "Dairy", 2.0), ("Lidl", "Bakery", 3.0), ("Tesco", "Dairy", 5.0)])
+    return conn
+
+
+def test_share_of_total_through_a_cte_is_allowed(conn):
+    sql = ("WITH t AS (SELECT SUM(price) s FROM Receipts) "
+           "SELECT org_name, price * 100.0 / t.s AS share FROM Receipts, t")
+    check_query_plan(conn, sql)
+    rows, truncated = guarded_execute(conn, sql)
+    assert [row["share"] for row in rows] == [20.0, 30.0, 50.0]
+    assert not truncated
+
+
+def test_share_of_total_through_subqueries_is_allowed(conn):
+    check_query_plan(conn, (
+        "SELECT x.org_name, x.s * 100.0 / y.t FROM "
+        "(SELECT org_name, SUM(price) s FROM Receipts GROUP BY org_name) x, "
+        "(SELECT SUM(price) t FROM Receipts) y"
+    ))
+
+
+def test_union_of_two_scans_is_allowed(conn):
+    check_query_plan(conn, "SELECT price FROM Receipts UNION ALL SELECT price FROM Receipts")
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT a.price FROM Receipts a, Receipts b WHERE a.price > b.price",
+    "SELECT a.price, b.price FROM Receipts AS a CROSS JOIN Receipts AS b",
+])
+def test_double_scan_is_rejected(conn, sql):
+    with pytest.raises(SQLGuardError, match="full scans"):
+        check_query_plan(conn, sql)
+
+
+def test_correlated_full_scan_is_rejected(conn):
+    with pytest.raises(SQLGuardError, match="correlated"):
+        check_query_plan(conn, (
+            "SELECT org_name FROM Receipts r WHERE price > "
+            "(SELECT AVG(price) FROM Receipts r2 WHERE r2.ai_category || '' = r.ai_category)"
+        ))
+
+
+def test_writes_are_rejected(conn):
+    with pytest.raises(SQLGuardError, match="only SELECT"):
+        guarded_execute(conn, "DELETE FROM Receipts")
+
+
+def test_rows_are_capped(conn):
+    rows, truncated = guarded_execute(conn, "SELECT price FROM Receipts", max_rows=2)
+    assert len(rows) == 2
+    assert truncated
@@ -0,0 +1,54 @@
+import random
+
+import pandas as pd
+import pytest
+
+from backend.insights_engine import group_store_names, normalize_store_names
+from benchmarks.store_names import (
+    legacy_group_store_names, legacy_normalize_store_name, make_store_names,
+)
+
+SUFFIX_TOKENS = [
+    "s.r.o.", "s.r.o", "v.o.s.", "v.o.s", "a.s.", "a.s", "spol. s r.o.", "spol.s r.o",
+    "Slovenská republika", "Slovakia", "SR", "Inc.", "Ltd.", "GmbH",
+    "s.", "r.o.", "v.o.", ",", " ", ".", "Lidl", "Tesco", "sro", "AS",
+]
+
+
+def assert_matches_legacy(names):
+    names = pd.Series(names, dtype=object)
+    assert normalize_store_names(names).tolist() == names.apply(legacy_normalize_store_name).tolist()
+
+
+def test_overlapping_suffixes_are_removed_in_order():
+    normalized = normalize_store_names(pd.Series(["v.o.s.r.o.", "Fresh a.s.r.o.", "Kaufland, SR s.r.o."]))
+    assert normalized.tolist() == ["v.o.", "Fresh a.", "Kaufland"]
+    assert_matches_legacy(["v.o.s.r.o.", "Fresh a.s.r.o.", "Kaufland, SR s.r.o."])
+
+
+def test_random_suffix_combinations_match_legacy():
+    rng = random.Random(5)
+    names = [
+        "".join(rng.choice(SUFFIX_TOKENS) + rng.choice(["", " ", ", "]) for _ in range(rng.randint(1, 5)))
+        for _ in range(20_000)
+    ]
+    assert_matches_legacy(names)
+
+
+def test_missing_names_are_unknown():
+    assert normalize_store_names(pd.Series(["Lidl s.r.o.", None, float("nan")])).tolist() == [
+        "Lidl", "Unknown", "Unknown",
+    ]
+
+
+@pytest.mark.parametrize("merchants", [50, 500, 2000])
+def test_generated_stores_match_legacy(merchants):
+    names = make_store_names(merchants, merchants * 3)
+    assert_matches_legacy(names)
+    unique_stores = list(normalize_store_names(names).unique())
+    assert group_store_names(unique_stores) == legacy_group_store_names(unique_stores)
+
+
+def test_grouping_with_mixed_case_and_empty_names():
+    stores = ["LIDL", "Lidl Bratislava", "", "Tesco", "tesco express", "Billa", "billa"]
+    assert group_store_names(stores) == legacy_group_store_names(stores)
@@ -0,0 +1,47 @@
+import pytest
+
+from backend.template_answers import is_count_column, is_money_column, render_template_answer
+
+
+@pytest.mark.parametrize("column", ["total_quantity", "total_purchases", "avg_quantity", "sum_items", "count"])
+def test_count_columns_are_not_money(column):
+    assert is_count_column(column)
+    assert not is_money_column(column)
+
+
+@pytest.mark.parametrize("column", ["total", "total_spent", "sum_price", "avg_price", "amount"])
+def test_money_columns(column):
+    assert is_money_column(column)
+
+
+def test_total_quantity_list_is_not_in_euros():
+    rows = [{"name": "Milk", "total_quantity": 12}, {"name": "Bread", "total_quantity": 7}]
+    answer = render_template_answer("most_frequent", rows)
+    assert "€" not in answer
+    assert "1. Milk — 12 total_quantity" in answer
+    assert "Together" not in answer
+
+
+def test_total_purchases_per_category_is_not_in_euros():
+    rows = [{"ai_category": "Dairy", "total_purchases": 120}]
+    answer = render_template_answer("most_frequent", rows)
+    assert "€" not in answer
+    assert "Dairy — 120 total_purchases" in answer
+
+
+def test_avg_quantity_is_not_reported_as_spending():
+    answer = render_template_answer("spending_total", [{"avg_quantity": 2.5}])
+    assert "spent" not in answer
+    assert "€" not in answer
+
+
+def test_total_with_count_still_in_euros():
+    answer = render_template_answer("spending_total", [{"total": 1234.5, "count": 88}])
+    assert answer == "💰 In total you spent 1,234.50€ across 88 purchased items."
+
+
+def test_store_list_with_total_and_count():
+    rows = [{"org_name": "Lidl", "total": 50.0, "count": 10}, {"org_name": "Tesco", "total": 25.5, "count": 3}]
+    answer = render_template_answer("spending_store", rows)
+    assert "1. Lidl — 50.00€ · 10 items" in answer
+    assert "Together: 75.50€" in answer
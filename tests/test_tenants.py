@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from backend import tenants
+from backend.tenants import TenantLRU, tenant_id
+
+
+def test_slow_tenant_does_not_block_others():
+    started = threading.Event()
+    release = threading.Event()
+
+    def factory(tenant):
+        if tenant == "slow":
+            started.set()
+            release.wait(5)
+        return tenant.upper()
+
+    lru = TenantLRU(factory)
+    slow = threading.Thread(target=lru.get, args=("slow",))
+    slow.start()
+    started.wait(5)
+    try:
+        assert lru.get("fast") == "FAST"
+    finally:
+        release.set()
+        slow.join()
+    assert lru.get("slow") == "SLOW"
+
+
+def test_concurrent_gets_build_a_tenant_once():
+    calls = []
+
+    def factory(tenant):
+        calls.append(tenant)
+        time.sleep(0.1)
+        return object()
+
+    lru = TenantLRU(factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(lru.get("alice"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["alice"]
+    assert all(item is results[0] for item in results)
+
+
+def test_least_recently_used_is_evicted():
+    lru = TenantLRU(lambda tenant: object(), maxsize=2)
+    a = lru.get("a")
+    lru.get("b")
+    lru.get("a")
+    lru.get("c")
+    assert len(lru) == 2
+    assert lru.get("a") is a
+    assert "b" not in lru._items
+
+
+def test_failed_build_can_be_retried():
+    attempts = []
+
+    def factory(tenant):
+        attempts.append(tenant)
+        if len(attempts) == 1:
+            raise OSError("disk full")
+        return tenant
+
+    lru = TenantLRU(factory)
+    with pytest.raises(OSError):
+        lru.get("alice")
+    assert lru.get("alice") == "alice"
+    assert lru._building == {}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(tenants, "TENANTS_DIR", str(tmp_path))
+    database = tmp_path / "alice" / "data_base" / "data.db"
+    database.parent.mkdir(parents=True)
+    database.touch()
+
+    app = FastAPI()
+
+    @app.get("/whoami")
+    def whoami(tenant: str = Depends(tenant_id)):
+        return tenant
+
+    return TestClient(app)
+
+
+def test_no_header_is_the_default_tenant(client):
+    assert client.get("/whoami").json() == "default"
+
+
+def test_tenant_header_is_refused_without_a_configured_secret(client, monkeypatch):
+    monkeypatch.setattr(tenants, "TENANT_PROXY_SECRET", "")
+    response = client.get("/whoami", headers={"X-Tenant-ID": "alice", "X-Tenant-Proxy-Secret": ""})
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("secret", [None, "guess"])
+def test_tenant_header_needs_the_proxy_secret(client, monkeypatch, secret):
+    monkeypatch.setattr(tenants, "TENANT_PROXY_SECRET", "s3cret")
+    headers = {"X-Tenant-ID": "alice"}
+    if secret is not None:
+        headers["X-Tenant-Proxy-Secret"] = secret
+    assert client.get("/whoami", headers=headers).status_code == 403
+
+
+def test_tenant_from_the_proxy(client, monkeypatch):
+    monkeypatch.setattr(tenants, "TENANT_PROXY_SECRET", "s3cret")
+    proxy = {"X-Tenant-Proxy-Secret": "s3cret"}
+    assert client.get("/whoami", headers={**proxy, "X-Tenant-ID": "alice"}).json() == "alice"
+    assert client.get("/whoami", headers={**proxy, "X-Tenant-ID": "bob"}).status_code == 404
+    assert client.get("/whoami", headers={**proxy, "X-Tenant-ID": "../x"}).status_code == 400
@@ -0,0 +1,81 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from backend.insights_engine import detect_vacation_blocks
+from benchmarks.vacation_blocks import legacy_vacation_blocks, make_travel_events
+
+RECEIPTS_CSV = "data/Receipts.csv"
+
+
+def assert_matches_legacy(travel_events):
+    blocks = detect_vacation_blocks(travel_events["unit_municipality"], travel_events["Purchase_Date"])
+    assert blocks == legacy_vacation_blocks(travel_events)
+    return blocks
+
+
+def events(*rows):
+    return pd.DataFrame(rows, columns=["unit_municipality", "Purchase_Date"])
+
+
+def test_bundled_receipts():
+    df = pd.read_csv(RECEIPTS_CSV, usecols=["unit_municipality", "fs_receipt_issue_date"])
+    df["Purchase_Date"] = pd.to_datetime(df["fs_receipt_issue_date"], errors="coerce").dt.date
+    df = df.dropna(subset=["unit_municipality", "Purchase_Date"])
+    home_city = df["unit_municipality"].mode().iloc[0]
+
+    travel = assert_matches_legacy(df[df["unit_municipality"] != home_city])
+    assert travel
+    assert_matches_legacy(df)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_synthetic_travel(seed):
+    assert_matches_legacy(make_travel_events(cities=40, years=3, rows=5_000, seed=seed))
+
+
+def test_single_day_stays_are_dropped():
+    blocks = assert_matches_legacy(events(
+        ("Wien", date(2024, 3, 1)),
+        ("Wien", date(2024, 3, 1)),
+        ("Wien", date(2024, 3, 5)),
+        ("Praha", date(2024, 6, 9)),
+    ))
+    assert blocks == []
+
+
+def test_block_across_year_boundary():
+    blocks = assert_matches_legacy(events(
+        ("Zermatt", date(2023, 12, 30)),
+        ("Zermatt", date(2023, 12, 31)),
+        ("Zermatt", date(2024, 1, 1)),
+        ("Zermatt", date(2024, 1, 2)),
+        ("Zermatt", date(2024, 1, 10)),
+    ))
+    assert blocks[0]["start_date"] == date(2023, 12, 30)
+    assert blocks[0]["end_date"] == date(2024, 1, 2)
+    assert blocks[0]["consecutive_days"] == 4
+
+
+def test_ties_within_a_city_keep_the_earliest_block():
+    blocks = assert_matches_legacy(events(
+        ("Split", date(2024, 8, 20)),
+        ("Split", date(2024, 8, 21)),
+        ("Split", date(2024, 7, 1)),
+        ("Split", date(2024, 7, 2)),
+    ))
+    assert blocks[0]["start_date"] == date(2024, 7, 1)
+
+
+def test_ties_between_cities_keep_every_city_in_order():
+    blocks = assert_matches_legacy(events(
+        ("Wien", date(2024, 5, 1)),
+        ("Wien", date(2024, 5, 2)),
+        ("Budapest", date(2024, 5, 1)),
+        ("Budapest", date(2024, 5, 2)),
+        ("Krakow", date(2024, 9, 3)),
+        ("Krakow", date(2024, 9, 4)),
+    ))
+    assert [block["city"] for block in blocks] == ["Budapest", "Krakow", "Wien"]
+    assert {block["consecutive_days"] for block in blocks} == {2}